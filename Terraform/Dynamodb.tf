@@ -58,6 +58,8 @@ resource "aws_iam_policy" "lambda_dynamodb" {
         Effect = "Allow"
         Action = [
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
+          "dynamodb:BatchGetItem",
           "dynamodb:GetItem",
           "dynamodb:Query",
           "dynamodb:Scan",
@@ -62,6 +62,14 @@ resource "aws_iam_role_policy" "lambda" {
           aws_secretsmanager_secret.teams_webhook.arn
         ]
       },
+      # Shard fan-out (the function invokes itself for map/reduce workers)
+      {
+        Effect = "Allow"
+        Action = [
+          "lambda:InvokeFunction"
+        ]
+        Resource = "arn:aws:lambda:${var.aws_region}:${data.aws_caller_identity.current.account_id}:function:f5-config-comparison"
+      },
       # SNS access
       {
         Effect = "Allow"
@@ -166,3 +174,32 @@ resource "aws_lambda_permission" "eventbridge" {
   principal     = "events.amazonaws.com"
   source_arn    = aws_cloudwatch_event_rule.schedule.arn
 }
+
+# EventBridge Rule for the change sentinel (optional)
+resource "aws_cloudwatch_event_rule" "sentinel" {
+  count               = var.sentinel_schedule == "" ? 0 : 1
+  name                = "f5-config-change-sentinel"
+  description         = "Poll F5 config fingerprints and compare only on change"
+  schedule_expression = var.sentinel_schedule
+
+  tags = merge(local.common_tags, {
+    Name = "f5-sentinel"
+  })
+}
+
+resource "aws_cloudwatch_event_target" "sentinel" {
+  count     = var.sentinel_schedule == "" ? 0 : 1
+  rule      = aws_cloudwatch_event_rule.sentinel[0].name
+  target_id = "f5-lambda-sentinel"
+  arn       = aws_lambda_function.f5_comparison.arn
+  input     = jsonencode({ action = "sentinel" })
+}
+
+resource "aws_lambda_permission" "eventbridge_sentinel" {
+  count         = var.sentinel_schedule == "" ? 0 : 1
+  statement_id  = "AllowExecutionFromEventBridgeSentinel"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.f5_comparison.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.sentinel[0].arn
+}
@@ -46,7 +46,9 @@ resource "aws_s3_bucket_lifecycle_configuration" "reports" {
     id     = "delete-old-reports"
     status = "Enabled"
 
-    filter {}
+    filter {
+      prefix = "comparisons/"
+    }
 
     expiration {
       days = var.s3_lifecycle_days
@@ -56,4 +58,127 @@ resource "aws_s3_bucket_lifecycle_configuration" "reports" {
       noncurrent_days = 7
     }
   }
+
+  # Shard map/reduce scratch data is only needed during a run
+  rule {
+    id     = "delete-shard-scratch"
+    status = "Enabled"
+
+    filter {
+      prefix = "shards/"
+    }
+
+    expiration {
+      days = 1
+    }
+
+    noncurrent_version_expiration {
+      noncurrent_days = 1
+    }
+  }
+
+  # Deadline checkpoints are only needed until the follow-up invocation resumes
+  rule {
+    id     = "delete-checkpoints"
+    status = "Enabled"
+
+    filter {
+      prefix = "checkpoints/"
+    }
+
+    expiration {
+      days = 2
+    }
+
+    noncurrent_version_expiration {
+      noncurrent_days = 1
+    }
+  }
+
+  # Analytics exports (NDJSON / Parquet) are kept longer for fleet-wide history
+  rule {
+    id     = "delete-old-exports"
+    status = "Enabled"
+
+    filter {
+      prefix = "exports/"
+    }
+
+    expiration {
+      days = var.s3_export_lifecycle_days
+    }
+
+    noncurrent_version_expiration {
+      noncurrent_days = 7
+    }
+  }
+
+  # Archive manifests (one per device and run) back archive_compare / timelines;
+  # latest.json is rewritten every run, so old versions go quickly
+  rule {
+    id     = "delete-old-archive-manifests"
+    status = "Enabled"
+
+    filter {
+      prefix = "archive/manifests/"
+    }
+
+    expiration {
+      days = var.s3_archive_lifecycle_days
+    }
+
+    noncurrent_version_expiration {
+      noncurrent_days = 1
+    }
+  }
+
+  # Archive blobs are content-addressed and reused by every later manifest with
+  # the same object, so their age says nothing about use - never expired by age.
+  # Rewrites of an existing blob only leave identical noncurrent versions
+  rule {
+    id     = "delete-archive-blob-rewrites"
+    status = "Enabled"
+
+    filter {
+      prefix = "archive/objects/"
+    }
+
+    noncurrent_version_expiration {
+      noncurrent_days = 1
+    }
+  }
+
+  # Last published alert fingerprints per pair, rewritten every run
+  rule {
+    id     = "delete-stale-alert-state"
+    status = "Enabled"
+
+    filter {
+      prefix = "alerts/"
+    }
+
+    expiration {
+      days = var.s3_lifecycle_days
+    }
+
+    noncurrent_version_expiration {
+      noncurrent_days = 1
+    }
+  }
+
+  # Default for every key: no stale versions or half-finished multipart uploads
+  rule {
+    id     = "default-cleanup"
+    status = "Enabled"
+
+    filter {}
+
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
+
+    noncurrent_version_expiration {
+      noncurrent_days = 7
+    }
+  }
 }
@@ -72,6 +72,12 @@ variable "lambda_schedule" {
   default     = "cron(0 2 * * ? *)" # Daily at 2 AM UTC
 }
 
+variable "sentinel_schedule" {
+  description = "Schedule for the change sentinel (stat-only polling that dispatches comparisons on change); empty to disable"
+  type        = string
+  default     = "" # e.g. "rate(15 minutes)"
+}
+
 variable "teams_webhook_url" {
   description = "Microsoft Teams webhook URL for notifications"
   type        = string
@@ -90,6 +96,18 @@ variable "s3_lifecycle_days" {
   default     = 30
 }
 
+variable "s3_export_lifecycle_days" {
+  description = "Number of days to retain analytics exports (exports/ prefix) in S3"
+  type        = number
+  default     = 365
+}
+
+variable "s3_archive_lifecycle_days" {
+  description = "Number of days to retain parsed-config archive manifests (archive/manifests/ prefix) in S3"
+  type        = number
+  default     = 365
+}
+
 variable "enable_vpn" {
   description = "Whether to deploy VPN server (set to false for testing without VPN)"
   type        = bool
@@ -246,4 +246,36 @@ resource "aws_vpc_endpoint" "cloudwatch_monitoring" {
   tags = merge(local.common_tags, {
     Name = "f5-cloudwatch-monitoring-endpoint"
   })
-}
\ No newline at end of file
+}
+# Security Group for the Lambda API endpoint (HTTPS from the function only)
+resource "aws_security_group" "lambda_endpoint" {
+  name        = "f5-lambda-endpoint-sg"
+  description = "Security group for the Lambda API VPC endpoint"
+  vpc_id      = aws_vpc.main.id
+
+  ingress {
+    description     = "HTTPS from Lambda"
+    from_port       = 443
+    to_port         = 443
+    protocol        = "tcp"
+    security_groups = [aws_security_group.lambda.id]
+  }
+
+  tags = merge(local.common_tags, {
+    Name = "f5-lambda-endpoint-sg"
+  })
+}
+
+# Lambda API VPC Endpoint (shard workers, resume and sentinel dispatch invoke the function itself)
+resource "aws_vpc_endpoint" "lambda" {
+  vpc_id              = aws_vpc.main.id
+  service_name        = "com.amazonaws.${var.aws_region}.lambda"
+  vpc_endpoint_type   = "Interface"
+  subnet_ids          = [aws_subnet.private.id]
+  security_group_ids  = [aws_security_group.lambda_endpoint.id]
+  private_dns_enabled = true
+
+  tags = merge(local.common_tags, {
+    Name = "f5-lambda-endpoint"
+  })
+}
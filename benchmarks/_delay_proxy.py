@@ -0,0 +1,56 @@
+"""
+Usage: _delay_proxy.py LISTEN_PORT DELAY_MS TARGET_PORT [MBIT_PER_S]
+
+Forwards one loopback TCP connection, delaying each direction by DELAY_MS
+and, if given, pacing each direction to MBIT_PER_S.
+"""
+import asyncio
+import sys
+import time
+
+
+async def _pipe(reader, writer, delay, bytes_per_second):
+    queue = asyncio.Queue()
+    link_free = 0.0
+
+    async def forward():
+        while True:
+            sent, data = await queue.get()
+            if data is None:
+                writer.close()
+                return
+            wait = sent + delay - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            writer.write(data)
+            await writer.drain()
+
+    task = asyncio.ensure_future(forward())
+    while True:
+        data = await reader.read(1 << 16)
+        # when the last byte of data leaves a link of the given bandwidth
+        link_free = max(link_free, time.monotonic())
+        if bytes_per_second and data:
+            link_free += len(data) / bytes_per_second
+        queue.put_nowait((link_free, data or None))
+        if not data:
+            break
+    await task
+
+
+async def _proxy(listen_port, delay, target_port, bytes_per_second):
+    async def handle(reader, writer):
+        target_reader, target_writer = await asyncio.open_connection('127.0.0.1', target_port)
+        await asyncio.gather(
+            _pipe(reader, target_writer, delay, bytes_per_second),
+            _pipe(target_reader, writer, delay, bytes_per_second)
+        )
+
+    server = await asyncio.start_server(handle, '127.0.0.1', listen_port)
+    print('ready', flush=True)
+    await server.serve_forever()
+
+
+if __name__ == '__main__':
+    mbit_per_second = float(sys.argv[4]) if len(sys.argv) > 4 else 0
+    asyncio.run(_proxy(int(sys.argv[1]), float(sys.argv[2]) / 1000, int(sys.argv[3]), mbit_per_second * 125000))
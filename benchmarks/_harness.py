@@ -0,0 +1,247 @@
+"""
+Shared setup for the paramiko benchmarks: an in-memory SFTP server on a
+loopback socket pair, a send-counting client socket and an optional
+delaying proxy (LINK_DELAY_MS one way, LINK_MBPS bandwidth) to emulate a
+WAN link.  Server and client share one interpreter, so CPU-bound results
+are pessimistic.
+
+PARAMIKO_PATH=<dir containing paramiko/> benchmarks another paramiko tree
+(e.g. a checkout of the baseline) with the same scripts.
+"""
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if os.environ.get('PARAMIKO_PATH'):
+    sys.path.insert(0, os.environ['PARAMIKO_PATH'])
+# appended like tests/conftest.py so platform wheels installed for the
+# benchmarks win over the Lambda's vendored ones
+sys.path.append(os.path.join(ROOT, 'lambda-package'))
+
+import paramiko  # noqa: E402
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface  # noqa: E402
+
+SIZE = int(os.environ.get('SIZE_MB', 64)) * 1024 * 1024
+BLOCK = 1 << 20
+RUNS = int(os.environ.get('RUNS', 3))
+LINK_DELAY_MS = float(os.environ.get('LINK_DELAY_MS', 0))
+LINK_MBPS = float(os.environ.get('LINK_MBPS', 0))
+_patterns = {}
+
+
+def config_text(size):
+    """Synthetic bigip.conf-like text (compresses about as well as real configs)"""
+    rnd = random.Random(1)
+    lines = []
+    length = 0
+    while length < size:
+        name = f"app{rnd.randrange(100000)}_{rnd.choice(['web', 'api', 'db', 'auth'])}"
+        address = f"10.{rnd.randrange(256)}.{rnd.randrange(256)}.{rnd.randrange(256)}"
+        block = (
+            f"ltm virtual /Common/vs_{name} {{\n"
+            f"    destination /Common/{address}:{rnd.choice([80, 443, 8443])}\n"
+            f"    ip-protocol tcp\n"
+            f"    mask 255.255.255.255\n"
+            f"    pool /Common/pool_{name}\n"
+            f"    profiles {{\n        /Common/http {{ }}\n        /Common/tcp {{ }}\n    }}\n"
+            f"    source-address-translation {{\n        type automap\n    }}\n"
+            f"    translate-address enabled\n    translate-port enabled\n"
+            f"}}\n"
+            f"ltm pool /Common/pool_{name} {{\n"
+            f"    members {{\n        /Common/{address}:{rnd.choice([80, 8080])} {{\n"
+            f"            address {address}\n        }}\n    }}\n"
+            f"    monitor /Common/{rnd.choice(['http', 'https', 'tcp'])}\n"
+            f"}}\n"
+        )
+        lines.append(block)
+        length += len(block)
+    return ''.join(lines).encode('utf-8')[:size]
+
+
+def pattern(content):
+    """Two copies of the megabyte the served file repeats: 'random' bytes or 'config' text"""
+    if content not in _patterns:
+        block = os.urandom(BLOCK) if content == 'random' else config_text(BLOCK)
+        _patterns[content] = block * 2
+    return _patterns[content]
+
+
+_host_key = None
+
+
+class CountingSocket:
+    """Socket wrapper counting send syscalls and the buffers they carried"""
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sends = 0
+        self.bufs = 0
+
+    def send(self, data):
+        self.sends += 1
+        self.bufs += 1
+        return self.sock.send(data)
+
+    def sendmsg(self, bufs):
+        self.sends += 1
+        self.bufs += len(bufs)
+        return self.sock.sendmsg(bufs)
+
+    def __getattr__(self, name):
+        return getattr(self.sock, name)
+
+
+def file_content(offset, length, size=SIZE, content='random'):
+    """Bytes [offset, offset + length) of the served file, length <= BLOCK"""
+    length = max(0, min(length, size - offset))
+    start = offset % BLOCK
+    return pattern(content)[start:start + length]
+
+
+def file_attributes(size):
+    attr = SFTPAttributes()
+    attr.st_size = size
+    attr.st_mode = 0o100644
+    return attr
+
+
+class MemoryHandle(SFTPHandle):
+    def __init__(self, flags, size, content):
+        super().__init__(flags)
+        self.size = size
+        self.content = content
+
+    def read(self, offset, length):
+        return file_content(offset, length, self.size, self.content)
+
+    def stat(self):
+        return file_attributes(self.size)
+
+
+class MemorySFTP(SFTPServerInterface):
+    """Every path is the same read-only file of size bytes"""
+
+    def __init__(self, server, size, content):
+        super().__init__(server)
+        self.size = size
+        self.content = content
+
+    def open(self, path, flags, attr):
+        return MemoryHandle(flags, self.size, self.content)
+
+    def stat(self, path):
+        return file_attributes(self.size)
+
+    lstat = stat
+
+
+class AcceptAll(paramiko.ServerInterface):
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+
+class Session:
+    """Connected client/server transports, see connect()"""
+
+    def __init__(self, client, server, sock, proxy):
+        self.client = client
+        self.server = server
+        self.sock = sock
+        self.proxy = proxy
+        self.sftp = paramiko.SFTPClient.from_transport(client)
+
+    def sent_packets(self):
+        return self.client.packetizer._Packetizer__sent_packets
+
+    def received_packets(self):
+        return self.client.packetizer._Packetizer__received_packets
+
+    def close(self):
+        self.sftp.close()
+        self.client.close()
+        self.server.close()
+        if self.proxy:
+            self.proxy.kill()
+            self.proxy.wait()
+
+
+def connect(
+    size=SIZE, content='random', ciphers=('aes128-ctr',), compress=False,
+    transport_factory=None, link_delay_ms=LINK_DELAY_MS, link_mbps=LINK_MBPS
+):
+    """
+    Open an SFTP session to an in-memory file of size bytes, through the
+    delaying proxy if link_delay_ms or link_mbps is set
+    transport_factory builds the client transport (paramiko.Transport by
+    default); ciphers=None keeps its cipher preference
+    """
+    global _host_key
+    if _host_key is None:
+        _host_key = paramiko.RSAKey.generate(2048)
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    address = listener.getsockname()
+    proxy = None
+    if link_delay_ms or link_mbps:
+        # a separate process so the delay does not compete for the GIL
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        proxy = subprocess.Popen(
+            [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), '_delay_proxy.py'),
+             str(port), str(link_delay_ms), str(address[1]), str(link_mbps)],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        proxy.stdout.readline()
+        address = ('127.0.0.1', port)
+    client_sock = socket.create_connection(address)
+    server_sock, _ = listener.accept()
+    listener.close()
+
+    server = paramiko.Transport(server_sock)
+    server.add_server_key(_host_key)
+    server.use_compression(compress)
+    server.set_subsystem_handler('sftp', SFTPServer, MemorySFTP, size, content)
+    threading.Thread(target=server.start_server, kwargs={'server': AcceptAll()}, daemon=True).start()
+
+    counting = CountingSocket(client_sock)
+    client = (transport_factory or paramiko.Transport)(counting)
+    if ciphers is not None:
+        client.get_security_options().ciphers = tuple(ciphers)
+    client.use_compression(compress)
+    client.connect(username='bench', password='bench')
+    return Session(client, server, counting, proxy)
+
+
+def measure(fn, **connect_kwargs):
+    """
+    Run fn(sftp) on a fresh session
+    Returns: (wall s, cpu s, send syscalls, packets sent, result, packets received)
+    """
+    session = connect(**connect_kwargs)
+    sends, packets, received = session.sock.sends, session.sent_packets(), session.received_packets()
+    start, cpu = time.perf_counter(), time.process_time()
+    result = fn(session.sftp)
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu
+    sends, packets = session.sock.sends - sends, session.sent_packets() - packets
+    received = session.received_packets() - received
+    session.close()
+    return elapsed, cpu, sends, packets, result, received
+
+
+def best_of(fn, runs=RUNS, **connect_kwargs):
+    """measure() runs times and keep the fastest"""
+    return min((measure(fn, **connect_kwargs) for _ in range(runs)), key=lambda r: r[0])
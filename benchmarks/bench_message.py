@@ -0,0 +1,94 @@
+"""
+paramiko.Message micro-benchmarks (user-050): build and parse cost of
+typical SFTP and kex messages in ns per message.  Run once as is and once
+with PARAMIKO_PATH pointing at a baseline tree to compare.
+
+    python benchmarks/bench_message.py
+"""
+import os
+import timeit
+
+# imported for its side effect: puts the paramiko under test on sys.path
+import _harness  # noqa: F401
+from paramiko.message import Message
+
+NUMBER = 50000
+HANDLE = os.urandom(8)
+PAYLOAD = os.urandom(32768)
+
+
+def build(*items):
+    m = Message()
+    for method, value in items:
+        getattr(m, method)(value)
+    return m.asbytes()
+
+
+DATA_RESPONSE = build(('add_int', 1234), ('add_string', PAYLOAD))
+STATUS_RESPONSE = build(('add_int', 7), ('add_int', 0), ('add_string', b'Success'), ('add_string', b''))
+ATTRS_RESPONSE = build(
+    ('add_int', 9), ('add_int', 0xF), ('add_int64', 12345), ('add_int', 0), ('add_int', 0),
+    ('add_int', 0o644), ('add_int', 1), ('add_int', 2)
+)
+KEX_ALGORITHMS = ['curve25519-sha256', 'ecdh-sha2-nistp256', 'diffie-hellman-group14-sha256', 'ext-info-c']
+KEXINIT = build(
+    ('add_bytes', os.urandom(16)), *[('add_list', KEX_ALGORITHMS)] * 10, ('add_boolean', False), ('add_int', 0)
+)
+
+
+def read_request():
+    m = Message()
+    m.add_int(1234)
+    m.add_string(HANDLE)
+    m.add_int64(1 << 33)
+    m.add_int(32768)
+    return m.asbytes()
+
+
+def data_parse():
+    m = Message(DATA_RESPONSE)
+    return m.get_int(), m.get_string()
+
+
+def status_parse():
+    m = Message(STATUS_RESPONSE)
+    return m.get_int(), m.get_int(), m.get_text(), m.get_text()
+
+
+def attrs_parse():
+    m = Message(ATTRS_RESPONSE)
+    return [m.get_int(), m.get_int(), m.get_int64()] + [m.get_int() for _ in range(5)]
+
+
+def kexinit_parse():
+    m = Message(KEXINIT)
+    m.get_bytes(16)
+    lists = [m.get_list() for _ in range(10)]
+    return lists, m.get_boolean(), m.get_int()
+
+
+def channel_data():
+    m = Message()
+    m.add_byte(b'^')
+    m.add_int(0)
+    m.add_string(PAYLOAD)
+    return m.asbytes()
+
+
+def main():
+    assert data_parse() == (1234, PAYLOAD)
+    assert kexinit_parse()[0][0] == KEX_ALGORITHMS
+    for name, fn in (
+        ('SFTP READ request build', read_request),
+        ('SFTP DATA 32 KB parse', data_parse),
+        ('SFTP STATUS parse', status_parse),
+        ('SFTP ATTRS parse', attrs_parse),
+        ('KEXINIT parse', kexinit_parse),
+        ('CHANNEL_DATA 32 KB build', channel_data),
+    ):
+        best = min(timeit.repeat(fn, number=NUMBER, repeat=5)) / NUMBER
+        print(f"{name:26s} {best * 1e9:8.0f} ns", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+SFTPFile prefetch bookkeeping (user-046): a prefetched sequential download
+should cost the same per megabyte whatever the file size, and a sparse
+readv of many small extents should not slow down with the request count.
+
+    python benchmarks/bench_prefetch.py [SIZE_MB ...]
+"""
+import inspect
+import random
+import sys
+
+import _harness
+from _harness import BLOCK, best_of, file_content
+from paramiko import SFTPFile
+
+READ_SIZE = 1 << 20
+
+
+def download(size, adaptive):
+    def run(sftp):
+        f = sftp.open('config', 'rb')
+        if adaptive:
+            f.prefetch(size, adaptive=True)
+        else:
+            f.prefetch(size)
+        got = 0
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                break
+            assert data == file_content(got, len(data), size)
+            got += len(data)
+        f.close()
+        assert got == size
+        return got
+    return run
+
+
+def readv(size, count):
+    def run(sftp):
+        rnd = random.Random(1)
+        offsets = sorted(rnd.sample(range(size // 4096), count))
+        chunks = [(offset * 4096, 1024) for offset in offsets]
+        f = sftp.open('config', 'rb')
+        done = 0
+        for (offset, length), data in zip(chunks, f.readv(chunks)):
+            assert data == file_content(offset, length, size)
+            done += 1
+        f.close()
+        assert done == count
+        return done
+    return run
+
+
+def main():
+    sizes = [int(arg) * BLOCK for arg in sys.argv[1:]] or [16 * BLOCK, 64 * BLOCK, 256 * BLOCK]
+    # a baseline tree (PARAMIKO_PATH) may predate adaptive prefetch
+    modes = (False, True) if 'adaptive' in inspect.signature(SFTPFile.prefetch).parameters else (False,)
+    print(f"LINK_DELAY_MS={_harness.LINK_DELAY_MS:g} LINK_MBPS={_harness.LINK_MBPS:g} runs={_harness.RUNS}")
+    for size in sizes:
+        mb = size // BLOCK
+        for adaptive in modes:
+            elapsed, cpu = best_of(download(size, adaptive), size=size)[:2]
+            print(
+                f"download {mb:4d} MB adaptive={adaptive!s:5s} {elapsed * 1000:8.1f} ms  "
+                f"cpu {cpu * 1000 / mb:6.2f} ms/MB  {mb / elapsed:7.1f} MB/s",
+                flush=True
+            )
+        count = min(size // 4096 // 2, 16000)
+        elapsed, cpu = best_of(readv(size, count), size=size)[:2]
+        print(
+            f"readv    {mb:4d} MB {count:5d} x 1 KB   {elapsed * 1000:8.1f} ms  "
+            f"cpu {cpu * 1e6 / count:6.1f} us/extent",
+            flush=True
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Packetizer receive path (user-048): read_message throughput on a loopback
+socket for bulk (32 KB) and small (64 B) packets, and the peak transient
+allocation per 32 KB packet, per cipher/MAC mode.
+
+    python benchmarks/bench_receive.py
+"""
+import socket
+import threading
+import time
+import tracemalloc
+from hashlib import sha256
+
+# imported for its side effect: puts the paramiko under test on sys.path
+import _harness  # noqa: F401
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from paramiko.message import Message
+from paramiko.packet import Packetizer
+
+KEY = b'k' * 16
+IV = b'i' * 16
+MAC_KEY = b'm' * 32
+MODES = ('none', 'ctr-hmac', 'ctr-etm', 'gcm')
+BULK = (4000, 32768)
+SMALL = (40000, 64)
+
+
+class CaptureSocket:
+    """Collects what a Packetizer sends"""
+
+    def __init__(self):
+        self.out = []
+
+    def send(self, data):
+        self.out.append(bytes(data))
+        return len(data)
+
+    def sendall(self, data):
+        self.out.append(bytes(data))
+
+    def sendmsg(self, bufs):
+        self.out.extend(bytes(b) for b in bufs)
+        return sum(len(b) for b in bufs)
+
+
+def set_outbound(packetizer, mode):
+    if mode == 'gcm':
+        packetizer.set_outbound_cipher(AESGCM(KEY), 16, None, 16, b'', aead=True, iv_out=IV[:12])
+    elif mode != 'none':
+        encryptor = Cipher(algorithms.AES(KEY), modes.CTR(IV)).encryptor()
+        packetizer.set_outbound_cipher(encryptor, 16, sha256, 32, MAC_KEY, sdctr=True, etm=mode == 'ctr-etm')
+
+
+def set_inbound(packetizer, mode):
+    if mode == 'gcm':
+        packetizer.set_inbound_cipher(AESGCM(KEY), 16, None, 16, b'', aead=True, iv_in=IV[:12])
+    elif mode != 'none':
+        decryptor = Cipher(algorithms.AES(KEY), modes.CTR(IV)).decryptor()
+        packetizer.set_inbound_cipher(decryptor, 16, sha256, 32, MAC_KEY, etm=mode == 'ctr-etm')
+
+
+def wire(mode, count, size):
+    """The encrypted byte stream of count CHANNEL_DATA packets and their payloads"""
+    capture = CaptureSocket()
+    packetizer = Packetizer(capture)
+    set_outbound(packetizer, mode)
+    payloads = []
+    for i in range(count):
+        m = Message()
+        m.add_byte(bytes([94]))
+        m.add_int(i)
+        m.add_string(bytes([i % 251]) * size)
+        payloads.append(m.asbytes())
+        packetizer.send_message(m)
+    return b''.join(capture.out), payloads
+
+
+def feed(sock, data):
+    try:
+        sock.sendall(data)
+    except OSError:
+        # the reader stopped early
+        pass
+
+
+def receive(mode, count, size, stream, trace=False):
+    """Read count packets from stream: (MB/s, packets/s, peak bytes/packet)"""
+    data, payloads = stream
+    a, b = socket.socketpair()
+    packetizer = Packetizer(a)
+    set_inbound(packetizer, mode)
+    threading.Thread(target=feed, args=(b, data), daemon=True).start()
+    peak = 0
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(count):
+        if trace:
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        cmd, m = packetizer.read_message()
+        if trace:
+            peak += tracemalloc.get_traced_memory()[1] - current
+        if i < 50 or i % 97 == 0:
+            assert bytes([cmd]) + m.asbytes() == payloads[i], (mode, i)
+    elapsed = time.perf_counter() - start
+    if trace:
+        tracemalloc.stop()
+    a.close()
+    b.close()
+    return count * size / elapsed / 1e6, count / elapsed, peak / count
+
+
+def main():
+    for mode in MODES:
+        bulk = wire(mode, *BULK)
+        small = wire(mode, *SMALL)
+        mbps = max(receive(mode, *BULK, bulk)[0] for _ in range(5))
+        peak = receive(mode, 400, BULK[1], bulk, trace=True)[2]
+        pps = max(receive(mode, *SMALL, small)[1] for _ in range(5))
+        print(
+            f"{mode:9s} 32 KB: {mbps:7.1f} MB/s  peak transient {peak / 1024:6.1f} KB/packet | "
+            f"64 B: {pps / 1000:6.1f} kpackets/s",
+            flush=True
+        )
+
+
+if __name__ == '__main__':
+    main()
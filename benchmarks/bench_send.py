@@ -0,0 +1,101 @@
+"""
+Packetizer send batching (user-049): send syscalls per packet and
+request latency for prefetch-heavy SFTP workloads, and what an open batch
+costs while nothing is queued (flusher wakeups) or when one packet is.
+
+    python benchmarks/bench_send.py
+"""
+import random
+import resource
+import socket
+import time
+
+import _harness
+from _harness import BLOCK, SIZE, best_of, file_content
+from paramiko.message import Message
+from paramiko.packet import Packetizer
+
+
+def download(sftp):
+    f = sftp.open('config', 'rb')
+    f.prefetch(SIZE)
+    got = 0
+    while True:
+        data = f.read(BLOCK)
+        if not data:
+            break
+        assert data == file_content(got, len(data))
+        got += len(data)
+    f.close()
+    return got
+
+
+READV_EXTENTS = min(8000, SIZE // 4096 // 2)
+
+
+def readv(sftp):
+    rnd = random.Random(1)
+    chunks = [(offset * 4096, 1024) for offset in sorted(rnd.sample(range(SIZE // 4096), READV_EXTENTS))]
+    f = sftp.open('config', 'rb')
+    for (offset, length), data in zip(chunks, f.readv(chunks)):
+        assert data == file_content(offset, length)
+    f.close()
+    return len(chunks)
+
+
+def stat(sftp):
+    latencies = []
+    for _ in range(2000):
+        start = time.perf_counter()
+        sftp.stat('config')
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies[len(latencies) // 2] * 1e6, latencies[int(len(latencies) * 0.99)] * 1e6
+
+
+def idle_batch():
+    """Context switches of an open, empty batch and the flush latency of one queued packet"""
+    a, b = socket.socketpair()
+    packetizer = Packetizer(a)
+    if not hasattr(packetizer, 'start_batch'):
+        print("idle batch: no batching in this paramiko")
+        return
+    packetizer.start_batch()
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw
+    time.sleep(1.0)
+    switches = resource.getrusage(resource.RUSAGE_SELF).ru_nvcsw - before
+    latencies = []
+    for i in range(200):
+        m = Message()
+        m.add_byte(b'^')
+        m.add_int(i)
+        start = time.perf_counter()
+        packetizer.send_message(m)
+        b.recv(100)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.003)
+    packetizer.end_batch()
+    a.close()
+    b.close()
+    latencies.sort()
+    print(
+        f"idle batch: {switches} voluntary context switches/s, queued packet flush "
+        f"p50 {latencies[100] * 1e3:.2f} ms p99 {latencies[198] * 1e3:.2f} ms"
+    )
+
+
+def main():
+    print(f"SIZE_MB={SIZE // BLOCK} LINK_DELAY_MS={_harness.LINK_DELAY_MS:g} LINK_MBPS={_harness.LINK_MBPS:g} runs={_harness.RUNS}")
+    for name, fn in (('download', download), (f'readv {READV_EXTENTS}x1KB', readv), ('stat x2000', stat)):
+        elapsed, cpu, sends, packets, result, _ = best_of(fn)
+        extra = f"  p50 {result[0]:.0f} us p99 {result[1]:.0f} us" if fn is stat else ''
+        print(
+            f"{name:15s} {elapsed * 1000:8.1f} ms  cpu {cpu * 1000:8.1f} ms  packets {packets:6d}  "
+            f"send syscalls {sends:6d}{extra}",
+            flush=True
+        )
+    idle_batch()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+SSH transport profiles (user-032): prefetched SFTP download of config-like
+text for each TRANSPORT_PROFILES entry x file size x simulated round trip,
+with the transport built by the Lambda's own make_transport_factory.
+
+    python benchmarks/bench_transport.py [--profiles bulk,default] [--sizes 8,32]
+        [--rtt 0,20] [--mbps 100]
+
+RTTs are in ms (each direction of the delaying proxy gets half); --mbps
+caps the link bandwidth, where compression pays off.  Packets in counts
+the SSH packets the client received: with a 32 KB max packet a 32 KB SFTP
+DATA reply arrives split in two.
+"""
+import argparse
+import os
+
+from _harness import BLOCK, best_of, file_content
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+import lambda_function as lf  # noqa: E402
+
+
+def download(size):
+    def run(sftp):
+        f = sftp.open('bigip.conf', 'rb')
+        f.prefetch(size)
+        got = 0
+        while True:
+            data = f.read(BLOCK)
+            if not data:
+                break
+            assert data == file_content(got, len(data), size, 'config')
+            got += len(data)
+        f.close()
+        return got
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--profiles', default=','.join(lf.TRANSPORT_PROFILES))
+    parser.add_argument('--sizes', default='8,32', help='file sizes in MB')
+    parser.add_argument('--rtt', default='0,20', help='round trips in ms')
+    parser.add_argument('--mbps', type=float, default=0, help='link bandwidth in Mbit/s (0: unlimited)')
+    args = parser.parse_args()
+
+    print(f"link {args.mbps:g} Mbit/s" if args.mbps else "link unlimited")
+    print(f"{'profile':16s} {'size':>6s} {'rtt':>6s} {'time':>10s} {'MB/s':>7s} {'cpu':>9s} {'packets in':>10s}")
+    for profile in args.profiles.split(','):
+        transport_profile = lf.TRANSPORT_PROFILES[profile]
+        for mb in (int(value) for value in args.sizes.split(',')):
+            for rtt in (float(value) for value in args.rtt.split(',')):
+                elapsed, cpu, _, _, _, received = best_of(
+                    download(mb * BLOCK),
+                    size=mb * BLOCK,
+                    content='config',
+                    ciphers=None,
+                    compress=transport_profile.get('compress', False),
+                    transport_factory=lf.make_transport_factory(transport_profile),
+                    link_delay_ms=rtt / 2,
+                    link_mbps=args.mbps
+                )
+                print(
+                    f"{profile:16s} {mb:4d}MB {rtt:4.0f}ms {elapsed * 1000:8.0f}ms {mb / elapsed:7.1f} "
+                    f"{cpu * 1000:7.0f}ms {received:10d}",
+                    flush=True
+                )
+
+
+if __name__ == '__main__':
+    main()
@@ -38,23 +38,65 @@ Previous Features:
 
 import os
 import zipfile
+import gzip
+import base64
 import logging
 import re
 import json
+import fnmatch
+import mmap
+import hashlib
+import tarfile
+import stat
+import shlex
+import threading
+import http.client
+import ssl
+from urllib.parse import urlsplit, quote
+from urllib.error import HTTPError
+from email.utils import parsedate_to_datetime
+import heapq
+import uuid
+import zlib
+from bisect import bisect_left
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Iterator, Iterable, Callable, Optional
 import boto3
+from boto3.dynamodb.conditions import Key, Attr
+from boto3.exceptions import S3UploadFailedError
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from decimal import Decimal
 import paramiko
 
+# Optional columnar export - only when a Parquet writer is bundled (e.g. via a layer)
+try:
+    import pyarrow
+    import pyarrow.parquet as pyarrow_parquet
+except ImportError:
+    pyarrow = None
+
 # AWS Clients
 s3_client = boto3.client('s3')
 sns_client = boto3.client('sns')
 secrets_client = boto3.client('secretsmanager')
 dynamodb = boto3.resource('dynamodb')
+# Async (Event) invokes return at once; no client-side retries, a retried
+# invoke could dispatch a run twice. Shard invokes use their own client
+# (see run_shards_lambda)
+LAMBDA_CONNECT_TIMEOUT_SECONDS = 5
+LAMBDA_EVENT_TIMEOUT_SECONDS = 10
+lambda_client = boto3.client('lambda', config=Config(
+    connect_timeout=LAMBDA_CONNECT_TIMEOUT_SECONDS,
+    read_timeout=LAMBDA_EVENT_TIMEOUT_SECONDS,
+    retries={'max_attempts': 0}
+))
 
 # Environment variables
 BUCKET_NAME = os.environ.get('S3_BUCKET_NAME')
@@ -62,6 +104,202 @@ SECRET_NAME = os.environ.get('SECRET_NAME')
 SNS_TOPIC_ARN = os.environ.get('SNS_TOPIC_ARN')
 DYNAMODB_TABLE = os.environ.get('DYNAMODB_TABLE_NAME', 'f5-comparison-history')
 TEAMS_WEBHOOK_URL = os.environ.get('TEAMS_WEBHOOK_URL', '')
+HISTORY_TTL_DAYS = int(os.environ.get('HISTORY_TTL_DAYS', '90'))
+EXPORT_RESULTS = os.environ.get('EXPORT_RESULTS', 'true').lower() == 'true'
+EXPORT_PREFIX = os.environ.get('EXPORT_PREFIX', 'exports/comparisons')
+ARCHIVE_CONFIGS = os.environ.get('ARCHIVE_CONFIGS', 'true').lower() == 'true'
+ARCHIVE_PREFIX = os.environ.get('ARCHIVE_PREFIX', 'archive')
+ARCHIVE_WORKERS = 16
+SFTP_CHANNELS = int(os.environ.get('SFTP_CHANNELS', '1'))
+DEPENDENCY_ANALYSIS = os.environ.get('DEPENDENCY_ANALYSIS', 'true').lower() == 'true'
+TRANSPORT_PROFILE = os.environ.get('TRANSPORT_PROFILE', 'default')
+SHARD_BACKEND = os.environ.get('SHARD_BACKEND', 'lambda')
+SHARD_FUNCTION_NAME = os.environ.get('SHARD_FUNCTION_NAME', os.environ.get('AWS_LAMBDA_FUNCTION_NAME', ''))
+SHARD_PREFIX = 'shards'
+SHARD_INVOKE_MAX_SECONDS = 80   # synchronous shard invoke wait, below the 90 s function timeout
+SHARD_WORKERS = 16              # concurrent shard invocations
+
+# Deadline-aware execution (budget from context.get_remaining_time_in_millis)
+CHECKPOINT_PREFIX = 'checkpoints'
+DEADLINE_COMPARE_MIN_MS = 20000   # needed after parsing to compare and emit a summary
+DEADLINE_REPORT_MIN_MS = 25000    # needed after comparing to build/upload HTML and publish
+DEADLINE_SHARD_MARGIN_MS = 10000  # left after waiting for shard workers (degraded summary + checkpoint)
+DEADLINE_ARCHIVE_MIN_MS = 15000   # needed after publishing to start archiving the parsed objects
+DEADLINE_ARCHIVE_STOP_MS = 5000   # archive blob uploads stop below this (no manifest is written)
+AUTO_RESUME = os.environ.get('AUTO_RESUME', 'true').lower() == 'true'
+MAX_RESUME_ATTEMPTS = 3
+
+# SSH transport profiles for config transfer
+# - compress:  zlib transport compression (F5 config text compresses ~8-10x)
+# - ciphers:   preferred first; AES-GCM is AEAD so no separate MAC pass
+#              (chacha20-poly1305 is not implemented by paramiko)
+# - window_size: channel flow control window for bulk reads (8 MB keeps a
+#              prefetch in flight across the VPN round trip)
+# - max_packet_size: largest CHANNEL_DATA the device may send us; paramiko's
+#              32 KB default splits every 32 KB SFTP DATA reply (+13 bytes of
+#              header) in two packets, 64 KB carries each in one
+TRANSPORT_PROFILES = {
+    'default': {},
+    'bulk': {
+        'compress': True,
+        'ciphers': ('aes128-gcm@openssh.com', 'aes256-gcm@openssh.com', 'aes128-ctr'),
+        'window_size': 8 * 1024 * 1024,
+        'max_packet_size': 64 * 1024
+    },
+    'bulk-nocompress': {
+        'compress': False,
+        'ciphers': ('aes128-gcm@openssh.com', 'aes256-gcm@openssh.com', 'aes128-ctr'),
+        'window_size': 8 * 1024 * 1024,
+        'max_packet_size': 64 * 1024
+    }
+}
+
+# Config ingest: 'stream' parses blocks while the SFTP read is in flight,
+# 'file' downloads to /tmp first and parses the mmap'd file
+INGEST_MODE = os.environ.get('INGEST_MODE', 'file')
+STREAM_CHUNK_BYTES = 256 * 1024                 # SFTP read size fed to the streaming parser
+# Config source: 'file' (single bigip.conf), 'directory' (<root>/bigip.conf +
+# <root>/partitions/*/bigip.conf), 'ucs' (UCS archive on the device or s3://...)
+# or 'rest' (iControl REST, see fetch_rest_index)
+CONFIG_SOURCE = os.environ.get('CONFIG_SOURCE', 'file')
+UCS_CONFIG_MEMBER_PATTERN = re.compile(r'^(?:\./)?config/(?:partitions/[^/]+/)?bigip\.conf$')
+DIRECTORY_FETCH_WORKERS = 8
+
+# iControl REST ingest (config source 'rest'): collections are read with $select
+# projections, paged with $top/$skip in parallel over keep-alive HTTPS connections,
+# and rendered back into tmsh statements for the streaming scanner
+REST_PAGE_SIZE = 500
+REST_FETCH_WORKERS = 8
+REST_TIMEOUT_SECONDS = 30
+REST_TOKEN_SECONDS = 1200                       # BIG-IP default auth token lifetime
+REST_VERIFY_TLS = os.environ.get('REST_VERIFY_TLS', 'true').lower() == 'true'
+# (tmsh header, REST collection path, $select fields) - subcollection references
+# (*Reference) are expanded inline with expandSubcollections
+REST_VS_COLLECTION = ('ltm virtual', 'ltm/virtual', (
+    'fullPath', 'destination', 'source', 'pool', 'ipProtocol', 'mask', 'sourceAddressTranslation',
+    'translateAddress', 'translatePort', 'persist', 'fallbackPersistence', 'rules', 'vlans',
+    'vlansEnabled', 'vlansDisabled', 'connectionLimit', 'description', 'profilesReference'
+))
+REST_OBJECT_COLLECTIONS = [
+    ('ltm pool', 'ltm/pool', ('fullPath', 'loadBalancingMode', 'minActiveMembers', 'monitor', 'membersReference')),
+    ('ltm node', 'ltm/node', ('fullPath', 'address', 'monitor', 'connectionLimit')),
+    ('ltm rule', 'ltm/rule', ('fullPath', 'apiAnonymous')),
+    *[
+        (f"ltm monitor {kind}", f"ltm/monitor/{kind}",
+         ('fullPath', 'defaultsFrom', 'interval', 'timeout', 'send', 'recv', 'destination'))
+        for kind in ('http', 'https', 'tcp', 'tcp-half-open', 'icmp', 'gateway-icmp')
+    ],
+    *[
+        (f"ltm profile {kind}", f"ltm/profile/{kind}", ('fullPath', 'defaultsFrom'))
+        for kind in ('http', 'tcp', 'fastl4', 'udp', 'client-ssl', 'server-ssl', 'one-connect', 'http-compression')
+    ],
+    *[
+        (f"ltm persistence {kind}", f"ltm/persistence/{kind}", ('fullPath', 'defaultsFrom', 'timeout'))
+        for kind in ('cookie', 'source-addr')
+    ]
+]
+REST_KEY_NAMES = {'tmDefault': 'default'}
+REST_SKIPPED_FIELDS = {'name', 'partition', 'fullPath', 'kind', 'selfLink', 'generation', 'nameReference'}
+REST_UNQUOTED_KEYS = {'monitor'}                # tmsh writes monitor rules ("a and b") unquoted
+REST_CAMEL_PATTERN = re.compile(r'(?<!^)(?=[A-Z])')
+rest_connection_pool = {}                       # host -> idle keep-alive connections
+rest_tokens = {}                                # host -> (X-F5-Auth-Token, expiry)
+rest_login_locks = {}                           # host -> lock held while logging in
+rest_lock = threading.Lock()
+
+# Change sentinel: last seen config fingerprints per device (DynamoDB 'sentinel#<host>' items)
+SENTINEL_PREFIX = 'sentinel'
+SENTINEL_SSH_IDLE_SECONDS = 240     # pooled sessions idle longer than this are reconnected
+SENTINEL_SFTP_TIMEOUT_SECONDS = 10  # per SFTP request on a pooled session (a hung device is evicted)
+SYNC_STATUS_PATTERN = re.compile(r'^\s*Status\s+(.+?)\s*$', re.MULTILINE)
+ssh_session_pool = {}               # host -> (SSHClient, SFTPClient, last used) - survives warm invocations
+
+# Notifications (webhook + per-VS SNS alerts), delivered off the critical path
+NOTIFY_MAX_RETRIES = 3
+NOTIFY_TIMEOUT_SECONDS = 10
+NOTIFY_RETRY_AFTER_MAX_SECONDS = 10 # cap on a server-requested Retry-After
+NOTIFY_RATE_PER_SECOND = 2.0        # token bucket refill per destination
+NOTIFY_BURST = 4                    # token bucket capacity per destination
+SNS_BATCH_SIZE = 10                 # PublishBatch limit
+ALERTS_PREFIX = 'alerts'            # S3 keys of last published alert fingerprints per pair
+http_connection_pool = {}           # (scheme, netloc) -> idle keep-alive connections
+rate_limiters = {}                  # destination -> {'tokens': float, 'updated': float}
+notification_lock = threading.Lock()
+notification_executor = ThreadPoolExecutor(max_workers=4)
+
+# Parallel SFTP download tuning
+PARALLEL_DOWNLOAD_MIN_BYTES = 4 * 1024 * 1024   # smaller files use a single sftp.get
+PARALLEL_DOWNLOAD_CHUNK_BYTES = 1024 * 1024     # readv chunk (split into 32 KB requests by paramiko)
+# Outstanding read requests per channel: fixed, or the upper bound of the
+# adaptive window (grown/shrunk from measured RTT and throughput) with ADAPTIVE_PREFETCH
+ADAPTIVE_PREFETCH = os.environ.get('ADAPTIVE_PREFETCH', 'true').lower() == 'true'
+PARALLEL_DOWNLOAD_PREFETCH = 256 if ADAPTIVE_PREFETCH else 64
+
+# Per-VS timeline cache (module level - survives warm invocations)
+VS_TIMELINE_CACHE_SIZE = 256
+VS_TIMELINE_CACHE_SECONDS = 300
+vs_timeline_cache = OrderedDict()
+
+# Parser patterns (str for in-memory text, bytes for mmap'd files)
+# Block tokens: match.lastindex tells '{', '}', '"' and a column-0 'ltm ' header
+# apart (None: a backslash escape). Braces inside double-quoted TCL strings or
+# escaped don't count; a header inside an open block means it is unbalanced
+VS_HEADER_PATTERN = re.compile(r'ltm virtual ([^\s{]+)\s*\{')
+VS_HEADER_PATTERN_BYTES = re.compile(rb'ltm virtual ([^\s{]+)\s*\{')
+BLOCK_TOKEN_PATTERN = re.compile(r'(\{)|(\})|(")|(\n)ltm |\\.', re.DOTALL)
+BLOCK_TOKEN_PATTERN_BYTES = re.compile(rb'(\{)|(\})|(")|(\n)ltm |\\.', re.DOTALL)
+OPEN_TOKEN, CLOSE_TOKEN, QUOTE_TOKEN, HEADER_TOKEN = 1, 2, 3, 4
+BLOCK_TOKEN_MAX_LENGTH = len('\nltm ')
+
+# Shared objects referenced from virtual servers (dependency graph)
+# Headers: 'ltm pool NAME {', 'ltm monitor TYPE NAME {', 'ltm profile TYPE NAME {', ...
+OBJECT_HEADER_PATTERN = re.compile(r'ltm (pool|node|rule|monitor|profile|persistence)(?: \S+)? ([^\s{]+)\s*\{')
+OBJECT_HEADER_PATTERN_BYTES = re.compile(rb'ltm (pool|node|rule|monitor|profile|persistence)(?: \S+)? ([^\s{]+)\s*\{')
+# Attribute -> kind of the objects it references (None: same kind as the referrer)
+REFERENCE_KEYS = {
+    'pool': 'pool',
+    'profiles': 'profile',
+    'rules': 'rule',
+    'persist': 'persistence',
+    'fallback-persistence': 'persistence',
+    'members': 'node',
+    'monitor': 'monitor',
+    'defaults-from': None
+}
+# Site-specific addresses (10.100.x.x NJ / 10.200.x.x HRZ) -> SITE.x.x
+SITE_IP_PATTERN = re.compile(r'10\.(?:100|200)\.(\d+\.\d+)')
+
+# Sensitive data masking (compiled once)
+SENSITIVE_PATTERNS = [
+    (re.compile(r'password\s+\S+', re.IGNORECASE), 'password ********'),
+    (re.compile(r'secret\s+\S+', re.IGNORECASE), 'secret ********'),
+    (re.compile(r'key\s+\S+', re.IGNORECASE), 'key ********'),
+    (re.compile(r'cert\s+\S+', re.IGNORECASE), 'cert ********'),
+]
+
+# Timestamp metadata - always ignored in comparisons and object hashes
+TIMESTAMP_KEYS = {'last-modified-time', 'creation-time'}
+
+# Value canonicalization
+# Attributes whose brace-list members are unordered and compared as sets
+SET_VALUED_KEYS = {
+    'profiles', 'vlans', 'policies', 'persist', 'members',
+    'security-log-profiles', 'clone-pools', 'metadata'
+}
+# Attributes compared as text (iRule TCL bodies): whitespace-normalized, never reordered
+TEXT_VALUE_KEYS = {'definition'}
+# Quoted strings stay single tokens; braces are tokens of their own
+VALUE_TOKEN_PATTERN = re.compile(r'"(?:[^"\\]|\\.)*"|[{}]|[^\s{}"]+')
+
+# Line-level diff of multi-line values (iRule bodies)
+LINE_DIFF_CONTEXT = 3         # unchanged lines kept around each hunk
+LINE_DIFF_CACHE_SIZE = 1024   # (content hash, content hash) -> hunks, per container
+line_diff_cache = OrderedDict()
+
+# Report search index: tokens (and their ./_/- parts) of names, destinations, pools, differing keys
+SEARCH_TOKEN_PATTERN = re.compile(r'[^a-z0-9._-]+')
+SEARCH_SUBTOKEN_PATTERN = re.compile(r'[._-]+')
+SEARCH_INDEX_KEYS = {'destination', 'pool'}
 
 # Logger setup
 logger = logging.getLogger()
@@ -87,36 +325,124 @@ def copy_file_from_remote(
     username: str,
     private_key_path: str,
     remote_path: str,
-    local_path: str
+    local_path: str,
+    channels: int = 1,
+    profile: str = 'default'
 ) -> None:
-    """Copy file from remote server via SSH/SFTP with proper cleanup"""
+    """
+    Copy file from remote server via SSH/SFTP with proper cleanup
+    With channels > 1 large files are fetched as parallel byte ranges over
+    several SFTP channels on the same transport
+    profile selects a TRANSPORT_PROFILES entry (compression, ciphers, window)
+    """
     transport = None
     ssh = paramiko.SSHClient()
-    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     
     try:
-        logger.info(f"Connecting to {host} via SSH")
-        ssh.connect(
-            hostname=host,
-            username=username,
-            key_filename=private_key_path,
-            timeout=30,
-            auth_timeout=30,
-            banner_timeout=30
-        )
-        
         # Get transport BEFORE opening SFTP (critical for cleanup!)
-        transport = ssh.get_transport()
+        transport = connect_ssh(ssh, host, username, private_key_path, profile)
         
         logger.info(f"Connected to {host}, downloading file via SFTP")
-        sftp = ssh.open_sftp()
         
+        if channels > 1:
+            download_file_ranges(transport, remote_path, local_path, channels)
+            logger.info(f"File copied successfully from {host} ({channels} channels)")
+        else:
+            sftp = ssh.open_sftp()
+            try:
+                sftp.get(remote_path, local_path)
+                logger.info(f"File copied successfully from {host}")
+            finally:
+                sftp.close()
+            
+    finally:
+        ssh.close()
+        # Close transport explicitly to stop background threads
+        if transport:
+            transport.close()
+
+
+def connect_ssh(
+    ssh: paramiko.SSHClient,
+    host: str,
+    username: str,
+    private_key_path: str,
+    profile: str = 'default'
+) -> paramiko.Transport:
+    """Connect ssh to host with a TRANSPORT_PROFILES entry and return its transport"""
+    transport_profile = TRANSPORT_PROFILES.get(profile)
+    if transport_profile is None:
+        raise ValueError(f"Unknown transport profile: {profile}")
+    
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    
+    logger.info(f"Connecting to {host} via SSH")
+    ssh.connect(
+        hostname=host,
+        username=username,
+        key_filename=private_key_path,
+        timeout=30,
+        auth_timeout=30,
+        banner_timeout=30,
+        compress=transport_profile.get('compress', False),
+        transport_factory=make_transport_factory(transport_profile)
+    )
+    
+    transport = ssh.get_transport()
+    logger.info(
+        f"Transport to {host}: profile={profile}, cipher={transport.remote_cipher}, "
+        f"compression={transport.remote_compression}"
+    )
+    return transport
+
+
+def stream_parse_remote(
+    host: str,
+    username: str,
+    private_key_path: str,
+    remote_path: str,
+    scope: Dict[str, Any] = None,
+    with_dependencies: bool = True,
+    profile: str = 'default',
+    source: str = 'file'
+) -> Dict[str, Any]:
+    """
+    Parse a remote config while it downloads - no temp file
+    The SFTP file is prefetched (read requests stay in flight on the transport
+    thread) and each chunk is fed straight to the streaming parser, so virtual
+    server blocks are masked and parsed while the next bytes are still arriving.
+    Shared object blocks are kept raw until the dependency graph is resolved,
+    so with with_dependencies the memory held is roughly their total size
+    source 'ucs' streams a UCS archive, 'directory' every partition config
+    under remote_path (see scan_remote_directory)
+    """
+    transport = None
+    ssh = paramiko.SSHClient()
+    
+    try:
+        transport = connect_ssh(ssh, host, username, private_key_path, profile)
+        
+        logger.info(f"Connected to {host}, streaming {remote_path} via SFTP")
+        sftp = ssh.open_sftp()
         try:
-            sftp.get(remote_path, local_path)
-            logger.info(f"File copied successfully from {host}")
+            start = time.time()
+            if source == 'directory':
+                state = scan_remote_directory(transport, sftp, remote_path, scope, with_dependencies)
+            else:
+                with sftp.open(remote_path, 'rb') as remote_file:
+                    remote_file.prefetch(max_concurrent_requests=PARALLEL_DOWNLOAD_PREFETCH, adaptive=ADAPTIVE_PREFETCH)
+                    if source == 'ucs':
+                        state = scan_ucs_archive(remote_file, scope, with_dependencies)
+                    else:
+                        state = scan_config_stream(
+                            iter_file_chunks(remote_file, STREAM_CHUNK_BYTES), scope, True, with_dependencies
+                        )
+            index = build_config_index(state, True, with_dependencies)
+            logger.info(f"Streamed and parsed {remote_path} from {host} in {time.time() - start:.2f}s")
+            return index
         finally:
             sftp.close()
-            
+    
     finally:
         ssh.close()
         # Close transport explicitly to stop background threads
@@ -124,188 +450,1712 @@ def copy_file_from_remote(
             transport.close()
 
 
+def iter_file_chunks(file_obj, chunk_size: int) -> Iterator[bytes]:
+    """Yield successive reads of a (local or SFTP) file object until EOF"""
+    while True:
+        chunk = file_obj.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def make_transport_factory(transport_profile: Dict[str, Any]):
+    """
+    Build a paramiko transport_factory applying a transport profile
+    Window/packet sizes become the transport defaults (used by every SFTP
+    channel opened on it) and profile ciphers are moved to the front of the
+    negotiation order
+    """
+    def factory(sock, **kwargs):
+        if 'window_size' in transport_profile:
+            kwargs['default_window_size'] = transport_profile['window_size']
+        if 'max_packet_size' in transport_profile:
+            kwargs['default_max_packet_size'] = transport_profile['max_packet_size']
+        
+        transport = paramiko.Transport(sock, **kwargs)
+        
+        preferred = transport_profile.get('ciphers')
+        if preferred:
+            options = transport.get_security_options()
+            available = options.ciphers
+            options.ciphers = tuple(c for c in preferred if c in available) + tuple(
+                c for c in available if c not in preferred
+            )
+        
+        return transport
+    
+    return factory
+
+
+def split_ranges(size: int, parts: int) -> List[Tuple[int, int]]:
+    """Split [0, size) into up to `parts` contiguous (offset, length) ranges"""
+    part_size = -(-size // parts)
+    return [(offset, min(part_size, size - offset)) for offset in range(0, size, part_size)]
+
+
+def download_file_ranges(
+    transport,
+    remote_path: str,
+    local_path: str,
+    channels: int
+) -> None:
+    """
+    Download a remote file as `channels` byte ranges fetched concurrently
+    Each range gets its own SFTP channel on the shared transport and is read
+    with SFTPFile.readv (pipelined requests); data is written straight into a
+    preallocated local file at its offset
+    """
+    sftp = paramiko.SFTPClient.from_transport(transport)
+    try:
+        size = sftp.stat(remote_path).st_size
+        if size < PARALLEL_DOWNLOAD_MIN_BYTES:
+            sftp.get(remote_path, local_path)
+            return
+    finally:
+        sftp.close()
+    
+    ranges = split_ranges(size, channels)
+    logger.info(f"Downloading {size} bytes as {len(ranges)} parallel ranges")
+    
+    with open(local_path, 'wb') as f:
+        f.truncate(size)
+        fd = f.fileno()
+        
+        def fetch_range(byte_range: Tuple[int, int]) -> int:
+            start, length = byte_range
+            chunks = [
+                (offset, min(PARALLEL_DOWNLOAD_CHUNK_BYTES, start + length - offset))
+                for offset in range(start, start + length, PARALLEL_DOWNLOAD_CHUNK_BYTES)
+            ]
+            received = 0
+            channel_sftp = paramiko.SFTPClient.from_transport(transport)
+            try:
+                with channel_sftp.open(remote_path, 'rb') as remote_file:
+                    blocks = remote_file.readv(chunks, PARALLEL_DOWNLOAD_PREFETCH, ADAPTIVE_PREFETCH)
+                    for (offset, _), data in zip(chunks, blocks):
+                        os.pwrite(fd, data, offset)
+                        received += len(data)
+            finally:
+                channel_sftp.close()
+            return received
+        
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            received = sum(executor.map(fetch_range, ranges))
+    
+    if received != size:
+        raise IOError(f"Parallel download of {remote_path} incomplete: {received}/{size} bytes")
+
+
 def mask_sensitive_data(content: str) -> str:
     """Mask sensitive information in configuration"""
     logger.info("Masking sensitive information")
     
-    patterns = {
-        r'password\s+\S+': 'password ********',
-        r'secret\s+\S+': 'secret ********',
-        r'key\s+\S+': 'key ********',
-        r'cert\s+\S+': 'cert ********',
-    }
-    
-    masked_content = content
-    for pattern, replacement in patterns.items():
-        masked_content = re.sub(pattern, replacement, masked_content, flags=re.IGNORECASE)
+    masked_content = mask_block(content)
     
     logger.info("Successfully masked sensitive data")
     return masked_content
 
 
-def parse_ltm_virtual_servers(content: str) -> Dict[str, Dict[str, str]]:
-    """Parse LTM virtual server configurations from F5 config file"""
+def mask_block(content: str) -> str:
+    """Mask sensitive information in a single extracted block (no logging - called per block)"""
+    for pattern, replacement in SENSITIVE_PATTERNS:
+        content = pattern.sub(replacement, content)
+    return content
+
+
+def get_partition(vs_name: str) -> str:
+    """
+    Determine the administrative partition from a full virtual server path
+    Examples:
+        /Common/prod_app     -> Common
+        /App1/sub/sb_app     -> App1
+        prod_app             -> Common
+    """
+    if vs_name.startswith('/'):
+        return vs_name.split('/')[1]
+    return 'Common'
+
+
+def build_parse_scope(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Build the parse scope from event parameters
+    Accepts lists or comma-separated strings for:
+    - partitions:    ['Common', 'App1']
+    - environments:  ['PROD', 'CORP']
+    - name_patterns: ['prod_*', '*_api*'] (glob, case-insensitive)
+    Returns an empty scope (everything in scope) when no filters are given
+    """
+    def as_list(value) -> List[str]:
+        if not value:
+            return []
+        if isinstance(value, str):
+            value = value.split(',')
+        return [v.strip() for v in value if v and v.strip()]
+
+    scope = {}
+
+    partitions = as_list(event.get('partitions'))
+    if partitions:
+        scope['partitions'] = set(p.strip('/') for p in partitions)
+
+    environments = as_list(event.get('environments'))
+    if environments:
+        scope['environments'] = set(e.upper() for e in environments)
+
+    name_patterns = as_list(event.get('name_patterns'))
+    if name_patterns:
+        scope['name_patterns'] = name_patterns
+        scope['name_regex'] = re.compile(
+            '|'.join(fnmatch.translate(pattern.lower()) for pattern in name_patterns)
+        )
+
+    return scope
+
+
+def is_in_scope(vs_name: str, scope: Dict[str, Any]) -> bool:
+    """Check a virtual server path against the parse scope (cheapest checks first)"""
+    if not scope:
+        return True
+
+    if 'partitions' in scope and get_partition(vs_name) not in scope['partitions']:
+        return False
+
+    short_name = vs_name.split('/')[-1]
+
+    if 'environments' in scope and get_environment_type(short_name) not in scope['environments']:
+        return False
+
+    if 'name_regex' in scope:
+        # Globs match either the short name or the full path
+        if not (scope['name_regex'].match(short_name.lower()) or scope['name_regex'].match(vs_name.lower())):
+            return False
+
+    return True
+
+
+def build_vs_header_pattern(scope: Dict[str, Any] = None, as_bytes: bool = False) -> re.Pattern:
+    """
+    Compile the 'ltm virtual' header regex
+    A partition filter is pushed down into the regex itself, so headers in
+    other partitions are never even matched; it selects exactly what
+    get_partition does (unqualified names are in Common)
+    """
+    if scope and 'partitions' in scope:
+        partitions = '|'.join(re.escape(p) for p in sorted(scope['partitions']))
+        names = r'/(?:' + partitions + r')/[^\s{]+'
+        if 'Common' in scope['partitions']:
+            names += r'|[^\s{/][^\s{]*'
+        pattern = r'ltm virtual (' + names + r')\s*\{'
+        return re.compile(pattern.encode('utf-8') if as_bytes else pattern)
+    return VS_HEADER_PATTERN_BYTES if as_bytes else VS_HEADER_PATTERN
+
+
+def find_block_end(content, open_pos: int) -> int:
+    """
+    Return the index of the '}' closing the '{' at open_pos, or -1 if unbalanced
+    Jumps from token to token with a regex instead of walking every character;
+    quoted and escaped braces are skipped (see BLOCK_TOKEN_PATTERN)
+    Works on str, bytes and mmap content
+    """
+    token_pattern = BLOCK_TOKEN_PATTERN if isinstance(content, str) else BLOCK_TOKEN_PATTERN_BYTES
+    brace_count = 0
+    quoted = False
+    for match in token_pattern.finditer(content, open_pos):
+        token = match.lastindex
+        if token == HEADER_TOKEN:
+            return -1
+        if token == QUOTE_TOKEN:
+            quoted = not quoted
+        elif quoted or token is None:
+            continue
+        elif token == OPEN_TOKEN:
+            brace_count += 1
+        else:
+            brace_count -= 1
+            if brace_count == 0:
+                return match.start()
+    return -1
+
+
+def parse_ltm_virtual_servers(
+    content,
+    scope: Dict[str, Any] = None,
+    mask: bool = False
+) -> Dict[str, Dict[str, str]]:
+    """
+    Parse LTM virtual server configurations from F5 config file
+    Blocks outside the scope (partition/environment/name filters) are skipped
+    by brace-matching only - no config dict is built for them
+    
+    content may be a str or a bytes-like object (bytes / mmap). For bytes the
+    scan runs on bytes regexes and only the names and block bodies that are
+    actually parsed get decoded (via memoryview slices, no full-file copy).
+    With mask=True each extracted block is masked before parsing.
+    """
+    return parse_ltm_config(content, scope, mask)['virtual_servers']
+
+
+def parse_ltm_config(
+    content,
+    scope: Dict[str, Any] = None,
+    mask: bool = False,
+    with_dependencies: bool = False
+) -> Dict[str, Any]:
+    """
+    Parse an F5 config into a config index:
+    - virtual_servers: {vs path: config}
+    With with_dependencies=True the dependency graph of the in-scope virtual
+    servers is added (see resolve_dependencies):
+    - objects:    {object id: config} - only objects reachable from a VS
+    - references: {VS path / object id: [referenced object ids]}
+    - impacts:    {object id: [VS paths depending on it]} (reverse index)
+    - defined:    [object id] - every object defined in the config, reachable or not
+    """
+    if isinstance(content, str):
+        return parse_config_index(content, content, scope, mask, with_dependencies)
+    
+    # Release the memoryview before returning so an mmap can be closed
+    with memoryview(content) as view:
+        return parse_config_index(content, view, scope, mask, with_dependencies)
+
+
+def decode_block(content, view, open_pos: int, block_end: int, mask: bool) -> str:
+    """Body of the block between open_pos and block_end as (optionally masked) text"""
+    block_content = view[open_pos + 1:block_end]
+    if not isinstance(content, str):
+        block_content = str(block_content, 'utf-8', errors='replace')
+    if mask:
+        block_content = mask_block(block_content)
+    return block_content
+
+
+def parse_config_index(
+    content,
+    view,
+    scope: Dict[str, Any],
+    mask: bool,
+    with_dependencies: bool
+) -> Dict[str, Any]:
+    """Scan 'ltm virtual' blocks in content, slicing block bodies out of view"""
     virtual_servers = {}
+    references = {}
     
-    vs_pattern = r'ltm virtual ([^\s{]+)\s*\{'
-    matches = re.finditer(vs_pattern, content)
+    is_bytes = not isinstance(content, str)
+    vs_pattern = build_vs_header_pattern(scope, as_bytes=is_bytes)
+    pos = 0
     
-    for match in matches:
+    while True:
+        match = vs_pattern.search(content, pos)
+        if not match:
+            break
+        
         vs_name = match.group(1)
-        start_pos = match.start()
+        if is_bytes:
+            vs_name = vs_name.decode('utf-8', errors='replace')
+        open_pos = match.end() - 1
+        block_end = find_block_end(content, open_pos)
+        if block_end == -1:
+            # Skipped like the stream splitter does; scanning resumes at the next header
+            logger.warning(f"Unbalanced braces in virtual server block: {vs_name}")
+            pos = match.end()
+            continue
         
-        brace_count = 0
-        in_vs_block = False
-        block_start = 0
+        # Resume scanning after this block (skipped or not)
+        pos = block_end + 1
         
-        for i in range(start_pos, len(content)):
-            if content[i] == '{':
-                if not in_vs_block:
-                    in_vs_block = True
-                    block_start = i + 1
-                brace_count += 1
-            elif content[i] == '}':
-                brace_count -= 1
-                if brace_count == 0 and in_vs_block:
-                    block_end = i
-                    block_content = content[block_start:block_end]
-                    config = parse_config_block(block_content)
-                    virtual_servers[vs_name] = config
-                    break
+        if not is_in_scope(vs_name, scope):
+            continue
+        
+        block_content = decode_block(content, view, open_pos, block_end, mask)
+        virtual_servers[vs_name] = parse_config_block(block_content)
+        if with_dependencies:
+            references[vs_name] = extract_references(block_content, 'virtual')
     
-    return virtual_servers
+    index = {'virtual_servers': virtual_servers}
+    if with_dependencies:
+        index.update(resolve_dependencies(content, view, references, mask))
+    return index
 
 
-def parse_config_block(block_content: str) -> Dict[str, str]:
-    """Parse configuration block into key-value pairs"""
-    config = {}
-    lines = [line.strip() for line in block_content.strip().split('\n')]
+def get_object_id(kind: str, name: str) -> str:
+    """
+    Graph id of a shared object: '<kind> <name>'
+    Site-specific addresses in names are normalized so that the same host at
+    both sites (e.g. node /Common/10.100.1.5 vs /Common/10.200.1.5) is one object
+    """
+    return f"{kind} {normalize_site_value(name)}"
+
+
+def normalize_site_value(value: str) -> str:
+    """Replace every site-specific address in a value: 10.100.1.5 / 10.200.1.5 -> SITE.1.5"""
+    return SITE_IP_PATTERN.sub(r'SITE.\1', value)
+
+
+def member_node_name(member: str) -> str:
+    """Node name of a pool member: /Common/n1:80 -> /Common/n1 (IPv6: /Common/2001::1.80)"""
+    if member.count(':') > 1:
+        return member.rsplit('.', 1)[0]
+    return member.rsplit(':', 1)[0]
+
+
+def extract_member_addresses(block_content: str) -> str:
+    """
+    Endpoints of a pool's members as a sorted 'address:port' list, e.g.
+        members { /Common/n1:80 { address 10.100.1.1 } } -> '10.100.1.1:80'
+    A member without an address line is named by its address
+    (/Common/10.100.1.1:80); IPv6 endpoints use '.' before the port
+    """
+    addresses = {}
+    depth = 0
+    in_members = False
+    member = None
+    tokens = VALUE_TOKEN_PATTERN.findall(block_content)
     
-    block = []
-    brace_count = 0
+    for index, token in enumerate(tokens):
+        if token == '{':
+            depth += 1
+        elif token == '}':
+            depth -= 1
+            if depth == 0:
+                in_members = False
+        elif depth == 0:
+            in_members = token == 'members'
+        elif in_members and depth == 1:
+            member = token
+            addresses[member] = None
+        elif in_members and depth == 2 and token == 'address' and index + 1 < len(tokens):
+            addresses[member] = tokens[index + 1]
     
-    for line in lines:
-        for char in line:
-            if char == '{':
-                brace_count += 1
-            elif char == '}':
-                brace_count -= 1
-        
-        if brace_count == 0:
-            block.append(line)
+    endpoints = []
+    for member, address in addresses.items():
+        node_name = member_node_name(member)
+        port = member[len(node_name) + 1:]
+        address = address or node_name.rsplit('/', 1)[-1]
+        endpoints.append(f"{address}{'.' if ':' in address else ':'}{port}")
+    return ' '.join(sorted(endpoints))
+
+
+def extract_references(block_content: str, kind: str) -> List[str]:
+    """
+    Object ids referenced by one config block
+    Names (always full /Partition/name paths in bigip.conf) are collected on
+    the line of a REFERENCE_KEYS attribute and on the first nesting level of
+    its block, e.g.
+        pool /Common/p1
+        profiles { /Common/http { } /Common/tcp { } }
+        members { /Common/n1:80 { address 10.100.1.1 } }
+        monitor min 1 of { /Common/http /Common/tcp }
+    """
+    refs = []
+    depth = 0
+    ref_kind = None
     
-    for line in block:
-        if not line or line in ['{', '}']:
+    for line in block_content.split('\n'):
+        tokens = VALUE_TOKEN_PATTERN.findall(line)
+        if not tokens:
             continue
         
-        if ' ' in line:
-            parts = line.split(None, 1)
-            if len(parts) == 2:
-                key, value = parts
-                config[key] = value.strip()
-            elif len(parts) == 1:
-                config[parts[0]] = '{'
+        start = 0
+        if depth == 0 and tokens[0] in REFERENCE_KEYS:
+            ref_kind = REFERENCE_KEYS[tokens[0]] or kind
+            start = 1
+        
+        for token in tokens[start:]:
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+            elif ref_kind and depth <= 1 and token.startswith('/'):
+                name = member_node_name(token) if ref_kind == 'node' else token
+                refs.append(get_object_id(ref_kind, name))
+        
+        if depth == 0:
+            ref_kind = None
     
-    return config
+    return list(dict.fromkeys(refs))
 
 
-def normalize_site_ip(ip_str: str) -> Tuple[str, str]:
+def index_object_headers(content) -> Dict[str, int]:
     """
-    Normalize site-specific IPs for comparison
-    Returns: (normalized_ip, site_identifier)
+    Position of every shared object header: {object id: offset of its '{'}
+    Only headers are matched here - bodies are brace-matched and parsed lazily,
+    and only when reachable from an in-scope virtual server
+    """
+    is_bytes = not isinstance(content, str)
+    pattern = OBJECT_HEADER_PATTERN_BYTES if is_bytes else OBJECT_HEADER_PATTERN
     
-    Examples:
-        10.100.50.10:443 -> (SITE.50.10:443, 'NJ')
-        10.200.50.10:443 -> (SITE.50.10:443, 'HRZ')
-        192.168.1.1:80   -> (192.168.1.1:80, 'OTHER')
+    positions = {}
+    for match in pattern.finditer(content):
+        kind, name = match.group(1), match.group(2)
+        if is_bytes:
+            kind, name = kind.decode('utf-8'), name.decode('utf-8', errors='replace')
+        positions[get_object_id(kind, name)] = match.end() - 1
+    return positions
+
+
+def resolve_dependencies(
+    content,
+    view,
+    references: Dict[str, List[str]],
+    mask: bool
+) -> Dict[str, Any]:
     """
-    # Extract IP pattern
-    nj_pattern = r'10\.100\.(\d+\.\d+)'
-    hrz_pattern = r'10\.200\.(\d+\.\d+)'
+    Build the dependency graph reachable from the parsed virtual servers
+    VS -> pool -> members (nodes) -> monitors, VS -> profiles / iRules /
+    persistence, profile -> defaults-from parent, ...
+    Objects referenced but not defined in this file (built-in defaults) are
+    left out. The reverse index maps each object to every VS that depends on
+    it, directly or transitively.
+    """
+    positions = index_object_headers(content)
     
-    nj_match = re.search(nj_pattern, ip_str)
-    hrz_match = re.search(hrz_pattern, ip_str)
+    def read_object(object_id: str) -> Optional[str]:
+        if object_id not in positions:
+            return None
+        open_pos = positions[object_id]
+        block_end = find_block_end(content, open_pos)
+        if block_end == -1:
+            logger.warning(f"Unbalanced braces in object block: {object_id}")
+            return ''
+        return decode_block(content, view, open_pos, block_end, mask)
     
-    if nj_match:
-        host_part = nj_match.group(1)
-        normalized = re.sub(nj_pattern, f'SITE.{host_part}', ip_str)
-        return (normalized, 'NJ')
-    elif hrz_match:
-        host_part = hrz_match.group(1)
-        normalized = re.sub(hrz_pattern, f'SITE.{host_part}', ip_str)
-        return (normalized, 'HRZ')
-    else:
-        return (ip_str, 'OTHER')
+    return resolve_object_graph(read_object, references, positions)
 
 
-def classify_ip_difference(ip1: str, ip2: str) -> Tuple[bool, str]:
+def resolve_object_graph(
+    read_object: Callable[[str], Optional[str]],
+    references: Dict[str, List[str]],
+    defined
+) -> Dict[str, Any]:
     """
-    Classify IP difference severity
-    Returns: (is_different, severity_level)
-    
-    Severity levels:
-    - 'MATCH': Same host across sites (10.100.221.169 vs 10.200.221.169)
-    - 'WARNING': Cross-site different hosts (10.100.221.169 vs 10.200.221.187)
-    - 'CRITICAL': Same-network different hosts (10.100.221.169 vs 10.100.221.200) OR completely different networks
+    Walk the objects reachable from references (see resolve_dependencies)
+    read_object returns the (masked) body of an object block, or None when the
+    object is not defined in the config; defined holds the ids of every
+    object in the config's header index
     """
-    norm1, site1 = normalize_site_ip(ip1)
-    norm2, site2 = normalize_site_ip(ip2)
-    
-    # If normalized IPs match, they're the same host across sites → MATCH
-    if norm1 == norm2:
-        return (False, 'MATCH')
+    objects = {}
     
-    # Both are site IPs
-    if site1 in ['NJ', 'HRZ'] and site2 in ['NJ', 'HRZ']:
-        # CRITICAL: Same network, different hosts (both NJ OR both HRZ)
-        if site1 == site2:
-            return (True, 'CRITICAL')
-        # WARNING: Cross-site, different hosts (NJ vs HRZ)
+    # Breadth-first: parse each reachable object once
+    pending = [ref for refs in list(references.values()) for ref in refs]
+    while pending:
+        object_id = pending.pop()
+        if object_id in objects:
+            continue
+        
+        block_content = read_object(object_id)
+        if block_content is None:
+            continue
+        kind = object_id.split(' ', 1)[0]
+        if kind == 'rule':
+            # iRule bodies are TCL, not key/value attributes
+            objects[object_id] = {'definition': block_content.strip()}
+            references[object_id] = []
         else:
-            return (True, 'WARNING')
+            objects[object_id] = parse_config_block(block_content)
+            if kind == 'pool':
+                # parse_config_block skips the nested members block, but member
+                # addresses matter even when no 'ltm node' defines them
+                members = extract_member_addresses(block_content)
+                if members:
+                    objects[object_id]['members'] = members
+            references[object_id] = extract_references(block_content, kind)
+            pending.extend(references[object_id])
     
-    # CRITICAL: Completely different networks (e.g., 10.100.x.x vs 192.168.x.x)
-    return (True, 'CRITICAL')
+    return {
+        'objects': objects,
+        'references': references,
+        'impacts': build_impacts(references, objects),
+        'defined': sorted(defined)
+    }
 
 
-def get_environment_type(vs_name: str) -> str:
+def build_impacts(references: Dict[str, List[str]], object_ids) -> Dict[str, List[str]]:
+    """Reverse index: object -> dependent virtual servers (transitive)"""
+    impacts = {}
+    for vs_name in [name for name in references if name not in object_ids]:
+        seen = set()
+        stack = [ref for ref in references[vs_name] if ref in object_ids]
+        while stack:
+            object_id = stack.pop()
+            if object_id in seen:
+                continue
+            seen.add(object_id)
+            impacts.setdefault(object_id, []).append(vs_name)
+            stack.extend(ref for ref in references.get(object_id, []) if ref in object_ids)
+    return impacts
+
+
+def iter_config_statements(chunks: Iterable[bytes]) -> Iterator[bytes]:
     """
-    Determine environment type from virtual server name
-    Returns: 'PROD', 'CORP', 'SANDBOX', or 'UNKNOWN'
+    Split a chunked config byte stream into complete top-level statements
+    Brace depth and quoting are carried across chunk boundaries and counted
+    exactly like find_block_end, so both ingest modes see the same blocks;
+    a statement still open at the next column-0 'ltm ' header is dropped
+    and the split resyncs there. Only the bytes of the statement in progress
+    are buffered
     """
-    name_lower = vs_name.lower()
+    buffer = bytearray()
+    depth = 0
+    quoted = False
+    start = 0
+    scan_pos = 0
+    chunks = iter(chunks)
+    final = False
     
-    if name_lower.startswith('prod'):
-        return 'PROD'
-    elif name_lower.startswith('corp') or name_lower.startswith('crp'):
-        return 'CORP'
-    elif name_lower.startswith('sb'):
-        return 'SANDBOX'
-    else:
-        return 'UNKNOWN'
+    while not final:
+        chunk = next(chunks, None)
+        if chunk is None:
+            final = True
+        else:
+            buffer += chunk
+        # A token starting in the last few bytes may continue in the next chunk
+        limit = len(buffer) if final else len(buffer) - BLOCK_TOKEN_MAX_LENGTH
+        match = None
+        for match in BLOCK_TOKEN_PATTERN_BYTES.finditer(buffer, scan_pos):
+            token = match.lastindex
+            if match.start() >= limit:
+                scan_pos = match.start()
+                break
+            if token == HEADER_TOKEN:
+                if depth:
+                    header = bytes(buffer[start:start + 120]).strip().split(b'\n', 1)[0]
+                    logger.warning(f"Unbalanced statement dropped, resyncing: {header.decode('utf-8', errors='replace')}")
+                    start = match.start() + 1
+                depth = 0
+                quoted = False
+            elif token == QUOTE_TOKEN:
+                quoted = not quoted
+            elif quoted:
+                continue
+            elif token == OPEN_TOKEN:
+                depth += 1
+            elif token == CLOSE_TOKEN and depth > 0:
+                depth -= 1
+                if depth == 0:
+                    yield bytes(buffer[start:match.end()])
+                    start = match.end()
+        else:
+            scan_pos = max(limit, match.end() if match else scan_pos)
+        
+        # Drop completed statements from the buffer
+        if start:
+            del buffer[:start]
+            scan_pos -= start
+            start = 0
+    
+    if depth:
+        logger.warning(f"Unbalanced braces at end of config stream ({len(buffer)} bytes discarded)")
 
 
-def compare_virtual_servers(
-    vs1: Dict[str, Dict[str, str]],
-    vs2: Dict[str, Dict[str, str]]
-) -> List[Dict[str, Any]]:
-    """Compare virtual servers between two F5 configs with site-aware logic"""
-    comparison_data = []
+def new_scan_state() -> Dict[str, Any]:
+    """Accumulator for scan_config_stream (one per device, shared by all its config files)"""
+    return {'virtual_servers': {}, 'references': {}, 'object_blocks': {}}
+
+
+def scan_config_stream(
+    chunks: Iterable[bytes],
+    scope: Dict[str, Any] = None,
+    mask: bool = True,
+    with_dependencies: bool = True,
+    state: Dict[str, Any] = None
+) -> Dict[str, Any]:
+    """
+    Scan a chunked config byte stream into a scan state (see new_scan_state)
+    Virtual server blocks are masked and parsed as soon as they are complete;
+    shared object blocks are kept raw and only parsed when reachable
+    """
+    state = state if state is not None else new_scan_state()
+    vs_pattern = build_vs_header_pattern(scope, as_bytes=True)
     
-    all_vs_names = set(vs1.keys()) | set(vs2.keys())
+    for statement in iter_config_statements(chunks):
+        open_pos = statement.find(b'{')
+        
+        # The header must end at the statement's first brace
+        match = vs_pattern.search(statement, 0, open_pos + 1)
+        if match and match.end() - 1 == open_pos:
+            vs_name = match.group(1).decode('utf-8', errors='replace')
+            if not is_in_scope(vs_name, scope):
+                continue
+            block_content = decode_block(statement, statement, open_pos, len(statement) - 1, mask)
+            state['virtual_servers'][vs_name] = parse_config_block(block_content)
+            if with_dependencies:
+                state['references'][vs_name] = extract_references(block_content, 'virtual')
+            continue
+        
+        if with_dependencies:
+            match = OBJECT_HEADER_PATTERN_BYTES.search(statement, 0, open_pos + 1)
+            if match and match.end() - 1 == open_pos:
+                kind = match.group(1).decode('utf-8')
+                name = match.group(2).decode('utf-8', errors='replace')
+                state['object_blocks'][get_object_id(kind, name)] = (statement, open_pos)
     
-    for vs_name in sorted(all_vs_names):
-        short_name = vs_name.split('/')[-1]
-        env_type = get_environment_type(short_name)
+    return state
+
+
+def merge_scan_states(states: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge the scan states of several config files (e.g. per-partition bigip.conf)"""
+    merged = new_scan_state()
+    for state in states:
+        for key in merged:
+            merged[key].update(state[key])
+    return merged
+
+
+def build_config_index(
+    state: Dict[str, Any],
+    mask: bool = True,
+    with_dependencies: bool = True
+) -> Dict[str, Any]:
+    """
+    Config index (see parse_ltm_config) from a scan state
+    Dependencies are resolved across every file scanned into the state, so a
+    partition's virtual server can reach /Common pools, monitors and profiles
+    """
+    index = {'virtual_servers': state['virtual_servers']}
+    if with_dependencies:
+        object_blocks = state['object_blocks']
         
-        vs_config1 = vs1.get(vs_name, {})
-        vs_config2 = vs2.get(vs_name, {})
+        def read_object(object_id: str) -> Optional[str]:
+            if object_id not in object_blocks:
+                return None
+            statement, open_pos = object_blocks[object_id]
+            return decode_block(statement, statement, open_pos, len(statement) - 1, mask)
         
-        # Check for missing redundancy
-        missing_in_file1 = len(vs_config1) == 0
+        index.update(resolve_object_graph(read_object, state['references'], object_blocks))
+    return index
+
+
+def parse_config_stream(
+    chunks: Iterable[bytes],
+    scope: Dict[str, Any] = None,
+    mask: bool = True,
+    with_dependencies: bool = True
+) -> Dict[str, Any]:
+    """Incremental version of parse_ltm_config over a chunked byte stream"""
+    return build_config_index(scan_config_stream(chunks, scope, mask, with_dependencies), mask, with_dependencies)
+
+
+def scan_ucs_archive(
+    fileobj,
+    scope: Dict[str, Any] = None,
+    with_dependencies: bool = True
+) -> Dict[str, Any]:
+    """
+    Scan the bigip.conf members of a UCS archive (tar.gz) from a forward-only stream
+    Nothing is extracted to disk; members other than config/bigip.conf and
+    config/partitions/*/bigip.conf are skipped without being buffered or parsed
+    """
+    state = new_scan_state()
+    members = []
+    with tarfile.open(fileobj=fileobj, mode='r|*') as archive:
+        for member in archive:
+            if not member.isfile() or not UCS_CONFIG_MEMBER_PATTERN.match(member.name):
+                continue
+            members.append(member.name)
+            scan_config_stream(
+                iter_file_chunks(archive.extractfile(member), STREAM_CHUNK_BYTES),
+                scope, True, with_dependencies, state
+            )
+    
+    logger.info(f"Scanned {len(members)} config files from UCS archive: {members}")
+    return state
+
+
+def list_partition_configs(sftp, root: str, scope: Dict[str, Any] = None) -> List[str]:
+    """
+    Config files under a /config-style root: <root>/bigip.conf plus
+    <root>/partitions/<partition>/bigip.conf (partition scope pushed down)
+    """
+    root = root.rstrip('/')
+    paths = [f"{root}/bigip.conf"]
+    try:
+        for entry in sftp.listdir_iter(f"{root}/partitions"):
+            if not stat.S_ISDIR(entry.st_mode):
+                continue
+            if scope and 'partitions' in scope and entry.filename not in scope['partitions']:
+                continue
+            paths.append(f"{root}/partitions/{entry.filename}/bigip.conf")
+    except IOError:
+        logger.info(f"No partitions directory under {root}")
+    return paths
+
+
+def scan_remote_directory(
+    transport,
+    sftp,
+    root: str,
+    scope: Dict[str, Any] = None,
+    with_dependencies: bool = True
+) -> Dict[str, Any]:
+    """Discover the partition config files under root and stream-scan them in parallel"""
+    paths = list_partition_configs(sftp, root, scope)
+    
+    def scan_remote_file(path: str) -> Dict[str, Any]:
+        # One SFTP channel per file on the shared transport
+        channel_sftp = paramiko.SFTPClient.from_transport(transport)
+        try:
+            with channel_sftp.open(path, 'rb') as remote_file:
+                remote_file.prefetch(max_concurrent_requests=PARALLEL_DOWNLOAD_PREFETCH, adaptive=ADAPTIVE_PREFETCH)
+                return scan_config_stream(
+                    iter_file_chunks(remote_file, STREAM_CHUNK_BYTES), scope, True, with_dependencies
+                )
+        except IOError as e:
+            logger.warning(f"Skipping {path}: {e}")
+            return new_scan_state()
+        finally:
+            channel_sftp.close()
+    
+    with ThreadPoolExecutor(max_workers=min(DIRECTORY_FETCH_WORKERS, len(paths))) as executor:
+        states = list(executor.map(scan_remote_file, paths))
+    
+    logger.info(f"Scanned {len(paths)} config files under {root}")
+    return merge_scan_states(states)
+
+
+def get_config_source(config_path: str, source: str = None) -> str:
+    """Config source for a path: explicit source, else inferred (.ucs archive, trailing '/' directory)"""
+    if source and source != 'file':
+        return source
+    if config_path.endswith('.ucs'):
+        return 'ucs'
+    if config_path.endswith('/'):
+        return 'directory'
+    return source or 'file'
+
+
+def scan_s3_ucs(config_path: str, scope: Dict[str, Any] = None, with_dependencies: bool = True) -> Dict[str, Any]:
+    """Stream a UCS backup kept in S3 (s3://bucket/key) through scan_ucs_archive"""
+    bucket, _, key = config_path[len('s3://'):].partition('/')
+    logger.info(f"Streaming UCS archive s3://{bucket}/{key}")
+    response = s3_client.get_object(Bucket=bucket, Key=key)
+    return scan_ucs_archive(response['Body'], scope, with_dependencies)
+
+
+@lru_cache(maxsize=1)
+def get_rest_ssl_context() -> ssl.SSLContext:
+    """TLS context shared by all REST connections (CA bundle loaded once)"""
+    return ssl.create_default_context() if REST_VERIFY_TLS else ssl._create_unverified_context()
+
+
+def get_rest_connection(host: str) -> http.client.HTTPSConnection:
+    """Idle keep-alive connection to host's management API (or a new one)"""
+    with rest_lock:
+        idle = rest_connection_pool.setdefault(host, [])
+        if idle:
+            return idle.pop()
+    return http.client.HTTPSConnection(host, timeout=REST_TIMEOUT_SECONDS, context=get_rest_ssl_context())
+
+
+def release_rest_connection(host: str, connection: http.client.HTTPSConnection) -> None:
+    """Return a connection to the pool for the next request (and the next warm invocation)"""
+    with rest_lock:
+        rest_connection_pool.setdefault(host, []).append(connection)
+
+
+def rest_request(
+    host: str,
+    method: str,
+    path: str,
+    body: Dict[str, Any] = None,
+    token: str = None
+) -> Dict[str, Any]:
+    """
+    JSON request to the iControl REST API over a pooled keep-alive connection
+    A stale pooled connection (closed by the device) is replaced once; an
+    HTTP error status raises HTTPError (e.code is the status)
+    """
+    headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive'}
+    if token:
+        headers['X-F5-Auth-Token'] = token
+    payload = json.dumps(body).encode('utf-8') if body is not None else None
+    
+    for attempt in range(2):
+        connection = get_rest_connection(host)
+        try:
+            connection.request(method, path, body=payload, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            connection.close()
+            if attempt:
+                raise
+            continue
+        release_rest_connection(host, connection)
+        if response.status >= 400:
+            raise HTTPError(
+                f"https://{host}{path}", response.status,
+                f"iControl REST {method} {path} on {host} failed: {response.status} {data[:200]!r}",
+                response.headers, None
+            )
+        return json.loads(data) if data else {}
+
+
+def get_rest_token(host: str) -> str:
+    """
+    Auth token for host (cached until shortly before it expires)
+    Token auth authenticates once per token instead of once per request as
+    with basic auth, which is expensive on the device; concurrent callers
+    wait for a single login
+    """
+    with rest_lock:
+        cached = rest_tokens.get(host)
+        login_lock = rest_login_locks.setdefault(host, threading.Lock())
+    if cached and cached[1] > time.time():
+        return cached[0]
+    
+    with login_lock:
+        with rest_lock:
+            cached = rest_tokens.get(host)
+        if cached and cached[1] > time.time():
+            return cached[0]
+        
+        credentials = get_ssh_credentials()
+        response = rest_request(host, 'POST', '/mgmt/shared/authn/login', {
+            'username': credentials.get('rest_username', credentials['username']),
+            'password': credentials.get('rest_password', credentials.get('password')),
+            'loginProviderName': 'tmos'
+        })
+        token = response['token']['token']
+        with rest_lock:
+            rest_tokens[host] = (token, time.time() + REST_TOKEN_SECONDS - 60)
+        return token
+
+
+def rest_get(host: str, path: str) -> Dict[str, Any]:
+    """
+    Authenticated GET (see rest_request)
+    A 401 means the cached token was revoked or expired early on the device:
+    it is dropped and the request retried once with a new token
+    """
+    for attempt in range(2):
+        token = get_rest_token(host)
+        try:
+            return rest_request(host, 'GET', path, token=token)
+        except HTTPError as e:
+            if e.code != 401 or attempt:
+                raise
+            with rest_lock:
+                # Another thread may already have replaced it
+                if rest_tokens.get(host, (None,))[0] == token:
+                    del rest_tokens[host]
+            logger.info(f"REST token for {host} rejected, logging in again")
+
+
+def fetch_rest_collection(
+    host: str,
+    collection: str,
+    fields: Tuple[str, ...],
+    rest_filter: str = None,
+    executor: ThreadPoolExecutor = None
+) -> List[Dict[str, Any]]:
+    """
+    Every item of a REST collection, projected to fields
+    The first page reports totalItems; the remaining $top/$skip pages are
+    requested concurrently. A collection that does not exist on the device
+    (404, e.g. an unprovisioned profile type) is empty; any other failure
+    raises, so a partial config is never taken for a complete one
+    """
+    query = f"$select={','.join(fields)}&$top={REST_PAGE_SIZE}"
+    if any(field.endswith('Reference') for field in fields):
+        query += '&expandSubcollections=true'
+    if rest_filter:
+        query += f"&$filter={quote(rest_filter)}"
+    path = f"/mgmt/tm/{collection}?{query}"
+    
+    try:
+        first = rest_get(host, f"{path}&$skip=0")
+    except HTTPError as e:
+        if e.code != 404:
+            raise
+        logger.warning(f"Skipping REST collection {collection} on {host}: {e.reason}")
+        return []
+    
+    items = first.get('items', [])
+    total = first.get('totalItems', len(items))
+    skips = range(REST_PAGE_SIZE, total, REST_PAGE_SIZE)
+    pages = (executor.map if executor else map)(
+        lambda skip: rest_get(host, f"{path}&$skip={skip}").get('items', []),
+        skips
+    )
+    for page in pages:
+        items.extend(page)
+    return items
+
+
+def format_rest_value(key: str, value: Any) -> str:
+    """tmsh rendering of a scalar REST value (strings with blanks or braces are quoted)"""
+    value = str(value).strip()
+    if key in REST_UNQUOTED_KEYS or (value and not re.search(r'[\s{}"]', value)):
+        return value
+    return '"' + value.replace('"', '\\"') + '"'
+
+
+def render_rest_fields(fields: Dict[str, Any], indent: str = '    ') -> List[str]:
+    """
+    tmsh lines of REST attributes, the way bigip.conf writes them
+    camelCase -> hyphenated keys, true -> bare flag, lists and subcollections
+    -> brace blocks of named entries (/Partition/name { ... })
+    """
+    lines = []
+    for name, value in fields.items():
+        if name in REST_SKIPPED_FIELDS or value is None or value is False:
+            continue
+        key = REST_KEY_NAMES.get(name) or REST_CAMEL_PATTERN.sub('-', name.replace('Reference', '')).lower()
+        
+        if isinstance(value, dict) and 'link' in value:
+            value = value.get('items')
+            if not value:
+                continue
+        
+        if value is True:
+            lines.append(f"{indent}{key}")
+        elif isinstance(value, dict):
+            lines.append(f"{indent}{key} {{")
+            lines.extend(render_rest_fields(value, indent + '    '))
+            lines.append(f"{indent}}}")
+        elif isinstance(value, list):
+            lines.append(f"{indent}{key} {{")
+            for entry in value:
+                if isinstance(entry, dict):
+                    entry_name = entry.get('fullPath') or f"/{entry.get('partition', 'Common')}/{entry['name']}"
+                    lines.append(f"{indent}    {entry_name} {{")
+                    lines.extend(render_rest_fields(entry, indent + '        '))
+                    lines.append(f"{indent}    }}")
+                else:
+                    lines.append(f"{indent}    {entry}")
+            lines.append(f"{indent}}}")
+        else:
+            lines.append(f"{indent}{key} {format_rest_value(name, value)}")
+    return lines
+
+
+def render_rest_statement(header: str, item: Dict[str, Any]) -> bytes:
+    """One REST item as a bigip.conf statement (iRule bodies verbatim)"""
+    if header == 'ltm rule':
+        body = item.get('apiAnonymous', '')
+    else:
+        body = '\n'.join(render_rest_fields(item))
+    return f"{header} {item['fullPath']} {{\n{body}\n}}\n".encode('utf-8')
+
+
+def fetch_rest_index(
+    host: str,
+    scope: Dict[str, Any] = None,
+    with_dependencies: bool = True
+) -> Dict[str, Any]:
+    """
+    Config index of a device read through iControl REST instead of SSH/SFTP
+    Only the $select-ed attributes are fetched; every collection (and every
+    page of it) is requested concurrently. Items are rendered as tmsh
+    statements and go through the same scanner as bigip.conf, so masking,
+    scope and the dependency graph are identical. REST reports attributes
+    at their defaults that bigip.conf omits, so compare rest indexes with
+    rest indexes only
+    """
+    start = time.time()
+    get_rest_token(host)
+    
+    # A single partition in scope is filtered on the device
+    vs_filter = None
+    if scope and len(scope.get('partitions', ())) == 1:
+        vs_filter = f"partition eq {next(iter(scope['partitions']))}"
+    
+    collections = [REST_VS_COLLECTION] + (REST_OBJECT_COLLECTIONS if with_dependencies else [])
+    with ThreadPoolExecutor(max_workers=REST_FETCH_WORKERS) as page_executor:
+        with ThreadPoolExecutor(max_workers=len(collections)) as executor:
+            fetched = list(executor.map(
+                lambda collection: fetch_rest_collection(
+                    host, collection[1], collection[2],
+                    vs_filter if collection is REST_VS_COLLECTION else None, page_executor
+                ),
+                collections
+            ))
+    
+    statements = (
+        render_rest_statement(collection[0], item)
+        for collection, items in zip(collections, fetched)
+        for item in items
+    )
+    index = build_config_index(scan_config_stream(statements, scope, True, with_dependencies), True, with_dependencies)
+    logger.info(
+        f"Fetched {sum(len(items) for items in fetched)} objects from {len(collections)} "
+        f"REST collections on {host} in {time.time() - start:.2f}s"
+    )
+    return index
+
+
+def parse_config_file(
+    file_path: str,
+    scope: Dict[str, Any] = None,
+    with_dependencies: bool = True
+) -> Dict[str, Any]:
+    """
+    Parse a downloaded config file (see parse_ltm_config) through a read-only mmap
+    The file is never read into a single str: the scan works on the mapped
+    bytes and masking is applied per extracted block
+    """
+    logger.info(f"Parsing (mmap) and masking {file_path}")
+    
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return parse_ltm_config(b'', scope, True, with_dependencies)
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return parse_ltm_config(mm, scope, True, with_dependencies)
+
+
+def parse_config_block(block_content: str) -> Dict[str, str]:
+    """Parse configuration block into key-value pairs"""
+    config = {}
+    lines = [line.strip() for line in block_content.strip().split('\n')]
+    
+    block = []
+    brace_count = 0
+    
+    for line in lines:
+        for char in line:
+            if char == '{':
+                brace_count += 1
+            elif char == '}':
+                brace_count -= 1
+        
+        if brace_count == 0:
+            block.append(line)
+    
+    for line in block:
+        if not line or line in ['{', '}']:
+            continue
+        
+        if ' ' in line:
+            parts = line.split(None, 1)
+            if len(parts) == 2:
+                key, value = parts
+                config[key] = value.strip()
+            elif len(parts) == 1:
+                config[parts[0]] = '{'
+    
+    return config
+
+
+def canonicalize_value(key: str, value: str) -> str:
+    """
+    Canonical form of an attribute value for comparison
+    - Whitespace collapsed (quoted strings kept intact)
+    - First-level lists of SET_VALUED_KEYS sorted: vlans { v2 v1 } == vlans { v1 v2 }
+    - Brace groups of named objects nested in them sorted:
+      members { b { } a { } } == members { a { } b { } }
+    - TEXT_VALUE_KEYS: whitespace collapsed per line, nothing reordered
+    Everything else keeps its order (e.g. rules - iRule order is significant,
+    and TCL branches or policy rules are not collections)
+    """
+    if key in TEXT_VALUE_KEYS:
+        return '\n'.join(' '.join(line.split()) for line in value.splitlines() if line.strip())
+    if '{' not in value:
+        return ' '.join(VALUE_TOKEN_PATTERN.findall(value))
+    
+    tokens = VALUE_TOKEN_PATTERN.findall(value)
+    entries, _ = canonicalize_tokens(tokens, 0, 0, key in SET_VALUED_KEYS)
+    return ' '.join(entries)
+
+
+def canonicalize_tokens(tokens: List[str], pos: int, depth: int, set_valued: bool) -> Tuple[List[str], int]:
+    """
+    Canonicalize one brace group starting at tokens[pos]
+    Returns: (canonical entries, position after the closing brace)
+    A name directly followed by a group forms one entry ('name { ... }')
+    """
+    entries = []
+    
+    while pos < len(tokens):
+        token = tokens[pos]
+        
+        if token == '{':
+            sub_entries, pos = canonicalize_tokens(tokens, pos + 1, depth + 1, set_valued)
+            group = '{ ' + ' '.join(sub_entries) + ' }' if sub_entries else '{ }'
+            if entries and not entries[-1].endswith('}'):
+                entries[-1] = f"{entries[-1]} {group}"
+            else:
+                entries.append(group)
+        elif token == '}':
+            pos += 1
+            break
+        else:
+            entries.append(token)
+            pos += 1
+    
+    # Sort unordered groups of set-valued keys: their list, and object collections in it
+    if set_valued and depth > 0 and len(entries) > 1:
+        if depth == 1 or all(entry.endswith('}') for entry in entries):
+            entries.sort()
+    
+    return entries, pos
+
+
+@lru_cache(maxsize=65536)
+def canonical_value_hash(key: str, value: str) -> str:
+    """
+    Stable hash of a canonicalized attribute value
+    Cached by raw value - identical values across VS and devices are canonicalized once
+    """
+    canonical = canonicalize_value(key, value)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def canonicalize_config(config: Dict[str, str]) -> Dict[str, str]:
+    """Map each attribute of a virtual server config to its canonical value hash"""
+    return {key: canonical_value_hash(key, value) for key, value in config.items()}
+
+
+def config_hash(hashes: Dict[str, str]) -> str:
+    """Stable hash of a whole object from its attribute hashes (timestamps excluded)"""
+    digest = hashlib.blake2b(digest_size=8)
+    for key in sorted(hashes):
+        if key not in TIMESTAMP_KEYS:
+            digest.update(f"{key}={hashes[key]};".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def normalize_site_ip(ip_str: str) -> Tuple[str, str]:
+    """
+    Normalize site-specific IPs for comparison
+    Returns: (normalized_ip, site_identifier)
+    
+    Examples:
+        10.100.50.10:443 -> (SITE.50.10:443, 'NJ')
+        10.200.50.10:443 -> (SITE.50.10:443, 'HRZ')
+        192.168.1.1:80   -> (192.168.1.1:80, 'OTHER')
+    """
+    # Extract IP pattern
+    nj_pattern = r'10\.100\.(\d+\.\d+)'
+    hrz_pattern = r'10\.200\.(\d+\.\d+)'
+    
+    nj_match = re.search(nj_pattern, ip_str)
+    hrz_match = re.search(hrz_pattern, ip_str)
+    
+    if nj_match:
+        host_part = nj_match.group(1)
+        normalized = re.sub(nj_pattern, f'SITE.{host_part}', ip_str)
+        return (normalized, 'NJ')
+    elif hrz_match:
+        host_part = hrz_match.group(1)
+        normalized = re.sub(hrz_pattern, f'SITE.{host_part}', ip_str)
+        return (normalized, 'HRZ')
+    else:
+        return (ip_str, 'OTHER')
+
+
+def classify_ip_difference(ip1: str, ip2: str) -> Tuple[bool, str]:
+    """
+    Classify IP difference severity
+    Returns: (is_different, severity_level)
+    
+    Severity levels:
+    - 'MATCH': Same host across sites (10.100.221.169 vs 10.200.221.169)
+    - 'WARNING': Cross-site different hosts (10.100.221.169 vs 10.200.221.187)
+    - 'CRITICAL': Same-network different hosts (10.100.221.169 vs 10.100.221.200) OR completely different networks
+    """
+    norm1, site1 = normalize_site_ip(ip1)
+    norm2, site2 = normalize_site_ip(ip2)
+    
+    # If normalized IPs match, they're the same host across sites → MATCH
+    if norm1 == norm2:
+        return (False, 'MATCH')
+    
+    # Both are site IPs
+    if site1 in ['NJ', 'HRZ'] and site2 in ['NJ', 'HRZ']:
+        # CRITICAL: Same network, different hosts (both NJ OR both HRZ)
+        if site1 == site2:
+            return (True, 'CRITICAL')
+        # WARNING: Cross-site, different hosts (NJ vs HRZ)
+        else:
+            return (True, 'WARNING')
+    
+    # CRITICAL: Completely different networks (e.g., 10.100.x.x vs 192.168.x.x)
+    return (True, 'CRITICAL')
+
+
+def get_environment_type(vs_name: str) -> str:
+    """
+    Determine environment type from virtual server name
+    Returns: 'PROD', 'CORP', 'SANDBOX', or 'UNKNOWN'
+    """
+    name_lower = vs_name.lower()
+    
+    if name_lower.startswith('prod'):
+        return 'PROD'
+    elif name_lower.startswith('corp') or name_lower.startswith('crp'):
+        return 'CORP'
+    elif name_lower.startswith('sb'):
+        return 'SANDBOX'
+    else:
+        return 'UNKNOWN'
+
+
+def intern_lines(text: str, line_ids: Dict[str, int]) -> List[int]:
+    """Map each line to an integer id (indentation/trailing whitespace ignored)"""
+    return [line_ids.setdefault(line.strip(), len(line_ids)) for line in text.split('\n')]
+
+
+def middle_snake(
+    a: List[int], a_lo: int, a_hi: int,
+    b: List[int], b_lo: int, b_hi: int
+) -> Tuple[int, int, int, int, int]:
+    """
+    Myers' linear-space middle snake of a[a_lo:a_hi] vs b[b_lo:b_hi]
+    Forward and reverse D-paths are extended together until they overlap
+    Returns: (edit distance, x, y, u, v) - the snake runs (x, y) -> (u, v)
+    """
+    n, m = a_hi - a_lo, b_hi - b_lo
+    delta = n - m
+    odd = delta & 1
+    offset = (n + m + 1) // 2 + 1
+    forward = [0] * (2 * offset + 1)
+    reverse = [0] * (2 * offset + 1)
+    
+    for d in range(offset):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[offset + k - 1] < forward[offset + k + 1]):
+                x = forward[offset + k + 1]
+            else:
+                x = forward[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += 1
+                y += 1
+            forward[offset + k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1 and x + reverse[offset + delta - k] >= n:
+                return (2 * d - 1, a_lo + x0, b_lo + y0, a_lo + x, b_lo + y)
+        
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and reverse[offset + k - 1] < reverse[offset + k + 1]):
+                x = reverse[offset + k + 1]
+            else:
+                x = reverse[offset + k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[a_hi - 1 - x] == b[b_hi - 1 - y]:
+                x += 1
+                y += 1
+            reverse[offset + k] = x
+            if not odd and -d <= delta - k <= d and x + forward[offset + delta - k] >= n:
+                return (2 * d, a_hi - x, b_hi - y, a_hi - x0, b_hi - y0)
+    
+    return (n + m, a_lo, b_lo, a_lo, b_lo)
+
+
+def myers_matches(
+    a: List[int], a_lo: int, a_hi: int,
+    b: List[int], b_lo: int, b_hi: int,
+    matches: List[Tuple[int, int]]
+) -> None:
+    """Append the matched (i, j) line pairs of a minimal edit script (divide and conquer on middle snakes)"""
+    stack = [(a_lo, a_hi, b_lo, b_hi)]
+    while stack:
+        a_lo, a_hi, b_lo, b_hi = stack.pop()
+        if a_lo >= a_hi or b_lo >= b_hi:
+            continue
+        
+        d, x, y, u, v = middle_snake(a, a_lo, a_hi, b, b_lo, b_hi)
+        matches.extend((x + i, y + i) for i in range(u - x))
+        if d > 1 or (x, y) != (u, v):
+            stack.append((a_lo, x, b_lo, y))
+            stack.append((u, a_hi, v, b_hi))
+        elif d == 1:
+            # One insertion/deletion: everything else matches in order
+            i, j = a_lo, b_lo
+            while i < a_hi and j < b_hi:
+                if a[i] == b[j]:
+                    matches.append((i, j))
+                    i += 1
+                    j += 1
+                elif a_hi - a_lo > b_hi - b_lo:
+                    i += 1
+                else:
+                    j += 1
+
+
+def patience_matches(
+    a: List[int], a_lo: int, a_hi: int,
+    b: List[int], b_lo: int, b_hi: int,
+    matches: List[Tuple[int, int]]
+) -> None:
+    """
+    Patience diff: anchor on lines unique to both sides (longest increasing run),
+    recurse between anchors and fall back to Myers where no unique lines remain
+    """
+    stack = [(a_lo, a_hi, b_lo, b_hi)]
+    while stack:
+        a_lo, a_hi, b_lo, b_hi = stack.pop()
+        
+        # Common prefix / suffix
+        while a_lo < a_hi and b_lo < b_hi and a[a_lo] == b[b_lo]:
+            matches.append((a_lo, b_lo))
+            a_lo += 1
+            b_lo += 1
+        while a_lo < a_hi and b_lo < b_hi and a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+            matches.append((a_hi, b_hi))
+        if a_lo >= a_hi or b_lo >= b_hi:
+            continue
+        
+        # Lines occurring exactly once on each side, in a-order
+        positions_a = {}
+        for i in range(a_lo, a_hi):
+            positions_a[a[i]] = -1 if a[i] in positions_a else i
+        positions_b = {}
+        for j in range(b_lo, b_hi):
+            positions_b[b[j]] = -1 if b[j] in positions_b else j
+        candidates = sorted(
+            (i, positions_b[line]) for line, i in positions_a.items()
+            if i != -1 and positions_b.get(line, -1) != -1
+        )
+        
+        if not candidates:
+            myers_matches(a, a_lo, a_hi, b, b_lo, b_hi, matches)
+            continue
+        
+        # Longest increasing subsequence on b positions (patience sorting)
+        tails, tail_index, previous = [], [], [-1] * len(candidates)
+        for index, (i, j) in enumerate(candidates):
+            pile = bisect_left(tails, j)
+            if pile > 0:
+                previous[index] = tail_index[pile - 1]
+            if pile == len(tails):
+                tails.append(j)
+                tail_index.append(index)
+            else:
+                tails[pile] = j
+                tail_index[pile] = index
+        anchors = []
+        index = tail_index[-1]
+        while index != -1:
+            anchors.append(candidates[index])
+            index = previous[index]
+        anchors.reverse()
+        
+        # Regions between consecutive anchors
+        prev_i, prev_j = a_lo, b_lo
+        for i, j in anchors:
+            matches.append((i, j))
+            stack.append((prev_i, i, prev_j, j))
+            prev_i, prev_j = i + 1, j + 1
+        stack.append((prev_i, a_hi, prev_j, b_hi))
+
+
+def build_hunks(
+    lines1: List[str],
+    lines2: List[str],
+    matches: List[Tuple[int, int]],
+    context: int = LINE_DIFF_CONTEXT
+) -> List[Dict[str, Any]]:
+    """
+    Group matched line pairs into compact unified-style hunks
+    Each hunk: {'start1', 'count1', 'start2', 'count2', 'lines': [' ctx', '-old', '+new']}
+    (1-based starts)
+    """
+    # Opcode-style walk: runs of matches between changes
+    ops = []
+    i = j = 0
+    for match_i, match_j in matches + [(len(lines1), len(lines2))]:
+        if i < match_i or j < match_j:
+            ops.append(('change', i, match_i, j, match_j))
+        if match_i < len(lines1):
+            ops.append(('equal', match_i, match_i + 1, match_j, match_j + 1))
+        i, j = match_i + 1, match_j + 1
+    
+    change_ops = [index for index, op in enumerate(ops) if op[0] == 'change']
+    hunks = []
+    group = []
+    for index in change_ops:
+        if group and index - group[-1] - 1 > 2 * context:
+            hunks.append(group)
+            group = []
+        group.append(index)
+    if group:
+        hunks.append(group)
+    
+    result = []
+    for group in hunks:
+        first, last = max(group[0] - context, 0), min(group[-1] + context, len(ops) - 1)
+        lines = []
+        for tag, i1, i2, j1, j2 in ops[first:last + 1]:
+            if tag == 'equal':
+                lines.append(' ' + lines1[i1])
+            else:
+                lines.extend('-' + line for line in lines1[i1:i2])
+                lines.extend('+' + line for line in lines2[j1:j2])
+        start1, start2 = ops[first][1], ops[first][3]
+        result.append({
+            'start1': start1 + 1,
+            'count1': ops[last][2] - start1,
+            'start2': start2 + 1,
+            'count2': ops[last][4] - start2,
+            'lines': lines
+        })
+    return result
+
+
+def line_diff(text1: str, text2: str) -> List[Dict[str, Any]]:
+    """
+    Line-level diff of two multi-line values (e.g. iRule definitions) as compact hunks
+    Lines are interned to integer ids and diffed with patience/Myers; results
+    are cached per (content hash, content hash) so an iRule pair shared by many
+    virtual servers is diffed once per container
+    """
+    cache_key = (
+        hashlib.blake2b(text1.encode('utf-8'), digest_size=16).digest(),
+        hashlib.blake2b(text2.encode('utf-8'), digest_size=16).digest()
+    )
+    if cache_key in line_diff_cache:
+        line_diff_cache.move_to_end(cache_key)
+        return line_diff_cache[cache_key]
+    
+    lines1, lines2 = text1.split('\n'), text2.split('\n')
+    line_ids = {}
+    ids1, ids2 = intern_lines(text1, line_ids), intern_lines(text2, line_ids)
+    
+    matches = []
+    patience_matches(ids1, 0, len(ids1), ids2, 0, len(ids2), matches)
+    matches.sort()
+    hunks = build_hunks(lines1, lines2, matches)
+    
+    line_diff_cache[cache_key] = hunks
+    if len(line_diff_cache) > LINE_DIFF_CACHE_SIZE:
+        line_diff_cache.popitem(last=False)
+    return hunks
+
+
+def object_hashes(config: Dict[str, str], references: List[str] = None) -> Dict[str, str]:
+    """
+    Canonical attribute hashes of a shared object
+    Site-specific addresses are normalized first (same host at both sites is
+    equal) and the object's references (e.g. pool members) count as an attribute
+    """
+    hashes = {
+        key: canonical_value_hash(key, normalize_site_value(value))
+        for key, value in config.items() if key not in TIMESTAMP_KEYS
+    }
+    if references:
+        hashes['(references)'] = canonical_value_hash(
+            '(references)', normalize_site_value(' '.join(sorted(references)))
+        )
+    return hashes
+
+
+def diff_dependencies(
+    deps1: Dict[str, Any],
+    deps2: Dict[str, Any]
+) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Diff the shared objects of two config indexes and resolve every changed
+    object to the virtual servers it affects through the reverse indexes
+    An object is (missing) only when the config does not define it at all;
+    one that is defined but not reachable there (e.g. a virtual server moved
+    from pool P to pool Q) is not a change of the object - the referencing
+    attribute already reports the switch
+    Returns: {vs path: [{'object', 'attribute', 'file1', 'file2'}, ...]}
+    """
+    objects1, objects2 = deps1.get('objects', {}), deps2.get('objects', {})
+    references1, references2 = deps1.get('references', {}), deps2.get('references', {})
+    impacts1, impacts2 = deps1.get('impacts', {}), deps2.get('impacts', {})
+    # Indexes without a header index (older checkpoints) only know reachable objects
+    defined1, defined2 = set(deps1.get('defined', objects1)), set(deps2.get('defined', objects2))
+    
+    affected = {}
+    for object_id in sorted(set(objects1) | set(objects2)):
+        config1, config2 = objects1.get(object_id), objects2.get(object_id)
+        
+        if config1 is None or config2 is None:
+            if object_id in (defined1 if config1 is None else defined2):
+                continue
+            changes = [{
+                'object': object_id,
+                'attribute': None,
+                'file1': 'defined' if config1 is not None else '(missing)',
+                'file2': 'defined' if config2 is not None else '(missing)'
+            }]
+        else:
+            refs1, refs2 = references1.get(object_id, []), references2.get(object_id, [])
+            hashes1, hashes2 = object_hashes(config1, refs1), object_hashes(config2, refs2)
+            if config_hash(hashes1) == config_hash(hashes2):
+                continue
+            
+            changes = []
+            for attribute in sorted(set(hashes1) | set(hashes2)):
+                if hashes1.get(attribute) == hashes2.get(attribute):
+                    continue
+                if attribute == '(references)':
+                    value1, value2 = ' '.join(sorted(refs1)), ' '.join(sorted(refs2))
+                else:
+                    value1 = config1.get(attribute, '(missing)')
+                    value2 = config2.get(attribute, '(missing)')
+                change = {'object': object_id, 'attribute': attribute, 'file1': value1, 'file2': value2}
+                # Multi-line bodies (iRule definitions): line-level hunks instead of a bare inequality
+                if '\n' in value1 or '\n' in value2:
+                    change['lineDiff'] = line_diff(
+                        '' if value1 == '(missing)' else value1,
+                        '' if value2 == '(missing)' else value2
+                    )
+                changes.append(change)
+        
+        # O(affected): the reverse indexes already hold the dependent virtual servers
+        for vs_name in set(impacts1.get(object_id, [])) | set(impacts2.get(object_id, [])):
+            affected.setdefault(vs_name, []).extend(changes)
+    
+    return affected
+
+
+def classify_address_change(value1: str, value2: str, env_type: str) -> str:
+    """
+    Severity of a changed address with the VS destination rules: cross-site
+    different hosts are expected (MATCH), anything else is CRITICAL in PROD
+    and a WARNING elsewhere
+    """
+    is_diff, severity = classify_ip_difference(value1, value2)
+    if severity == 'WARNING':
+        severity = 'MATCH'
+    if severity == 'CRITICAL' and env_type in ['CORP', 'SANDBOX', 'UNKNOWN']:
+        severity = 'WARNING'
+    return severity
+
+
+def classify_dependency_change(change: Dict[str, str], env_type: str) -> Tuple[str, bool]:
+    """
+    Severity of a shared-object change for a dependent virtual server
+    Mirrors the VS attribute rules: site-aware for addresses (node addresses
+    and pool member endpoints), CRITICAL in PROD when the object or a pool
+    member is missing on one side, WARNING otherwise
+    Returns: (severity, is_ip)
+    """
+    value1, value2 = change['file1'], change['file2']
+    
+    if change['attribute'] == 'address' and value1 != '(missing)' and value2 != '(missing)':
+        return (classify_address_change(value1, value2, env_type), True)
+    
+    if change['attribute'] == 'members' and value1 != '(missing)' and value2 != '(missing)':
+        # Members on both sides (site-normalized) are unchanged; the rest are
+        # paired up as changed addresses, the surplus is added/removed members
+        members1, members2 = value1.split(), value2.split()
+        normalized1 = {normalize_site_value(member) for member in members1}
+        normalized2 = {normalize_site_value(member) for member in members2}
+        removed = [member for member in members1 if normalize_site_value(member) not in normalized2]
+        added = [member for member in members2 if normalize_site_value(member) not in normalized1]
+        
+        severities = {classify_address_change(old, new, env_type) for old, new in zip(removed, added)}
+        if len(removed) != len(added):
+            severities.add('CRITICAL' if env_type == 'PROD' else 'WARNING')
+        for severity in ('CRITICAL', 'WARNING'):
+            if severity in severities:
+                return (severity, True)
+        return ('MATCH', True)
+    
+    is_ip = is_ip_address(value1) or is_ip_address(value2)
+    if env_type == 'PROD' and (value1 == '(missing)' or value2 == '(missing)'):
+        return ('CRITICAL', is_ip)
+    return ('WARNING', is_ip)
+
+
+def new_comparison_stats() -> Dict[str, Any]:
+    """Empty statistics accumulator (filled by accumulate_vs_stats during the comparison)"""
+    return {
+        'total': 0,
+        'differences': 0,
+        'critical': 0,
+        'warnings': 0,
+        'no_redundancy': 0,
+        'dependency_affected': 0,
+        'dependency_objects': {},
+        'by_environment': {},
+        'by_partition': {},
+        'by_severity': {},
+        'by_key': {}
+    }
+
+
+def get_key_type(key: str, is_dependency: bool) -> str:
+    """Histogram bucket of a differing row: the attribute, or '<kind>.<attribute>' for shared objects"""
+    if not is_dependency:
+        return key
+    object_id, _, attribute = key.partition(': ')
+    kind = object_id.split(' ', 1)[0]
+    return f"{kind}.{attribute}" if attribute else kind
+
+
+def accumulate_vs_stats(stats: Dict[str, Any], vs: Dict[str, Any]) -> None:
+    """Fold one compared virtual server into the statistics accumulator"""
+    counters = (
+        stats,
+        stats['by_environment'].setdefault(vs['environment'], {}),
+        stats['by_partition'].setdefault(get_partition(vs['path']), {})
+    )
+    for counter in counters:
+        counter['total'] = counter.get('total', 0) + 1
+        counter['differences'] = counter.get('differences', 0) + vs['hasDifferences']
+        counter['critical'] = counter.get('critical', 0) + vs['isCritical']
+        counter['warnings'] = counter.get('warnings', 0) + vs['isWarning']
+        counter['no_redundancy'] = counter.get('no_redundancy', 0) + vs['hasNoRedundancy']
+    
+    stats['by_severity'][vs['badgeType']] = stats['by_severity'].get(vs['badgeType'], 0) + 1
+    
+    if vs['dependencyDiffs']:
+        stats['dependency_affected'] += 1
+        for object_id in vs['dependencyDiffs']:
+            stats['dependency_objects'][object_id] = stats['dependency_objects'].get(object_id, 0) + 1
+    
+    for config in vs['configurations']:
+        if config['isDiff']:
+            by_key = stats['by_key'].setdefault(get_key_type(config['key'], config.get('isDependency', False)), {})
+            by_key[config['severity']] = by_key.get(config['severity'], 0) + 1
+
+
+def summarize_comparison(comparison_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Statistics of an already materialized comparison (e.g. resumed from a checkpoint)"""
+    stats = new_comparison_stats()
+    for vs in comparison_data:
+        accumulate_vs_stats(stats, vs)
+    return stats
+
+
+def compare_virtual_servers(
+    vs1: Dict[str, Dict[str, str]],
+    vs2: Dict[str, Dict[str, str]],
+    deps1: Dict[str, Any] = None,
+    deps2: Dict[str, Any] = None,
+    stats: Dict[str, Any] = None
+) -> List[Dict[str, Any]]:
+    """
+    Compare virtual servers between two F5 configs with site-aware logic
+    With dependency graphs (deps1/deps2, see parse_ltm_config) changes in
+    shared pools, nodes, monitors, profiles, iRules and persistence objects
+    are added to every affected virtual server
+    Statistics are gathered into the optional stats accumulator (see
+    new_comparison_stats) as each virtual server is classified
+    """
+    comparison_data = []
+    
+    all_vs_names = set(vs1.keys()) | set(vs2.keys())
+    
+    dependency_changes = diff_dependencies(deps1, deps2) if deps1 is not None and deps2 is not None else {}
+    vs_references1 = deps1.get('references', {}) if deps1 else {}
+    vs_references2 = deps2.get('references', {}) if deps2 else {}
+    
+    for vs_name in sorted(all_vs_names):
+        short_name = vs_name.split('/')[-1]
+        env_type = get_environment_type(short_name)
+        
+        vs_config1 = vs1.get(vs_name, {})
+        vs_config2 = vs2.get(vs_name, {})
+        
+        # Check for missing redundancy
+        missing_in_file1 = len(vs_config1) == 0
         missing_in_file2 = len(vs_config2) == 0
         has_no_redundancy = missing_in_file1 or missing_in_file2
         
+        # Canonical value hashes (once per object) - equality is a hash compare
+        hashes1 = canonicalize_config(vs_config1)
+        hashes2 = canonicalize_config(vs_config2)
+        
         all_keys = set(vs_config1.keys()) | set(vs_config2.keys())
         
         configurations = []
@@ -320,7 +2170,7 @@ def compare_virtual_servers(
             # Special case: Ignore ALL timestamp metadata in ALL environments (always OK!)
             # Timestamps are metadata and expected to differ between sites
             # They don't affect F5 functionality and should never be flagged
-            if key in ['last-modified-time', 'creation-time']:
+            if key in TIMESTAMP_KEYS:
                 # Always ignore - whether missing OR different, in ANY environment
                 configurations.append({
                     'key': key,
@@ -372,8 +2222,8 @@ def compare_virtual_servers(
                     'severity': severity if is_diff else 'MATCH'
                 })
             else:
-                # Non-IP comparison (original logic)
-                is_diff = value1 != value2
+                # Non-IP comparison on canonical hashes (ignores whitespace / set ordering)
+                is_diff = hashes1.get(key) != hashes2.get(key)
                 is_ip = is_ip_address(value1) or is_ip_address(value2)
                 
                 if is_diff:
@@ -398,6 +2248,57 @@ def compare_virtual_servers(
                     'severity': 'CRITICAL' if (is_diff and env_type == 'PROD' and (value1 == '(missing)' or value2 == '(missing)')) else ('WARNING' if is_diff else 'MATCH')
                 })
         
+        # Dependency impact: changed shared objects this VS references (directly or transitively)
+        dependency_diffs = []
+        if not has_no_redundancy and (deps1 is not None and deps2 is not None):
+            refs1 = vs_references1.get(vs_name, [])
+            refs2 = vs_references2.get(vs_name, [])
+            # A switched pool/profile/iRule is already a row of its own attribute
+            reference_rows_differ = any(
+                config['isDiff'] and config['key'] in REFERENCE_KEYS for config in configurations
+            )
+            if set(refs1) != set(refs2) and not reference_rows_differ:
+                dependency_changes.setdefault(vs_name, []).insert(0, {
+                    'object': None,
+                    'attribute': 'references',
+                    'file1': ' '.join(sorted(refs1)),
+                    'file2': ' '.join(sorted(refs2))
+                })
+            
+            for change in dependency_changes.get(vs_name, []):
+                severity, is_ip = classify_dependency_change(change, env_type)
+                if severity == 'MATCH':
+                    continue
+                
+                has_differences = True
+                if severity == 'CRITICAL':
+                    is_critical = True
+                elif env_type in ['PROD', 'CORP', 'SANDBOX']:
+                    is_warning = True
+                
+                if change['object'] is None:
+                    key = change['attribute']
+                elif change['attribute'] is None:
+                    key = change['object']
+                else:
+                    key = f"{change['object']}: {change['attribute']}"
+                
+                if change['object'] and change['object'] not in dependency_diffs:
+                    dependency_diffs.append(change['object'])
+                
+                row = {
+                    'key': key,
+                    'file1': change['file1'],
+                    'file2': change['file2'],
+                    'isDiff': True,
+                    'isIP': is_ip,
+                    'isDependency': change['object'] is not None,
+                    'severity': severity
+                }
+                if 'lineDiff' in change:
+                    row['lineDiff'] = change['lineDiff']
+                configurations.append(row)
+        
         # Final classification logic
         if has_no_redundancy and env_type in ['CORP', 'SANDBOX']:
             is_warning = True
@@ -417,8 +2318,13 @@ def compare_virtual_servers(
             'missingInFile1': missing_in_file1,
             'missingInFile2': missing_in_file2,
             'badgeType': badge_type,
+            'hash1': config_hash(hashes1) if vs_config1 else None,
+            'hash2': config_hash(hashes2) if vs_config2 else None,
+            'dependencyDiffs': dependency_diffs,
             'configurations': configurations
         })
+        if stats is not None:
+            accumulate_vs_stats(stats, comparison_data[-1])
     
     return comparison_data
 
@@ -429,11 +2335,251 @@ def is_ip_address(value: str) -> bool:
     return bool(re.search(ip_pattern, value))
 
 
-def analyze_patterns(comparison_data: List[Dict[str, Any]], historical_data: List[Dict] = None) -> Dict[str, Any]:
+def get_shard_index(vs_name: str, shard_count: int, shard_by: str = 'hash') -> int:
+    """
+    Stable shard assignment of a virtual server (crc32 - identical in every worker)
+    shard_by: 'hash' (hash of VS path) or 'partition' (whole partitions stay together)
+    """
+    shard_key = get_partition(vs_name) if shard_by == 'partition' else vs_name
+    return zlib.crc32(shard_key.encode('utf-8')) % shard_count
+
+
+def shard_object_ids(vs_names: set, *deps_list: Dict[str, Any]) -> set:
+    """Objects reachable from the given virtual servers on either side"""
+    object_ids = set()
+    for deps in deps_list:
+        if deps is None:
+            continue
+        for object_id, dependents in deps.get('impacts', {}).items():
+            if not vs_names.isdisjoint(dependents):
+                object_ids.add(object_id)
+    return object_ids
+
+
+def subset_dependencies(deps: Dict[str, Any], vs_names: set, object_ids: set) -> Dict[str, Any]:
+    """
+    Part of a dependency graph needed to compare the given virtual servers
+    object_ids comes from both sides (see shard_object_ids): an object only
+    reachable from a shard VS on the other side must still be diffed, with
+    the impacts and definitions it has here, exactly as in a single run
+    """
+    if deps is None:
+        return None
+    
+    objects = deps['objects']
+    impacts = deps.get('impacts', {})
+    references = deps.get('references', {})
+    defined = set(deps.get('defined', objects))
+    return {
+        'objects': {object_id: objects[object_id] for object_id in object_ids if object_id in objects},
+        'references': {
+            name: references[name]
+            for name in list(vs_names) + list(object_ids) if name in references
+        },
+        'impacts': {
+            object_id: [vs_name for vs_name in impacts[object_id] if vs_name in vs_names]
+            for object_id in object_ids if object_id in impacts
+        },
+        'defined': sorted(object_id for object_id in object_ids if object_id in defined)
+    }
+
+
+def shard_virtual_servers(
+    vs1: Dict[str, Dict[str, str]],
+    vs2: Dict[str, Dict[str, str]],
+    shard_count: int,
+    shard_by: str = 'hash',
+    deps1: Dict[str, Any] = None,
+    deps2: Dict[str, Any] = None
+) -> List[Tuple[Dict, Dict, Dict, Dict]]:
+    """
+    Split both configs into shard_count (vs1, vs2, deps1, deps2) tuples
+    Each shard carries the part of the dependency graphs its virtual servers
+    need; empty shards are dropped
+    """
+    shards = [({}, {}) for _ in range(shard_count)]
+    
+    for side, virtual_servers in enumerate((vs1, vs2)):
+        for vs_name, config in virtual_servers.items():
+            shards[get_shard_index(vs_name, shard_count, shard_by)][side][vs_name] = config
+    
+    subsets = []
+    for part1, part2 in shards:
+        if not (part1 or part2):
+            continue
+        vs_names = set(part1) | set(part2)
+        object_ids = shard_object_ids(vs_names, deps1, deps2)
+        subsets.append((
+            part1, part2,
+            subset_dependencies(deps1, vs_names, object_ids),
+            subset_dependencies(deps2, vs_names, object_ids)
+        ))
+    return subsets
+
+
+def compare_shard(shard: Tuple[Dict, Dict, Dict, Dict]) -> List[Dict[str, Any]]:
+    """Map step - compare one shard (top-level so it can be pickled for process pools)"""
+    return compare_virtual_servers(*shard)
+
+
+def run_shards_local(
+    shards: List[Tuple[Dict, Dict]],
+    run_id: str,
+    timeout_seconds: float = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Local backend - compare shards in a process pool
+    Meant for testing and non-Lambda hosts (Lambda has no /dev/shm for multiprocessing)
+    """
+    with ProcessPoolExecutor(max_workers=min(len(shards), os.cpu_count() or 1)) as executor:
+        return list(executor.map(compare_shard, shards))
+
+
+def run_shards_lambda(
+    shards: List[Tuple[Dict, Dict]],
+    run_id: str,
+    timeout_seconds: float = None
+) -> List[List[Dict[str, Any]]]:
+    """
+    Lambda backend - fan out one synchronous worker invocation per shard
+    Shard inputs and outputs are staged in S3 (gzipped JSON) to stay clear of
+    the 6 MB invocation payload limit
+    Each invoke waits at most timeout_seconds (the caller's remaining budget,
+    capped at SHARD_INVOKE_MAX_SECONDS), so a stuck worker fails the run
+    before this invocation is killed
+    """
+    read_timeout = SHARD_INVOKE_MAX_SECONDS
+    if timeout_seconds is not None:
+        read_timeout = max(1, min(timeout_seconds, read_timeout))
+    shard_client = boto3.client('lambda', config=Config(
+        connect_timeout=LAMBDA_CONNECT_TIMEOUT_SECONDS,
+        read_timeout=read_timeout,
+        retries={'max_attempts': 0}
+    ))
+    
+    def invoke(indexed_shard) -> List[Dict[str, Any]]:
+        index, (part1, part2, deps1, deps2) = indexed_shard
+        input_key = f"{SHARD_PREFIX}/{run_id}/shard-{index}.json.gz"
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=input_key,
+            Body=gzip.compress(json.dumps({
+                'vs1': part1, 'vs2': part2, 'deps1': deps1, 'deps2': deps2
+            }).encode('utf-8'))
+        )
+        
+        response = shard_client.invoke(
+            FunctionName=SHARD_FUNCTION_NAME,
+            InvocationType='RequestResponse',
+            Payload=json.dumps({'action': 'compare_shard', 'input_key': input_key})
+        )
+        result = json.loads(response['Payload'].read())
+        if response.get('FunctionError') or result.get('statusCode') != 200:
+            raise RuntimeError(f"Shard {index} failed: {result}")
+        
+        output_key = json.loads(result['body'])['output_key']
+        obj = s3_client.get_object(Bucket=BUCKET_NAME, Key=output_key)
+        return json.loads(gzip.decompress(obj['Body'].read()))
+    
+    with ThreadPoolExecutor(max_workers=min(len(shards), SHARD_WORKERS)) as executor:
+        return list(executor.map(invoke, enumerate(shards)))
+
+
+# Pluggable map backends: name -> fn(shards, run_id, timeout_seconds) -> list of partial comparison_data
+SHARD_BACKENDS = {
+    'local': run_shards_local,
+    'lambda': run_shards_lambda
+}
+
+
+def compare_virtual_servers_sharded(
+    vs1: Dict[str, Dict[str, str]],
+    vs2: Dict[str, Dict[str, str]],
+    shard_count: int,
+    shard_by: str = 'hash',
+    backend: str = 'lambda',
+    run_id: str = None,
+    deps1: Dict[str, Any] = None,
+    deps2: Dict[str, Any] = None,
+    stats: Dict[str, Any] = None,
+    timeout_seconds: float = None
+) -> List[Dict[str, Any]]:
+    """
+    Map/reduce version of compare_virtual_servers
+    Shards are compared by independent workers; the reduce step merges the
+    sorted partial results by path, so the output (and everything derived from
+    it - insights, report) is identical to a single compare_virtual_servers run
+    timeout_seconds bounds the wait for the workers (see run_shards_lambda)
+    Raises RuntimeError when any shard fails or times out
+    """
+    if backend not in SHARD_BACKENDS:
+        raise ValueError(f"Unknown shard backend: {backend}")
+    
+    shards = shard_virtual_servers(vs1, vs2, shard_count, shard_by, deps1, deps2)
+    if len(shards) <= 1:
+        return compare_virtual_servers(vs1, vs2, deps1, deps2, stats)
+    
+    run_id = run_id or uuid.uuid4().hex
+    logger.info(f"Comparing {len(shards)} shards (by {shard_by}) on the {backend} backend")
+    try:
+        partials = SHARD_BACKENDS[backend](shards, run_id, timeout_seconds)
+    except Exception as e:
+        # Failed worker, invoke timeout or staging error - one error type for the caller to checkpoint on
+        raise RuntimeError(f"Shard workers failed on the {backend} backend: {e}") from e
+    
+    # Statistics are accumulated in the reduce pass itself
+    comparison_data = []
+    for vs in heapq.merge(*partials, key=lambda vs: vs['path']):
+        comparison_data.append(vs)
+        if stats is not None:
+            accumulate_vs_stats(stats, vs)
+    return comparison_data
+
+
+def handle_compare_shard(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Lambda entry for shard workers: {'action': 'compare_shard', 'input_key': ...}"""
+    input_key = event.get('input_key')
+    
+    try:
+        obj = s3_client.get_object(Bucket=BUCKET_NAME, Key=input_key)
+        shard = json.loads(gzip.decompress(obj['Body'].read()))
+        partial = compare_virtual_servers(shard['vs1'], shard['vs2'], shard.get('deps1'), shard.get('deps2'))
+        
+        output_key = input_key.replace('.json.gz', '.out.json.gz')
+        s3_client.put_object(
+            Bucket=BUCKET_NAME,
+            Key=output_key,
+            Body=gzip.compress(json.dumps(partial).encode('utf-8'))
+        )
+        logger.info(f"Compared shard {input_key}: {len(partial)} virtual servers")
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'output_key': output_key, 'count': len(partial)})
+        }
+    
+    except Exception as e:
+        # S3 errors as well as malformed shard payloads - the caller needs a 500, not an unhandled error
+        logger.error(f"Error processing shard {input_key}: {e}", exc_info=True)
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Error processing shard', 'error': str(e)})
+        }
+
+
+def analyze_patterns(
+    comparison_data: List[Dict[str, Any]],
+    historical_data: List[Dict] = None,
+    stats: Dict[str, Any] = None
+) -> Dict[str, Any]:
     """
     Smart Rules Engine - Analyze patterns with new ratio-based risk scoring
     Risk Score Format: <critical_count>/<total_vs> (percentage)
+    Counts come from the comparison's statistics accumulator
     """
+    if stats is None:
+        stats = summarize_comparison(comparison_data)
+    
     insights = {
         'alerts': [],
         'warnings': [],
@@ -448,11 +2594,11 @@ def analyze_patterns(comparison_data: List[Dict[str, Any]], historical_data: Lis
         'risk_level': 'LOW'  # LOW, MEDIUM, HIGH
     }
     
-    total_vs = len(comparison_data)
-    critical = sum(1 for vs in comparison_data if vs['isCritical'])
-    warnings = sum(1 for vs in comparison_data if vs['isWarning'])
+    total_vs = stats['total']
+    critical = stats['critical']
+    warnings = stats['warnings']
     matches = total_vs - critical - warnings
-    no_redundancy = sum(1 for vs in comparison_data if vs['hasNoRedundancy'])
+    no_redundancy = stats['no_redundancy']
     
     # Calculate percentages
     critical_pct = (critical / total_vs * 100) if total_vs > 0 else 0
@@ -480,9 +2626,9 @@ def analyze_patterns(comparison_data: List[Dict[str, Any]], historical_data: Lis
         insights['assessment'] = 'LOW RISK - Minimal critical issues'
     
     # Production virtual servers analysis
-    prod_vs = [vs for vs in comparison_data if vs['environment'] == 'PROD']
-    prod_critical = sum(1 for vs in prod_vs if vs['isCritical'])
-    prod_warnings = sum(1 for vs in prod_vs if vs['isWarning'])
+    prod_stats = stats['by_environment'].get('PROD', {})
+    prod_critical = prod_stats.get('critical', 0)
+    prod_warnings = prod_stats.get('warnings', 0)
     
     # Rule 1: Critical issues detected
     if critical > 0:
@@ -517,6 +2663,14 @@ def analyze_patterns(comparison_data: List[Dict[str, Any]], historical_data: Lis
             'severity': 'MEDIUM'
         })
     
+    # Rule 4b: Shared object changes propagated to dependent virtual servers
+    if stats['dependency_affected']:
+        insights['warnings'].append({
+            'type': 'DEPENDENCY_IMPACT',
+            'message': f"🔗 {len(stats['dependency_objects'])} shared objects (pools/nodes/monitors/profiles/iRules) differ, affecting {stats['dependency_affected']} virtual servers",
+            'severity': 'MEDIUM'
+        })
+    
     # Rule 5: Overall warnings
     if warnings > 0:
         insights['warnings'].append({
@@ -526,10 +2680,7 @@ def analyze_patterns(comparison_data: List[Dict[str, Any]], historical_data: Lis
         })
     
     # Rule 6: Environment distribution
-    env_counts = {}
-    for vs in comparison_data:
-        env = vs['environment']
-        env_counts[env] = env_counts.get(env, 0) + 1
+    env_counts = {env: counts['total'] for env, counts in stats['by_environment'].items()}
     
     insights['info'].append({
         'type': 'ENVIRONMENT_DISTRIBUTION',
@@ -537,6 +2688,18 @@ def analyze_patterns(comparison_data: List[Dict[str, Any]], historical_data: Lis
         'severity': 'INFO'
     })
     
+    # Rule 6b: Partitions carrying most of the critical issues
+    critical_partitions = sorted(
+        ((counts['critical'], partition) for partition, counts in stats['by_partition'].items() if counts['critical']),
+        reverse=True
+    )
+    if len(stats['by_partition']) > 1 and critical_partitions:
+        insights['info'].append({
+            'type': 'PARTITION_DISTRIBUTION',
+            'message': f"Critical issues by partition: {', '.join([f'{partition}: {count}' for count, partition in critical_partitions[:5]])}",
+            'severity': 'INFO'
+        })
+    
     # Rule 7: Good news if mostly matches
     if match_pct >= 95.0:
         insights['info'].append({
@@ -554,9 +2717,17 @@ def store_comparison_metadata(
     comparison_data: List[Dict[str, Any]],
     insights: Dict[str, Any],
     s3_url: str,
-    timestamp: str
+    timestamp: str,
+    stats: Dict[str, Any] = None
 ) -> None:
-    """Store comparison metadata in DynamoDB"""
+    """
+    Store comparison metadata (with the per-environment breakdown) in DynamoDB
+    Counts come from the comparison's statistics accumulator (rebuilt from
+    comparison_data when not given)
+    """
+    if stats is None:
+        stats = summarize_comparison(comparison_data)
+    
     try:
         comparison_id = f"{server1}_vs_{server2}"
         
@@ -568,18 +2739,19 @@ def store_comparison_metadata(
                 'server1': server1,
                 'server2': server2,
                 's3_url': s3_url,
-                'total_vs': len(comparison_data),
-                'with_differences': sum(1 for vs in comparison_data if vs['hasDifferences']),
+                'total_vs': stats['total'],
+                'with_differences': stats['differences'],
                 'critical_count': insights['critical_count'],
                 'warning_count': insights['warning_count'],
                 'match_count': insights['match_count'],
-                'no_redundancy_count': sum(1 for vs in comparison_data if vs['hasNoRedundancy']),
+                'no_redundancy_count': stats['no_redundancy'],
+                'environment_breakdown': stats['by_environment'],
                 'critical_percentage': Decimal(str(insights['critical_percentage'])),
                 'warning_percentage': Decimal(str(insights['warning_percentage'])),
                 'match_percentage': Decimal(str(insights['match_percentage'])),
                 'risk_level': insights['risk_level'],
                 'assessment': insights['assessment'],
-                'ttl': int((datetime.now() + timedelta(days=90)).timestamp())
+                'ttl': int((datetime.now() + timedelta(days=HISTORY_TTL_DAYS)).timestamp())
             }
         )
         
@@ -589,11 +2761,163 @@ def store_comparison_metadata(
         logger.error(f"Error storing in DynamoDB: {e}")
 
 
+def store_vs_history(
+    server1: str,
+    server2: str,
+    comparison_data: List[Dict[str, Any]],
+    timestamp: str
+) -> int:
+    """
+    Store one compact history item per differing virtual server (batch writes)
+    Items land in the comparison table keyed '<pair>#<vs path>' and are
+    queryable per VS through the VirtualServerIndex GSI
+    Returns: number of items written
+    """
+    comparison_id = f"{server1}_vs_{server2}"
+    ttl = int((datetime.now() + timedelta(days=HISTORY_TTL_DAYS)).timestamp())
+    written = 0
+    vs_paths = set()
+    
+    try:
+        with comparison_table.batch_writer() as batch:
+            for vs in comparison_data:
+                if vs['badgeType'] == 'MATCH' and not vs['hasDifferences']:
+                    continue
+                
+                batch.put_item(
+                    Item={
+                        'comparison_id': f"{comparison_id}#{vs['path']}",
+                        'timestamp': timestamp,
+                        'virtual_server': vs['path'],
+                        'pair': comparison_id,
+                        'environment': vs['environment'],
+                        'badge': vs['badgeType'],
+                        'differing_keys': [c['key'] for c in vs['configurations'] if c['isDiff']],
+                        'hash1': vs['hash1'],
+                        'hash2': vs['hash2'],
+                        'ttl': ttl
+                    }
+                )
+                written += 1
+                vs_paths.add(vs['path'])
+        
+        logger.info(f"Stored {written} virtual server history items in DynamoDB: {comparison_id}")
+        
+    except ClientError as e:
+        logger.error(f"Error storing virtual server history in DynamoDB: {e}")
+    
+    # A new run invalidates any cached timeline of its virtual servers (one pass over the cache)
+    invalidate_vs_timelines(vs_paths)
+    
+    return written
+
+
+def invalidate_vs_timelines(vs_paths: Iterable[str]) -> None:
+    """Drop cached timeline pages of the given virtual servers"""
+    vs_paths = set(vs_paths)
+    for cache_key in [k for k in vs_timeline_cache if k[0] in vs_paths]:
+        del vs_timeline_cache[cache_key]
+
+
+def get_vs_timeline(
+    vs_path: str,
+    pair: str = None,
+    limit: int = 50,
+    next_token: str = None
+) -> Dict[str, Any]:
+    """
+    Get the history timeline (newest first) of one virtual server
+    Partition-key Query on VirtualServerIndex, paginated via next_token
+    The pair filter is applied after Limit, so filtered pages keep querying
+    (each page evaluating at most the items still missing) until limit items
+    are collected or the index is exhausted
+    Hot VS names are served from an in-memory LRU for VS_TIMELINE_CACHE_SECONDS
+    """
+    cache_key = (vs_path, pair, limit, next_token)
+    cached = vs_timeline_cache.get(cache_key)
+    if cached and time.time() - cached[0] < VS_TIMELINE_CACHE_SECONDS:
+        vs_timeline_cache.move_to_end(cache_key)
+        return cached[1]
+    
+    params = {
+        'IndexName': 'VirtualServerIndex',
+        'KeyConditionExpression': Key('virtual_server').eq(vs_path),
+        'ScanIndexForward': False
+    }
+    if pair:
+        params['FilterExpression'] = Attr('pair').eq(pair)
+    last_key = json.loads(next_token) if next_token else None
+    
+    timeline = []
+    while True:
+        if last_key:
+            params['ExclusiveStartKey'] = last_key
+        # Never evaluate more than the missing items, so LastEvaluatedKey stays a valid page boundary
+        params['Limit'] = limit - len(timeline)
+        response = comparison_table.query(**params)
+        timeline.extend(
+            {
+                'timestamp': item['timestamp'],
+                'pair': item.get('pair'),
+                'environment': item.get('environment'),
+                'badge': item.get('badge'),
+                'differing_keys': item.get('differing_keys', []),
+                'hash1': item.get('hash1'),
+                'hash2': item.get('hash2')
+            }
+            for item in response.get('Items', [])
+        )
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key or len(timeline) >= limit:
+            break
+    
+    result = {
+        'virtual_server': vs_path,
+        'pair': pair,
+        'items': timeline,
+        'next_token': json.dumps(last_key) if last_key else None
+    }
+    
+    vs_timeline_cache[cache_key] = (time.time(), result)
+    vs_timeline_cache.move_to_end(cache_key)
+    while len(vs_timeline_cache) > VS_TIMELINE_CACHE_SIZE:
+        vs_timeline_cache.popitem(last=False)
+    
+    return result
+
+
+def handle_vs_timeline(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Lambda entry for {'action': 'vs_timeline', 'virtual_server': '/Common/x', ...}"""
+    vs_path = event.get('virtual_server')
+    if not vs_path:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': "Missing 'virtual_server' parameter"})
+        }
+    
+    try:
+        result = get_vs_timeline(
+            vs_path,
+            pair=event.get('pair'),
+            limit=int(event.get('limit', 50)),
+            next_token=event.get('next_token')
+        )
+        return {'statusCode': 200, 'body': json.dumps(result)}
+    
+    except ClientError as e:
+        logger.error(f"Error querying virtual server timeline: {e}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Error querying virtual server timeline', 'error': str(e)})
+        }
+
+
 def publish_cloudwatch_metrics(
     comparison_data: List[Dict[str, Any]],
-    insights: Dict[str, Any]
+    insights: Dict[str, Any],
+    stats: Dict[str, Any] = None
 ) -> None:
-    """Publish custom metrics to CloudWatch"""
+    """Publish custom metrics to CloudWatch (plus per-environment / per-partition breakdowns)"""
     try:
         # Create a FRESH CloudWatch client (important for VPC endpoints!)
         cw_client = boto3.client('cloudwatch')
@@ -634,6 +2958,28 @@ def publish_cloudwatch_metrics(
             ]
         )
         
+        # Breakdowns: one datum per environment / partition and count
+        breakdown_data = []
+        for dimension, breakdown in (('Environment', 'by_environment'), ('Partition', 'by_partition')):
+            for name, counts in (stats or {}).get(breakdown, {}).items():
+                for metric_name, count_key in (('TotalVirtualServers', 'total'),
+                                               ('CriticalCount', 'critical'),
+                                               ('WarningCount', 'warnings')):
+                    breakdown_data.append({
+                        'MetricName': metric_name,
+                        'Dimensions': [{'Name': dimension, 'Value': name}],
+                        'Value': counts[count_key],
+                        'Unit': 'Count',
+                        'Timestamp': datetime.now()
+                    })
+        
+        # put_metric_data accepts at most 1000 datums per call
+        for start in range(0, len(breakdown_data), 1000):
+            cw_client.put_metric_data(
+                Namespace='F5/ConfigComparison',
+                MetricData=breakdown_data[start:start + 1000]
+            )
+        
         logger.info("Published metrics to CloudWatch")
         
     except ClientError as e:
@@ -641,14 +2987,77 @@ def publish_cloudwatch_metrics(
         pass
 
 
+def search_tokens(text: str) -> set:
+    """Index tokens of a value: whole tokens plus their ./_/- separated parts"""
+    tokens = set()
+    for token in SEARCH_TOKEN_PATTERN.split(text.lower()):
+        if token:
+            tokens.add(token)
+            tokens.update(part for part in SEARCH_SUBTOKEN_PATTERN.split(token) if part)
+    return tokens
+
+
+def encode_bitset(indexes: List[int], size: int) -> str:
+    """Base64 bitset (bit i of byte i // 8 set for each index)"""
+    bits = bytearray((size + 7) // 8)
+    for index in indexes:
+        bits[index >> 3] |= 1 << (index & 7)
+    return base64.b64encode(bytes(bits)).decode('ascii')
+
+
+def build_search_index(comparison_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Prebuilt prefix index and filter bitsets for the HTML report
+    - tokens:   sorted token list (the page binary-searches the prefix range)
+    - postings: per token, delta-encoded VS positions in comparison_data
+    - filters:  severity and 'env:<ENV>' bitsets over the same positions
+    """
+    postings = {}
+    filters = {'critical': [], 'warnings': [], 'differences': [], 'matches': []}
+    
+    for position, vs in enumerate(comparison_data):
+        terms = [vs['path']]
+        for config in vs['configurations']:
+            if config['isDiff']:
+                terms.append(config['key'])
+            if config['key'] in SEARCH_INDEX_KEYS:
+                terms.extend([config['file1'], config['file2']])
+        
+        for token in search_tokens(' '.join(terms)):
+            postings.setdefault(token, []).append(position)
+        
+        if vs['isCritical']:
+            filters['critical'].append(position)
+        if vs['isWarning']:
+            filters['warnings'].append(position)
+        filters['differences' if vs['hasDifferences'] else 'matches'].append(position)
+        filters.setdefault(f"env:{vs['environment']}", []).append(position)
+    
+    tokens = sorted(postings)
+    encoded_postings = []
+    for token in tokens:
+        positions = postings[token]
+        encoded_postings.append([positions[0]] + [b - a for a, b in zip(positions, positions[1:])])
+    
+    return {
+        'tokens': tokens,
+        'postings': encoded_postings,
+        'filters': {name: encode_bitset(positions, len(comparison_data)) for name, positions in filters.items()},
+        'environments': sorted(name[4:] for name in filters if name.startswith('env:'))
+    }
+
+
 def generate_enhanced_html(
     comparison_data: List[Dict[str, Any]],
     server1: str,
     server2: str,
     timestamp: str,
-    insights: Dict[str, Any]
+    insights: Dict[str, Any],
+    statistics: Dict[str, Any] = None
 ) -> str:
     """Generate enhanced HTML report with site-aware comparison"""
+    if statistics is None:
+        statistics = build_stats(summarize_comparison(comparison_data))
     
     # Use insights data for stats
     stats = {
@@ -659,12 +3068,14 @@ def generate_enhanced_html(
         'critical_pct': insights['critical_percentage'],
         'warning_pct': insights['warning_percentage'],
         'match_pct': insights['match_percentage'],
-        'no_redundancy': sum(1 for vs in comparison_data if vs['hasNoRedundancy'])
+        'no_redundancy': statistics['no_redundancy']
     }
     
     # Escape data for JavaScript
     comparison_json = json.dumps(comparison_data)
     insights_json = json.dumps(insights)
+    statistics_json = json.dumps(statistics)
+    search_index_json = json.dumps(build_search_index(comparison_data), separators=(',', ':'))
     
     html_template = f"""<!DOCTYPE html>
 <html lang="en" data-theme="light">
@@ -1123,6 +3534,26 @@ def generate_enhanced_html(
             font-style: italic;
         }}
 
+        .line-diff {{
+            margin: 0;
+            font-size: 0.8rem;
+            white-space: pre-wrap;
+            max-height: 400px;
+            overflow: auto;
+        }}
+
+        .line-diff .hunk-header {{
+            color: var(--text-secondary);
+        }}
+
+        .line-diff .line-del {{
+            background: rgba(244, 67, 54, 0.15);
+        }}
+
+        .line-diff .line-add {{
+            background: rgba(76, 175, 80, 0.15);
+        }}
+
         [data-theme="dark"] .diff-highlight {{
             background: #3e2723;
             color: #ffb74d;
@@ -1178,6 +3609,8 @@ def generate_enhanced_html(
 
         <div class="insights-panel" id="insightsPanel"></div>
 
+        <div class="insights-panel" id="breakdownPanel"></div>
+
         <div class="controls">
             <div class="search-box">
                 <span class="search-icon">🔍</span>
@@ -1189,6 +3622,9 @@ def generate_enhanced_html(
                 <button class="filter-btn" onclick="filterByType('critical')">Critical</button>
                 <button class="filter-btn" onclick="filterByType('warnings')">Warnings</button>
                 <button class="filter-btn" onclick="filterByType('matches')">Matches</button>
+                <select class="filter-btn" id="envFilter" onchange="filterServers()">
+                    <option value="all">All environments</option>
+                </select>
             </div>
             <button class="theme-toggle" onclick="toggleTheme()">🌓 Toggle Theme</button>
             <button class="export-btn" onclick="exportDifferences()">📥 Export Differences</button>
@@ -1201,6 +3637,8 @@ def generate_enhanced_html(
     <script>
         const comparisonData = {comparison_json};
         const insights = {insights_json};
+        const statistics = {statistics_json};
+        const searchIndex = {search_index_json};
         const server1Name = '{server1}';
         const server2Name = '{server2}';
         let currentFilter = 'all';
@@ -1275,12 +3713,72 @@ def generate_enhanced_html(
             }}
         }}
 
+        function renderBreakdowns() {{
+            // Histograms accumulated during the comparison (see build_stats)
+            const breakdownTable = (title, label, breakdown, limit) => {{
+                const rows = Object.entries(breakdown)
+                    .sort((a, b) => (b[1].critical - a[1].critical) || (b[1].differences - a[1].differences))
+                    .slice(0, limit);
+                return `
+                    <div class="insight-section">
+                        <div class="insight-title">${{title}}</div>
+                        <table class="comparison-table">
+                            <thead>
+                                <tr><th>${{label}}</th><th>Total</th><th>Differences</th><th>Critical</th><th>Warnings</th><th>No Redundancy</th></tr>
+                            </thead>
+                            <tbody>
+                                ${{rows.map(([name, counts]) => `
+                                    <tr>
+                                        <td class="config-key">${{name}}</td>
+                                        <td>${{counts.total}}</td>
+                                        <td>${{counts.differences}}</td>
+                                        <td>${{counts.critical}}</td>
+                                        <td>${{counts.warnings}}</td>
+                                        <td>${{counts.no_redundancy}}</td>
+                                    </tr>
+                                `).join('')}}
+                            </tbody>
+                        </table>
+                    </div>
+                `;
+            }};
+            const keyRows = Object.entries(statistics.by_key)
+                .map(([key, severities]) => [key, severities.CRITICAL || 0, severities.WARNING || 0])
+                .sort((a, b) => (b[1] + b[2]) - (a[1] + a[2]))
+                .slice(0, 15);
+
+            document.getElementById('breakdownPanel').innerHTML = `
+                <div class="insights-header">
+                    <span class="insights-title">📊 Breakdowns</span>
+                </div>
+                <div class="insights-grid">
+                    ${{breakdownTable('By Environment', 'Environment', statistics.by_environment, 10)}}
+                    ${{breakdownTable('By Partition (top 15)', 'Partition', statistics.by_partition, 15)}}
+                    <div class="insight-section">
+                        <div class="insight-title">Most Differing Attributes</div>
+                        <table class="comparison-table">
+                            <thead>
+                                <tr><th>Attribute</th><th>Critical</th><th>Warning</th></tr>
+                            </thead>
+                            <tbody>
+                                ${{keyRows.map(([key, critical, warning]) => `
+                                    <tr><td class="config-key">${{key}}</td><td>${{critical}}</td><td>${{warning}}</td></tr>
+                                `).join('')}}
+                            </tbody>
+                        </table>
+                    </div>
+                </div>
+            `;
+        }}
+
         function renderComparisons() {{
             const container = document.getElementById('comparisonContainer');
             container.innerHTML = '';
 
+            vsElements.length = 0;
             comparisonData.forEach((vs) => {{
                 const vsElement = document.createElement('div');
+                vsElements.push(vsElement);
                 // DEFAULT COLLAPSED STATE
                 vsElement.className = 'virtual-server collapsed';
                 vsElement.dataset.name = vs.name.toLowerCase();
@@ -1329,7 +3827,12 @@ def generate_enhanced_html(
                                 </tr>
                             </thead>
                             <tbody>
-                                ${{vs.configurations.map(config => `
+                                ${{vs.configurations.map(config => config.lineDiff ? `
+                                    <tr>
+                                        <td class="config-key">${{config.key}}</td>
+                                        <td class="config-value" colspan="2">${{renderLineDiff(config.lineDiff)}}</td>
+                                    </tr>
+                                ` : `
                                     <tr>
                                         <td class="config-key">${{config.key}}</td>
                                         <td class="config-value">
@@ -1359,28 +3862,98 @@ def generate_enhanced_html(
             }});
         }}
 
+        function escapeHtml(text) {{
+            return text.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+        }}
+
+        function renderLineDiff(hunks) {{
+            const body = hunks.map(hunk => {{
+                const header = `<span class="hunk-header">@@ -${{hunk.start1}},${{hunk.count1}} +${{hunk.start2}},${{hunk.count2}} @@</span>`;
+                const lines = hunk.lines.map(line => {{
+                    const cls = line[0] === '-' ? 'line-del' : (line[0] === '+' ? 'line-add' : '');
+                    return `<span class="${{cls}}">${{escapeHtml(line)}}</span>`;
+                }});
+                return [header].concat(lines).join('\\n');
+            }}).join('\\n');
+            return `<pre class="line-diff">${{body}}</pre>`;
+        }}
+
         function toggleVS(header) {{
             const vs = header.parentElement;
             vs.classList.toggle('collapsed');
         }}
 
-        function filterServers() {{
-            const searchTerm = document.getElementById('searchInput').value.toLowerCase();
-            const servers = document.querySelectorAll('.virtual-server');
-            let visibleCount = 0;
-
-            servers.forEach(server => {{
-                const name = server.dataset.name;
-                const matchesSearch = name.includes(searchTerm);
-                const matchesFilter = checkFilterMatch(server);
+        // Prebuilt index (see build_search_index): no DOM scans while filtering
+        const vsElements = [];
+        const visibleBits = new Uint8Array(comparisonData.length).fill(1);
+        const filterBitsets = {{}};
+        Object.keys(searchIndex.filters).forEach(name => {{
+            const raw = atob(searchIndex.filters[name]);
+            const bits = new Uint8Array(raw.length);
+            for (let i = 0; i < raw.length; i++) bits[i] = raw.charCodeAt(i);
+            filterBitsets[name] = bits;
+        }});
+        const environmentSelect = document.getElementById('envFilter');
+        searchIndex.environments.forEach(env => {{
+            const option = document.createElement('option');
+            option.value = env;
+            option.textContent = env;
+            environmentSelect.appendChild(option);
+        }});
+
+        function prefixBitset(prefix) {{
+            // Binary search the first token >= prefix, then union postings while tokens share it
+            const tokens = searchIndex.tokens;
+            let lo = 0, hi = tokens.length;
+            while (lo < hi) {{
+                const mid = (lo + hi) >> 1;
+                if (tokens[mid] < prefix) lo = mid + 1; else hi = mid;
+            }}
+            const bits = new Uint8Array((comparisonData.length + 7) >> 3);
+            for (let t = lo; t < tokens.length && tokens[t].startsWith(prefix); t++) {{
+                let position = 0;
+                searchIndex.postings[t].forEach((delta, i) => {{
+                    position = i === 0 ? delta : position + delta;
+                    bits[position >> 3] |= 1 << (position & 7);
+                }});
+            }}
+            return bits;
+        }}
 
-                if (matchesSearch && matchesFilter) {{
-                    server.classList.remove('hidden');
-                    visibleCount++;
+        function searchBitset(searchTerm) {{
+            // Every query token must prefix-match some indexed token (AND)
+            const terms = searchTerm.split(/[^a-z0-9._-]+/).filter(term => term);
+            let result = null;
+            terms.forEach(term => {{
+                const bits = prefixBitset(term);
+                if (result === null) {{
+                    result = bits;
                 }} else {{
-                    server.classList.add('hidden');
+                    for (let i = 0; i < result.length; i++) result[i] &= bits[i];
                 }}
             }});
+            return result;
+        }}
+
+        function filterServers() {{
+            const searchTerm = document.getElementById('searchInput').value.trim().toLowerCase();
+            const environment = environmentSelect.value;
+            const masks = [
+                searchTerm ? searchBitset(searchTerm) : null,
+                currentFilter === 'all' ? null : filterBitsets[currentFilter],
+                environment === 'all' ? null : (filterBitsets['env:' + environment] || new Uint8Array(visibleBits.length))
+            ].filter(mask => mask !== null);
+            let visibleCount = 0;
+
+            for (let i = 0; i < comparisonData.length; i++) {{
+                const visible = masks.every(mask => (mask[i >> 3] >> (i & 7)) & 1) ? 1 : 0;
+                visibleCount += visible;
+                // Touch the DOM only for servers whose visibility changed
+                if (visible !== visibleBits[i]) {{
+                    visibleBits[i] = visible;
+                    vsElements[i].classList.toggle('hidden', !visible);
+                }}
+            }}
 
             document.getElementById('noResults').style.display = visibleCount === 0 ? 'block' : 'none';
         }}
@@ -1392,21 +3965,6 @@ def generate_enhanced_html(
             filterServers();
         }}
 
-        function checkFilterMatch(server) {{
-            const hasDiff = server.dataset.hasDiff === 'true';
-            const isCritical = server.dataset.isCritical === 'true';
-            const isWarning = server.dataset.isWarning === 'true';
-
-            switch(currentFilter) {{
-                case 'all': return true;
-                case 'differences': return hasDiff;
-                case 'matches': return !hasDiff;
-                case 'critical': return isCritical;
-                case 'warnings': return isWarning;
-                default: return true;
-            }}
-        }}
-
         function toggleTheme() {{
             const html = document.documentElement;
             const currentTheme = html.getAttribute('data-theme');
@@ -1417,18 +3975,25 @@ def generate_enhanced_html(
 
         function exportDifferences() {{
             const differencesOnly = comparisonData.filter(vs => vs.hasDifferences);
+            const summary = {{
+                total: statistics.total,
+                differences: statistics.differences,
+                critical: statistics.critical,
+                warnings: statistics.warnings,
+                no_redundancy: statistics.no_redundancy
+            }};
             const report = {{
                 timestamp: '{timestamp}',
                 servers: {{
                     site1_nj: server1Name,
                     site2_hrz: server2Name
                 }},
-                summary: {{
-                    total: comparisonData.length,
-                    differences: differencesOnly.length,
-                    critical: comparisonData.filter(vs => vs.isCritical).length,
-                    warnings: comparisonData.filter(vs => vs.isWarning).length,
-                    no_redundancy: comparisonData.filter(vs => vs.hasNoRedundancy).length
+                summary: summary,
+                breakdowns: {{
+                    by_environment: statistics.by_environment,
+                    by_partition: statistics.by_partition,
+                    by_severity: statistics.by_severity,
+                    by_key: statistics.by_key
                 }},
                 insights: insights,
                 differences: differencesOnly
@@ -1449,6 +4014,7 @@ def generate_enhanced_html(
         document.documentElement.setAttribute('data-theme', savedTheme);
         
         renderInsights();
+        renderBreakdowns();
         renderComparisons();
     </script>
 </body>
@@ -1483,6 +4049,460 @@ def upload_to_s3(file_path: str, bucket: str, key: str) -> str:
         raise
 
 
+def iter_result_rows(
+    comparison_data: List[Dict[str, Any]],
+    server1: str,
+    server2: str,
+    run_timestamp: str
+):
+    """Yield one flat analytics row per virtual server (differing attributes only)"""
+    pair = f"{server1}_vs_{server2}"
+    
+    for vs in comparison_data:
+        yield {
+            'run_timestamp': run_timestamp,
+            'pair': pair,
+            'server1': server1,
+            'server2': server2,
+            'virtual_server': vs['path'],
+            'name': vs['name'],
+            'partition': get_partition(vs['path']),
+            'environment': vs['environment'],
+            'badge': vs['badgeType'],
+            'has_differences': vs['hasDifferences'],
+            'is_critical': vs['isCritical'],
+            'is_warning': vs['isWarning'],
+            'has_no_redundancy': vs['hasNoRedundancy'],
+            'hash1': vs['hash1'],
+            'hash2': vs['hash2'],
+            'differences': [
+                {
+                    'key': c['key'],
+                    'file1': c['file1'],
+                    'file2': c['file2'],
+                    'severity': c['severity']
+                }
+                for c in vs['configurations'] if c['isDiff']
+            ]
+        }
+
+
+def export_results(
+    comparison_data: List[Dict[str, Any]],
+    server1: str,
+    server2: str,
+    run_timestamp: str,
+    temp_dir: str,
+    bucket: str
+) -> List[str]:
+    """
+    Export comparison results for analytics as gzipped NDJSON (and Parquet if available)
+    Rows are streamed into the compressed file one at a time, then uploaded to
+    a Hive-style partition: <EXPORT_PREFIX>/dt=YYYY-MM-DD/pair=<s1>_vs_<s2>/<run>.ndjson.gz
+    Returns: list of uploaded S3 keys
+    """
+    run_time = datetime.strptime(run_timestamp, '%Y%m%d-%H%M%S')
+    prefix = f"{EXPORT_PREFIX}/dt={run_time.strftime('%Y-%m-%d')}/pair={server1}_vs_{server2}"
+    keys = []
+    
+    try:
+        ndjson_file = os.path.join(temp_dir, 'results.ndjson.gz')
+        row_count = 0
+        with gzip.open(ndjson_file, 'wt', encoding='utf-8', compresslevel=6) as f:
+            for row in iter_result_rows(comparison_data, server1, server2, run_timestamp):
+                f.write(json.dumps(row, separators=(',', ':')))
+                f.write('\n')
+                row_count += 1
+        
+        ndjson_key = f"{prefix}/{run_timestamp}.ndjson.gz"
+        s3_client.upload_file(
+            ndjson_file, bucket, ndjson_key,
+            ExtraArgs={'ContentType': 'application/gzip'}
+        )
+        keys.append(ndjson_key)
+        logger.info(f"Exported {row_count} result rows to s3://{bucket}/{ndjson_key}")
+        
+        if pyarrow is not None:
+            # Parquet is optional - a schema/type error must not lose the NDJSON export
+            parquet_file = os.path.join(temp_dir, 'results.parquet')
+            try:
+                table = pyarrow.Table.from_pylist(
+                    list(iter_result_rows(comparison_data, server1, server2, run_timestamp))
+                )
+                pyarrow_parquet.write_table(table, parquet_file, compression='snappy')
+            except (pyarrow.ArrowException, ValueError, TypeError) as e:
+                logger.error(f"Error writing Parquet results: {e}")
+            else:
+                parquet_key = f"{prefix}/{run_timestamp}.parquet"
+                s3_client.upload_file(parquet_file, bucket, parquet_key)
+                keys.append(parquet_key)
+                logger.info(f"Exported Parquet results to s3://{bucket}/{parquet_key}")
+        
+    # upload_file wraps client errors in S3UploadFailedError
+    except (ClientError, S3UploadFailedError) as e:
+        logger.error(f"Error exporting results to S3: {e}")
+    
+    return keys
+
+
+def archive_digest(config: Dict[str, str]) -> str:
+    """
+    Content address of a parsed object: hash of its canonical form (timestamps excluded)
+    Objects that differ only in formatting (whitespace, order of unordered
+    lists - see canonicalize_value) share one address
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for key, value_hash in sorted(canonicalize_config(config).items()):
+        if key not in TIMESTAMP_KEYS:
+            digest.update(f"{key}={value_hash};".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def archive_blob_key(digest: str) -> str:
+    """S3 key of a content-addressed object blob"""
+    return f"{ARCHIVE_PREFIX}/objects/{digest[:2]}/{digest}.json.gz"
+
+
+def load_manifest(bucket: str, key: str) -> Dict[str, Any]:
+    """Load a per-run archive manifest (None if it does not exist)"""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+        return json.loads(gzip.decompress(response['Body'].read()))
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+
+
+def load_latest_manifest(bucket: str, host: str) -> Dict[str, Any]:
+    """Load the most recent archive manifest of a device (None if never archived)"""
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=f"{ARCHIVE_PREFIX}/manifests/{host}/latest.json")
+        return load_manifest(bucket, json.loads(response['Body'].read())['manifest'])
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+            return None
+        raise
+
+
+def archive_parsed_configs(
+    devices: Dict[str, Dict[str, Any]],
+    scope: Dict[str, Any],
+    bucket: str,
+    context=None
+) -> Dict[str, str]:
+    """
+    Archive the masked, parsed objects of each device as content-addressed blobs
+    <ARCHIVE_PREFIX>/objects/<hh>/<digest>.json.gz plus one small manifest per device
+    and run (<ARCHIVE_PREFIX>/manifests/<host>/<run>.json.gz: name -> digest, references, defined object ids)
+    Objects referenced by the previous manifests of these same devices, or seen earlier
+    in this run, are not uploaded again; a blob another device stored already is
+    rewritten with equivalent content (no S3 listing of the whole object store)
+    Blobs are canonical representatives, not exact snapshots: the digest covers the
+    canonical form, and the blob holds the raw attributes of whichever object with
+    that form was stored first - equal to every object of the address once
+    canonicalized (as compare_archived_runs compares them), but not necessarily
+    byte-for-byte as this device wrote it
+    Best-effort under the invocation deadline: skipped below DEADLINE_ARCHIVE_MIN_MS, and
+    if uploads reach DEADLINE_ARCHIVE_STOP_MS no manifest is written, so a manifest never
+    points at a missing blob
+    Returns: {host: manifest key} ({} if nothing was archived)
+    """
+    run_timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    manifest_keys = {}
+    
+    if remaining_time_ms(context) < DEADLINE_ARCHIVE_MIN_MS:
+        logger.warning("Deadline approaching - skipped archiving the parsed configs")
+        return manifest_keys
+    
+    try:
+        # Digests known to exist: everything the previous manifests point at
+        stored = set()
+        for host in devices:
+            previous = load_latest_manifest(bucket, host)
+            if previous:
+                stored.update(previous['virtual_servers'].values())
+                stored.update(previous['objects'].values())
+        
+        pending = {}
+        manifests = {}
+        for host, index in devices.items():
+            manifest = {
+                'host': host,
+                'run_timestamp': run_timestamp,
+                'scope': {k: sorted(v) for k, v in (scope or {}).items() if k != 'name_regex'},
+                'virtual_servers': {},
+                'objects': {},
+                'references': index.get('references', {}),
+                'defined': index.get('defined', [])
+            }
+            for section in ('virtual_servers', 'objects'):
+                for name, config in index.get(section, {}).items():
+                    config = {key: value for key, value in config.items() if key not in TIMESTAMP_KEYS}
+                    digest = archive_digest(config)
+                    manifest[section][name] = digest
+                    if digest not in stored:
+                        pending.setdefault(digest, config)
+            manifests[host] = manifest
+        
+        def put_blob(item: Tuple[str, Dict[str, str]]) -> bool:
+            if remaining_time_ms(context) < DEADLINE_ARCHIVE_STOP_MS:
+                return False
+            digest, config = item
+            s3_client.put_object(
+                Bucket=bucket,
+                Key=archive_blob_key(digest),
+                Body=gzip.compress(json.dumps(config, sort_keys=True).encode('utf-8')),
+                ContentType='application/gzip'
+            )
+            return True
+        
+        with ThreadPoolExecutor(max_workers=ARCHIVE_WORKERS) as executor:
+            uploaded = sum(executor.map(put_blob, pending.items()))
+        if uploaded < len(pending):
+            logger.warning(
+                f"Deadline approaching - archived {uploaded}/{len(pending)} new blobs, manifests not written"
+            )
+            return manifest_keys
+        
+        for host, manifest in manifests.items():
+            manifest_key = f"{ARCHIVE_PREFIX}/manifests/{host}/{run_timestamp}.json.gz"
+            s3_client.put_object(
+                Bucket=bucket,
+                Key=manifest_key,
+                Body=gzip.compress(json.dumps(manifest, separators=(',', ':')).encode('utf-8')),
+                ContentType='application/gzip'
+            )
+            s3_client.put_object(
+                Bucket=bucket,
+                Key=f"{ARCHIVE_PREFIX}/manifests/{host}/latest.json",
+                Body=json.dumps({'manifest': manifest_key}).encode('utf-8'),
+                ContentType='application/json'
+            )
+            manifest_keys[host] = manifest_key
+        
+        total = sum(len(m['virtual_servers']) + len(m['objects']) for m in manifests.values())
+        logger.info(f"Archived {total} parsed objects: {len(pending)} new blobs, {total - len(pending)} deduplicated")
+        
+    except ClientError as e:
+        logger.error(f"Error archiving parsed configs: {e}")
+    
+    return manifest_keys
+
+
+def fetch_archived_blobs(bucket: str, digests) -> Dict[str, Dict[str, str]]:
+    """Fetch content-addressed object blobs concurrently: {digest: parsed object}"""
+    def fetch_blob(digest: str) -> Dict[str, str]:
+        response = s3_client.get_object(Bucket=bucket, Key=archive_blob_key(digest))
+        return json.loads(gzip.decompress(response['Body'].read()))
+    
+    digests = list(digests)
+    with ThreadPoolExecutor(max_workers=ARCHIVE_WORKERS) as executor:
+        return dict(zip(digests, executor.map(fetch_blob, digests)))
+
+
+def compare_archived_runs(
+    manifest1: Dict[str, Any],
+    manifest2: Dict[str, Any],
+    bucket: str
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any], int]:
+    """
+    Re-compare two archived runs from their manifests
+    Virtual servers and objects with equal digests are equal without fetching
+    anything; only the blobs of changed objects and of the virtual servers that
+    differ (or depend on a changed object) are downloaded
+    Returns: (comparison data and statistics of the changed virtual servers, unchanged count)
+    """
+    vs_digests1, vs_digests2 = manifest1['virtual_servers'], manifest2['virtual_servers']
+    object_digests1, object_digests2 = manifest1['objects'], manifest2['objects']
+    references1, references2 = manifest1['references'], manifest2['references']
+    impacts1 = build_impacts(references1, object_digests1)
+    impacts2 = build_impacts(references2, object_digests2)
+    
+    changed_objects = {
+        object_id for object_id in set(object_digests1) | set(object_digests2)
+        if object_digests1.get(object_id) != object_digests2.get(object_id)
+    }
+    all_vs_names = set(vs_digests1) | set(vs_digests2)
+    changed_vs = {name for name in all_vs_names if vs_digests1.get(name) != vs_digests2.get(name)}
+    for object_id in changed_objects:
+        changed_vs.update(impacts1.get(object_id, []))
+        changed_vs.update(impacts2.get(object_id, []))
+    
+    needed = set()
+    for digests, names in ((vs_digests1, changed_vs), (vs_digests2, changed_vs),
+                           (object_digests1, changed_objects), (object_digests2, changed_objects)):
+        needed.update(digests[name] for name in names if name in digests)
+    blobs = fetch_archived_blobs(bucket, needed)
+    logger.info(f"Archive re-comparison: {len(changed_vs)} changed virtual servers, fetched {len(blobs)} blobs")
+    
+    index1 = {
+        'virtual_servers': {name: blobs[vs_digests1[name]] for name in changed_vs if name in vs_digests1},
+        'objects': {oid: blobs[object_digests1[oid]] for oid in changed_objects if oid in object_digests1},
+        'references': references1,
+        'impacts': impacts1,
+        'defined': manifest1.get('defined', list(object_digests1))
+    }
+    index2 = {
+        'virtual_servers': {name: blobs[vs_digests2[name]] for name in changed_vs if name in vs_digests2},
+        'objects': {oid: blobs[object_digests2[oid]] for oid in changed_objects if oid in object_digests2},
+        'references': references2,
+        'impacts': impacts2,
+        'defined': manifest2.get('defined', list(object_digests2))
+    }
+    comparison_stats = new_comparison_stats()
+    comparison_data = compare_config_indexes(index1, index2, stats=comparison_stats)
+    return comparison_data, comparison_stats, len(all_vs_names) - len(changed_vs)
+
+
+def handle_archive_compare(event: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Historical re-comparison of two archived runs
+    Event: {'action': 'archive_compare', 'manifest1': key, 'manifest2': key}
+    (or 'host1' / 'host2' for the latest manifest of each device)
+    """
+    bucket = event.get('bucket', BUCKET_NAME)
+    
+    try:
+        manifests = []
+        for side in ('1', '2'):
+            if event.get(f'manifest{side}'):
+                manifests.append(load_manifest(bucket, event[f'manifest{side}']))
+            else:
+                manifests.append(load_latest_manifest(bucket, event.get(f'host{side}', '')))
+        if None in manifests:
+            return {'statusCode': 404, 'body': json.dumps({'message': 'Archive manifest not found'})}
+        
+        comparison_data, comparison_stats, unchanged = compare_archived_runs(manifests[0], manifests[1], bucket)
+        
+        return {
+            'statusCode': 200,
+            'body': json.dumps({
+                'runs': [
+                    {'host': manifest['host'], 'run_timestamp': manifest['run_timestamp']}
+                    for manifest in manifests
+                ],
+                'unchanged': unchanged,
+                'statistics': build_stats(comparison_stats),
+                'virtual_servers': [
+                    {
+                        'path': vs['path'],
+                        'badgeType': vs['badgeType'],
+                        'dependencyDiffs': vs['dependencyDiffs'],
+                        'differences': [c for c in vs['configurations'] if c['isDiff']]
+                    }
+                    for vs in comparison_data
+                ]
+            })
+        }
+    
+    except ClientError as e:
+        logger.error(f"Error re-comparing archived runs: {e}")
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Error re-comparing archived runs', 'error': str(e)})
+        }
+
+
+def acquire_rate_token(destination: str) -> None:
+    """Token bucket per destination: block until a send is allowed"""
+    while True:
+        with notification_lock:
+            now = time.time()
+            bucket = rate_limiters.setdefault(destination, {'tokens': NOTIFY_BURST, 'updated': now})
+            bucket['tokens'] = min(NOTIFY_BURST, bucket['tokens'] + (now - bucket['updated']) * NOTIFY_RATE_PER_SECOND)
+            bucket['updated'] = now
+            if bucket['tokens'] >= 1:
+                bucket['tokens'] -= 1
+                return
+            wait = (1 - bucket['tokens']) / NOTIFY_RATE_PER_SECOND
+        time.sleep(wait)
+
+
+def get_http_connection(scheme: str, netloc: str) -> http.client.HTTPConnection:
+    """
+    Idle keep-alive connection from the module-level pool (or a new one)
+    Checked out exclusively - concurrent notification workers never share a
+    connection; hand it back with release_http_connection
+    """
+    with notification_lock:
+        idle = http_connection_pool.setdefault((scheme, netloc), [])
+        if idle:
+            return idle.pop()
+    connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+    return connection_class(netloc, timeout=NOTIFY_TIMEOUT_SECONDS)
+
+
+def release_http_connection(scheme: str, netloc: str, connection: http.client.HTTPConnection) -> None:
+    """Return a connection to the pool for the next request (and the next warm invocation)"""
+    with notification_lock:
+        http_connection_pool.setdefault((scheme, netloc), []).append(connection)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), None if unusable"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def post_json(url: str, payload: Dict[str, Any], context=None) -> Dict[str, Any]:
+    """
+    POST a JSON payload over a pooled keep-alive connection
+    Rate limited per destination host, retried (bounded, exponential backoff)
+    on connection errors, 429 and 5xx. Retry-After is honoured up to
+    NOTIFY_RETRY_AFTER_MAX_SECONDS (backoff if unparseable); no wait runs
+    past the invocation's remaining time less one request timeout
+    Returns: {'status', 'attempts', 'latency_ms'}
+    """
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else '')
+    body = json.dumps(payload).encode('utf-8')
+    start = time.time()
+    status = None
+    
+    for attempt in range(1, NOTIFY_MAX_RETRIES + 1):
+        acquire_rate_token(parts.netloc)
+        connection = get_http_connection(parts.scheme, parts.netloc)
+        delay = 2 ** (attempt - 1)
+        try:
+            connection.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+        except (http.client.HTTPException, OSError) as e:
+            # Dead keep-alive connection - drop it and reconnect on the next attempt
+            logger.warning(f"POST to {parts.netloc} failed (attempt {attempt}): {e}")
+            connection.close()
+        else:
+            release_http_connection(parts.scheme, parts.netloc, connection)
+            status = response.status
+            if status < 400:
+                break
+            if status == 429 or status >= 500:
+                retry_after = parse_retry_after(response.getheader('Retry-After'))
+                if retry_after is not None:
+                    delay = min(retry_after, NOTIFY_RETRY_AFTER_MAX_SECONDS)
+            else:
+                break
+        
+        if attempt < NOTIFY_MAX_RETRIES:
+            budget = remaining_time_ms(context) / 1000 - NOTIFY_TIMEOUT_SECONDS
+            if budget <= 0:
+                logger.warning(f"POST to {parts.netloc}: no time left to retry")
+                break
+            time.sleep(min(delay, budget))
+    
+    return {'status': status, 'attempts': attempt, 'latency_ms': int((time.time() - start) * 1000)}
+
+
 def send_enhanced_webhook(
     webhook_url: str,
     server1: str,
@@ -1490,12 +4510,10 @@ def send_enhanced_webhook(
     stats: Dict[str, Any],
     insights: Dict[str, Any],
     s3_url: str,
-    timestamp: str
-) -> None:
-    """Send enhanced Teams/Slack webhook with insights"""
-    import urllib.request
-    import urllib.parse
-    
+    timestamp: str,
+    context=None
+) -> Dict[str, Any]:
+    """Send enhanced Teams/Slack webhook with insights (returns the delivery result)"""
     try:
         # Determine color based on risk level
         if insights['risk_level'] == 'HIGH':
@@ -1555,118 +4573,998 @@ def send_enhanced_webhook(
             ]
         }
         
-        data = json.dumps(card).encode('utf-8')
-        req = urllib.request.Request(
-            webhook_url,
-            data=data,
-            headers={'Content-Type': 'application/json'},
-            timeout=10  # Add timeout
-        )
-        
-        with urllib.request.urlopen(req, timeout=10) as response:
-            result = response.read()
-            logger.info(f"Webhook sent successfully: {result.decode('utf-8')}")
+        result = post_json(webhook_url, card, context)
+        if result['status'] is not None and result['status'] < 400:
+            logger.info(f"Webhook sent successfully in {result['latency_ms']} ms ({result['attempts']} attempts)")
+        else:
+            logger.error(f"Webhook delivery failed: {result}")
+        return result
             
     except Exception as e:
         logger.error(f"Error sending webhook: {e}")
         # Don't fail the whole function
+        return {'status': None, 'error': str(e)}
 
 
-def lambda_handler(event, context):
-    """AWS Lambda handler function"""
-    logger.info("Starting F5 LTM virtual server comparison with smart analysis")
-    logger.info(f"Event: {json.dumps(event)}")
+def build_vs_alerts(
+    comparison_data: List[Dict[str, Any]],
+    server1: str,
+    server2: str,
+    s3_url: str
+) -> List[Dict[str, Any]]:
+    """
+    One alert per critical virtual server
+    The alert key (path + both config hashes) identifies the critical state, so
+    an unchanged critical VS is not re-alerted on the next run
+    """
+    alerts = []
+    for vs in comparison_data:
+        if not vs['isCritical']:
+            continue
+        differences = [c for c in vs['configurations'] if c['isDiff'] and c['severity'] == 'CRITICAL']
+        lines = [f"{c['key']}: {c['file1']} -> {c['file2']}" for c in differences[:10]]
+        alerts.append({
+            'key': f"{vs['path']}|{vs['hash1']}|{vs['hash2']}",
+            'subject': f"F5 CRITICAL: {vs['name']} ({vs['environment']})"[:100],
+            'message': "\n".join([
+                f"Critical configuration difference on {vs['path']}",
+                f"Comparison: {server1} (NJ) vs {server2} (HRZ)",
+                *lines,
+                f"Report: {s3_url}"
+            ]),
+            'environment': vs['environment']
+        })
+    return alerts
+
+
+def load_previous_alerts(server1: str, server2: str) -> set:
+    """Alert keys published for this pair by the previous run"""
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=f"{ALERTS_PREFIX}/{server1}_vs_{server2}.json")
+        return set(json.loads(response['Body'].read()))
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('NoSuchKey', '404'):
+            logger.error(f"Error loading previous alerts: {e}")
+        return set()
+
+
+def publish_vs_alerts(alerts: List[Dict[str, Any]]) -> Tuple[List[str], int]:
+    """
+    Publish alerts to SNS with PublishBatch (10 per call, rate limited)
+    Returns: (keys of delivered alerts, failed count)
+    """
+    delivered = []
+    failed = 0
+    for start in range(0, len(alerts), SNS_BATCH_SIZE):
+        batch = alerts[start:start + SNS_BATCH_SIZE]
+        entries = {
+            str(i): {
+                'Id': str(i),
+                'Subject': alert['subject'],
+                'Message': alert['message'],
+                'MessageAttributes': {
+                    'severity': {'DataType': 'String', 'StringValue': 'CRITICAL'},
+                    'environment': {'DataType': 'String', 'StringValue': alert['environment']}
+                }
+            }
+            for i, alert in enumerate(batch)
+        }
+        
+        for attempt in range(1, NOTIFY_MAX_RETRIES + 1):
+            acquire_rate_token('sns')
+            try:
+                response = sns_client.publish_batch(TopicArn=SNS_TOPIC_ARN, PublishBatchEntries=list(entries.values()))
+            except ClientError as e:
+                logger.warning(f"SNS PublishBatch failed (attempt {attempt}): {e}")
+                response = {'Successful': [], 'Failed': [{'Id': i, 'SenderFault': False} for i in entries]}
+            
+            delivered.extend(batch[int(item['Id'])]['key'] for item in response.get('Successful', []))
+            # Retry only entries that failed on the service side
+            retry_ids = {item['Id'] for item in response.get('Failed', []) if not item.get('SenderFault')}
+            failed += len(response.get('Failed', [])) - len(retry_ids)
+            entries = {i: entry for i, entry in entries.items() if i in retry_ids}
+            if not entries:
+                break
+            if attempt < NOTIFY_MAX_RETRIES:
+                time.sleep(2 ** (attempt - 1))
+        failed += len(entries)
+    
+    return delivered, failed
+
+
+def send_notifications(
+    comparison_data: List[Dict[str, Any]],
+    insights: Dict[str, Any],
+    stats: Dict[str, Any],
+    server1: str,
+    server2: str,
+    s3_url: str,
+    timestamp: str,
+    context=None
+) -> Dict[str, Any]:
+    """
+    Deliver every notification of one comparison: webhook summary and
+    per-critical-VS SNS alerts (deduplicated against the previous run)
+    Returns a delivery report with latencies
+    """
+    start = time.time()
+    report = {}
+    
+    if TEAMS_WEBHOOK_URL:
+        report['webhook'] = send_enhanced_webhook(
+            TEAMS_WEBHOOK_URL, server1, server2, stats, insights, s3_url, timestamp, context
+        )
+    
+    if SNS_TOPIC_ARN:
+        sns_start = time.time()
+        alerts = build_vs_alerts(comparison_data, server1, server2, s3_url)
+        previous = load_previous_alerts(server1, server2)
+        new_alerts = [alert for alert in alerts if alert['key'] not in previous]
+        delivered, failed = publish_vs_alerts(new_alerts)
+        
+        # Remember what is alerted now: still-critical old alerts plus delivered new ones
+        current = sorted(
+            set(alert['key'] for alert in alerts if alert['key'] in previous) | set(delivered)
+        )
+        try:
+            s3_client.put_object(
+                Bucket=BUCKET_NAME,
+                Key=f"{ALERTS_PREFIX}/{server1}_vs_{server2}.json",
+                Body=json.dumps(current).encode('utf-8'),
+                ContentType='application/json'
+            )
+        except ClientError as e:
+            logger.error(f"Error storing alert state: {e}")
+        
+        report['sns'] = {
+            'critical': len(alerts),
+            'deduplicated': len(alerts) - len(new_alerts),
+            'published': len(delivered),
+            'failed': failed,
+            'latency_ms': int((time.time() - sns_start) * 1000)
+        }
+    
+    report['latency_ms'] = int((time.time() - start) * 1000)
+    logger.info(f"Notifications delivered: {json.dumps(report)}")
+    return report
+
+
+def remaining_time_ms(context) -> float:
+    """Remaining invocation budget in ms (unlimited outside Lambda)"""
+    if context is None or not hasattr(context, 'get_remaining_time_in_millis'):
+        return float('inf')
+    return context.get_remaining_time_in_millis()
+
+
+def save_checkpoint(run_id: str, stage: str, payload: Dict[str, Any]) -> str:
+    """Store a completed pipeline stage in S3 (gzipped JSON)"""
+    key = f"{CHECKPOINT_PREFIX}/{run_id}/{stage}.json.gz"
+    s3_client.put_object(
+        Bucket=BUCKET_NAME,
+        Key=key,
+        Body=gzip.compress(json.dumps(payload).encode('utf-8'))
+    )
+    logger.info(f"Checkpoint saved: s3://{BUCKET_NAME}/{key}")
+    return key
+
+
+def load_checkpoint(run_id: str) -> Dict[str, Any]:
+    """
+    Load the most advanced checkpoint of a run ('compared' before 'parsed')
+    Returns: payload with its 'stage', or None when the run has no checkpoint
+    """
+    for stage in ('compared', 'parsed'):
+        key = f"{CHECKPOINT_PREFIX}/{run_id}/{stage}.json.gz"
+        try:
+            obj = s3_client.get_object(Bucket=BUCKET_NAME, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                continue
+            raise
+        
+        payload = json.loads(gzip.decompress(obj['Body'].read()))
+        payload['stage'] = stage
+        logger.info(f"Resuming run {run_id} from checkpoint stage '{stage}'")
+        return payload
+    
+    return None
+
+
+def schedule_resume(event: Dict[str, Any], run_id: str) -> bool:
+    """Invoke this function asynchronously to resume run_id from its checkpoint"""
+    attempt = int(event.get('resume_attempt', 0)) + 1
+    function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+    
+    if not AUTO_RESUME or not function_name or attempt > MAX_RESUME_ATTEMPTS:
+        logger.warning(f"Not scheduling automatic resume of run {run_id} (attempt {attempt})")
+        return False
+    
+    try:
+        lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='Event',
+            Payload=json.dumps(dict(event, resume_run_id=run_id, resume_attempt=attempt))
+        )
+        logger.info(f"Scheduled resume of run {run_id} (attempt {attempt})")
+        return True
+    except ClientError as e:
+        logger.error(f"Error scheduling resume of run {run_id}: {e}")
+        return False
+
+
+def write_ssh_key(temp_dir: str) -> Tuple[str, str]:
+    """
+    Fetch SSH credentials and write the private key to temp_dir
+    Returns: (username, private key path)
+    """
+    credentials = get_ssh_credentials()
+    username = credentials['username']
+    private_key = credentials['private_key']
+    
+    ssh_key_path = os.path.join(temp_dir, 'id_rsa')
+    with open(ssh_key_path, 'w') as f:
+        f.write(private_key)
+    os.chmod(ssh_key_path, 0o600)
+    logger.info(f"SSH key written to {ssh_key_path}")
+    
+    return username, ssh_key_path
+
+
+def fetch_and_parse_device(
+    host: str,
+    username: str,
+    ssh_key_path: str,
+    config_path: str,
+    scope: Dict[str, Any],
+    temp_dir: str,
+    sftp_channels: int = 1,
+    transport_profile: str = 'default',
+    ingest_mode: str = 'file',
+    config_source: str = 'file'
+) -> Dict[str, Any]:
+    """
+    Download one device configuration over SSH/SFTP and parse it into a config index
+    ingest_mode 'stream' parses while downloading (see stream_parse_remote);
+    multi-channel range downloads always go through a temp file
+    config_path may contain '{host}'; UCS archives and partition directories
+    (see get_config_source) are always streamed, s3:// UCS backups and the
+    iControl REST source need no SSH
+    """
+    config_path = config_path.replace('{host}', host)
+    source = get_config_source(config_path, config_source)
+    
+    if source == 'rest':
+        index = fetch_rest_index(host, scope, DEPENDENCY_ANALYSIS)
+    elif config_path.startswith('s3://'):
+        index = build_config_index(scan_s3_ucs(config_path, scope, DEPENDENCY_ANALYSIS), True, DEPENDENCY_ANALYSIS)
+    elif source != 'file' or (ingest_mode == 'stream' and sftp_channels <= 1):
+        index = stream_parse_remote(
+            host, username, ssh_key_path, config_path, scope, DEPENDENCY_ANALYSIS, transport_profile, source
+        )
+    else:
+        index = None
+    
+    if index is not None:
+        logger.info(
+            f"Found {len(index['virtual_servers'])} virtual servers and "
+            f"{len(index.get('objects', {}))} referenced objects in {host}"
+        )
+        return index
+    
+    local_path = os.path.join(temp_dir, f"{host.replace(':', '_')}.conf")
+    copy_file_from_remote(
+        host, username, ssh_key_path, config_path, local_path, sftp_channels, transport_profile
+    )
+    
+    # Parse (mmap, bytes-level) and mask virtual servers (+ dependency graph)
+    index = parse_config_file(local_path, scope, DEPENDENCY_ANALYSIS)
+    logger.info(
+        f"Found {len(index['virtual_servers'])} virtual servers and "
+        f"{len(index.get('objects', {}))} referenced objects in {host}"
+    )
+    
+    # The parsed index is all we need - free /tmp for the next device
+    os.remove(local_path)
+    return index
+
+
+def fetch_and_parse_devices(
+    hosts: List[str],
+    config_path: str,
+    scope: Dict[str, Any],
+    temp_dir: str,
+    sftp_channels: int = 1,
+    transport_profile: str = 'default',
+    ingest_mode: str = 'file',
+    config_source: str = 'file'
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetch and parse each distinct device exactly once, concurrently
+    (one worker per device, so parsing one device overlaps the others' downloads)
+    Returns: {host: config index}
+    """
+    # The REST source authenticates with a token - no SSH key needed
+    username, ssh_key_path = write_ssh_key(temp_dir) if config_source != 'rest' else (None, None)
+    unique_hosts = list(dict.fromkeys(hosts))
+    
+    logger.info(f"Fetching and parsing {len(unique_hosts)} devices")
+    with ThreadPoolExecutor(max_workers=len(unique_hosts)) as executor:
+        parsed = executor.map(
+            lambda host: fetch_and_parse_device(
+                host, username, ssh_key_path, config_path, scope, temp_dir,
+                sftp_channels, transport_profile, ingest_mode, config_source
+            ),
+            unique_hosts
+        )
+        devices = dict(zip(unique_hosts, parsed))
+    
+    return devices
+
+
+def fetch_and_parse_configs(
+    server1: str,
+    server2: str,
+    config_path: str,
+    scope: Dict[str, Any],
+    temp_dir: str,
+    sftp_channels: int = 1,
+    transport_profile: str = 'default',
+    ingest_mode: str = 'file',
+    config_source: str = 'file'
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Download both configurations over SSH/SFTP and parse them into config indexes"""
+    devices = fetch_and_parse_devices(
+        [server1, server2], config_path, scope, temp_dir,
+        sftp_channels, transport_profile, ingest_mode, config_source
+    )
+    return devices[server1], devices[server2]
+
+
+def compare_config_indexes(
+    index1: Dict[str, Any],
+    index2: Dict[str, Any],
+    shard_count: int = 1,
+    shard_by: str = 'hash',
+    shard_backend: str = 'lambda',
+    run_id: str = None,
+    stats: Dict[str, Any] = None,
+    timeout_seconds: float = None
+) -> List[Dict[str, Any]]:
+    """Compare two config indexes (virtual servers + dependency graphs when parsed)"""
+    deps1 = index1 if 'objects' in index1 else None
+    deps2 = index2 if 'objects' in index2 else None
+    
+    if shard_count > 1:
+        return compare_virtual_servers_sharded(
+            index1['virtual_servers'], index2['virtual_servers'],
+            shard_count, shard_by, shard_backend, run_id, deps1, deps2, stats, timeout_seconds
+        )
+    return compare_virtual_servers(index1['virtual_servers'], index2['virtual_servers'], deps1, deps2, stats)
+
+
+def build_stats(comparison_stats: Dict[str, Any]) -> Dict[str, Any]:
+    """Summary statistics of one comparison (from its accumulator) with breakdowns"""
+    return {
+        'total': comparison_stats['total'],
+        'differences': comparison_stats['differences'],
+        'critical': comparison_stats['critical'],
+        'warnings': comparison_stats['warnings'],
+        'no_redundancy': comparison_stats['no_redundancy'],
+        'by_environment': comparison_stats['by_environment'],
+        'by_partition': comparison_stats['by_partition'],
+        'by_severity': comparison_stats['by_severity'],
+        'by_key': comparison_stats['by_key']
+    }
+
+
+def publish_comparison(
+    comparison_data: List[Dict[str, Any]],
+    insights: Dict[str, Any],
+    stats: Dict[str, Any],
+    server1: str,
+    server2: str,
+    temp_dir: str,
+    report_name: str = 'comparison',
+    exported: bool = False,
+    context=None
+) -> Dict[str, str]:
+    """
+    Publish one comparison: HTML report (zipped, S3), analytics export,
+    DynamoDB metadata/history, CloudWatch metrics and notifications
+    Returns: {'s3_url': ..., 'timestamp': ..., 'notifications': delivery report}
+    """
+    # Generate report
+    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')
+    html_content = generate_enhanced_html(comparison_data, server1, server2, timestamp, insights, stats)
+    
+    html_file = os.path.join(temp_dir, f"{report_name}.html")
+    zip_file = os.path.join(temp_dir, f"{report_name}.zip")
+    
+    with open(html_file, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    
+    logger.info("Enhanced HTML report generated")
+    
+    # Upload to S3
+    create_zip(html_file, zip_file)
+    s3_timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    if report_name == 'comparison':
+        s3_key = f"comparisons/{s3_timestamp}_f5_ltm_comparison.zip"
+    else:
+        s3_key = f"comparisons/{s3_timestamp}_{report_name}_f5_ltm_comparison.zip"
+    s3_url = upload_to_s3(zip_file, BUCKET_NAME, s3_key)
+    
+    # Notifications run in the background while results are exported and stored
+    notifications = notification_executor.submit(
+        send_notifications, comparison_data, insights, stats, server1, server2, s3_url, timestamp, context
+    )
+    
+    # Structured results export for analytics
+    if EXPORT_RESULTS and not exported:
+        export_results(comparison_data, server1, server2, s3_timestamp, temp_dir, BUCKET_NAME)
+    
+    # Store metadata and per-VS history in DynamoDB
+    history_timestamp = datetime.now().isoformat()
+    store_comparison_metadata(
+        server1, server2, comparison_data, insights, s3_url,
+        history_timestamp, stats
+    )
+    store_vs_history(server1, server2, comparison_data, history_timestamp)
+    
+    # Publish CloudWatch metrics
+    publish_cloudwatch_metrics(comparison_data, insights, stats)
+    
+    # Wait for notification delivery (the container may be frozen after return)
+    try:
+        notification_report = notifications.result()
+    except Exception as e:
+        logger.error(f"Error delivering notifications: {e}")
+        notification_report = {'error': str(e)}
+    
+    return {'s3_url': s3_url, 'timestamp': s3_timestamp, 'notifications': notification_report}
+
+
+def expand_pairs(event: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """
+    Comparison pairs requested by a batch event, deduplicated, in order
+    - pairs:  [["A", "B"], ["A", "C"]]
+    - groups: [["A", "B", "C"]] -> every pair within the group (A-B, A-C, B-C)
+    Raises ValueError for a malformed pair or when nothing is left to compare
+    """
+    pairs = []
+    for pair in event.get('pairs') or []:
+        if not isinstance(pair, (list, tuple)) or len(pair) != 2 or pair[0] == pair[1]:
+            raise ValueError(f"Invalid pair {pair}: expected two different devices")
+        pairs.append(tuple(pair))
+    for group in event.get('groups') or []:
+        pairs.extend(
+            (group[i], group[j]) for i in range(len(group)) for j in range(i + 1, len(group))
+            if group[i] != group[j]
+        )
+    
+    if not pairs:
+        raise ValueError("No pairs to compare: give 'pairs' of two devices or 'groups' of at least two")
+    return list(dict.fromkeys(pairs))
+
+
+def handle_batch(event: Dict[str, Any], context) -> Dict[str, Any]:
+    """
+    Multi-pair batch run: each distinct device is fetched and parsed once,
+    then every requested pair is compared against the shared parsed indexes
+    Produces one report per pair plus a consolidated summary
+    """
+    try:
+        pairs = expand_pairs(event)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': str(e)})
+        }
     
-    server1 = event.get('server1', os.environ.get('SERVER1', '10.x.x.x'))
-    server2 = event.get('server2', os.environ.get('SERVER2', '10.x.x.x'))
     config_path = event.get('config_path', os.environ.get('CONFIG_PATH', '/home/vboxuser/bigip.conf'))
+    sftp_channels = int(event.get('sftp_channels', SFTP_CHANNELS))
+    transport_profile = event.get('transport_profile', TRANSPORT_PROFILE)
+    ingest_mode = event.get('ingest_mode', INGEST_MODE)
+    config_source = event.get('config_source', CONFIG_SOURCE)
+    scope = build_parse_scope(event)
+    
+    logger.info(f"Starting F5 LTM batch comparison of {len(pairs)} pairs")
     
     with tempfile.TemporaryDirectory() as temp_dir:
         try:
-            # Get SSH credentials
-            credentials = get_ssh_credentials()
-            username = credentials['username']
-            private_key = credentials['private_key']
+            devices = fetch_and_parse_devices(
+                [host for pair in pairs for host in pair],
+                config_path, scope, temp_dir, sftp_channels, transport_profile, ingest_mode, config_source
+            )
             
-            ssh_key_path = os.path.join(temp_dir, 'id_rsa')
-            with open(ssh_key_path, 'w') as f:
-                f.write(private_key)
-            os.chmod(ssh_key_path, 0o600)
-            logger.info(f"SSH key written to {ssh_key_path}")
+            results = []
+            skipped = []
+            for server1, server2 in pairs:
+                if remaining_time_ms(context) < DEADLINE_REPORT_MIN_MS:
+                    skipped.append([server1, server2])
+                    continue
+                
+                comparison_stats = new_comparison_stats()
+                comparison_data = compare_config_indexes(
+                    devices[server1], devices[server2], stats=comparison_stats
+                )
+                insights = analyze_patterns(comparison_data, stats=comparison_stats)
+                stats = build_stats(comparison_stats)
+                published = publish_comparison(
+                    comparison_data, insights, stats, server1, server2, temp_dir,
+                    report_name=f"{server1}_vs_{server2}", context=context
+                )
+                results.append({
+                    'servers': [server1, server2],
+                    's3_url': published['s3_url'],
+                    'timestamp': published['timestamp'],
+                    'statistics': stats,
+                    'risk_level': insights['risk_level'],
+                    'critical_percentage': insights['critical_percentage']
+                })
+                logger.info(f"Pair {server1} vs {server2}: risk {insights['risk_level']}")
             
-            # Copy configurations from both servers
-            file1_path = os.path.join(temp_dir, 'config1.conf')
-            file2_path = os.path.join(temp_dir, 'config2.conf')
+            if skipped:
+                logger.warning(f"Deadline approaching - skipped {len(skipped)} pairs: {skipped}")
             
-            copy_file_from_remote(server1, username, ssh_key_path, config_path, file1_path)
-            copy_file_from_remote(server2, username, ssh_key_path, config_path, file2_path)
+            # Content-addressed archive of the masked parsed objects, once the reports are out
+            manifests = archive_parsed_configs(devices, scope, BUCKET_NAME, context) if ARCHIVE_CONFIGS else {}
+            for result in results:
+                result['archive_manifests'] = [manifests.get(host) for host in result['servers']]
             
-            # Read and mask configurations
-            with open(file1_path, 'r') as f:
-                content1 = mask_sensitive_data(f.read())
+            summary = {
+                'message': 'F5 LTM batch comparison completed',
+                'devices': list(devices.keys()),
+                'pairs': results,
+                'skipped_pairs': skipped,
+                'totals': {
+                    key: sum(result['statistics'][key] for result in results)
+                    for key in ('total', 'differences', 'critical', 'warnings', 'no_redundancy')
+                }
+            }
             
-            with open(file2_path, 'r') as f:
-                content2 = mask_sensitive_data(f.read())
+            summary_key = f"comparisons/{datetime.now().strftime('%Y%m%d-%H%M%S')}_batch_summary.json"
+            s3_client.put_object(
+                Bucket=BUCKET_NAME,
+                Key=summary_key,
+                Body=json.dumps(summary).encode('utf-8'),
+                ContentType='application/json'
+            )
+            summary['summary_key'] = summary_key
             
-            # Parse virtual servers
-            logger.info("Parsing LTM virtual server configurations")
-            vs1 = parse_ltm_virtual_servers(content1)
-            vs2 = parse_ltm_virtual_servers(content2)
+            return {'statusCode': 200, 'body': json.dumps(summary)}
+        
+        except Exception as e:
+            logger.error(f"Error in batch comparison: {e}", exc_info=True)
             
-            logger.info(f"Found {len(vs1)} virtual servers in {server1}")
-            logger.info(f"Found {len(vs2)} virtual servers in {server2}")
+            return {
+                'statusCode': 500,
+                'body': json.dumps({
+                    'message': 'Error during F5 LTM batch comparison',
+                    'error': str(e)
+                })
+            }
+
+
+def get_pooled_ssh(
+    host: str,
+    username: str,
+    private_key_path: str,
+    profile: str = 'default'
+) -> Tuple[paramiko.SSHClient, paramiko.SFTPClient]:
+    """
+    SSH session and SFTP client to host from the module-level pool (reconnects
+    stale, closed or idle sessions)
+    Every SFTP request times out after SENTINEL_SFTP_TIMEOUT_SECONDS, so a device
+    that stops answering raises instead of hanging; callers evict the session
+    with drop_pooled_ssh on any transport error
+    """
+    pooled = ssh_session_pool.get(host)
+    if pooled:
+        ssh, sftp, last_used = pooled
+        transport = ssh.get_transport()
+        channel = sftp.get_channel()
+        if (
+            transport and transport.is_active() and not channel.closed
+            and time.time() - last_used < SENTINEL_SSH_IDLE_SECONDS
+        ):
+            channel.settimeout(SENTINEL_SFTP_TIMEOUT_SECONDS)
+            ssh_session_pool[host] = (ssh, sftp, time.time())
+            return ssh, sftp
+        drop_pooled_ssh(host)
+    
+    ssh = paramiko.SSHClient()
+    try:
+        connect_ssh(ssh, host, username, private_key_path, profile)
+        sftp = ssh.open_sftp()
+    except Exception:
+        ssh.close()
+        raise
+    sftp.get_channel().settimeout(SENTINEL_SFTP_TIMEOUT_SECONDS)
+    ssh_session_pool[host] = (ssh, sftp, time.time())
+    return ssh, sftp
+
+
+def drop_pooled_ssh(host: str) -> None:
+    """Close and forget a pooled session (after a transport error or timeout)"""
+    pooled = ssh_session_pool.pop(host, None)
+    if pooled:
+        ssh, sftp, _ = pooled
+        sftp.close()
+        ssh.close()
+
+
+def run_remote_command(ssh: paramiko.SSHClient, command: str, timeout: int = 30) -> str:
+    """Run a command over an SSH session and return its stdout"""
+    _, stdout, _ = ssh.exec_command(command, timeout=timeout)
+    return stdout.read().decode('utf-8', errors='replace')
+
+
+def stat_device_config(
+    ssh: paramiko.SSHClient,
+    sftp: paramiko.SFTPClient,
+    config_path: str,
+    source: str = 'file',
+    with_hash: bool = False,
+    with_sync_status: bool = False
+) -> Dict[str, Any]:
+    """
+    Cheap change probe of a device's config files: SFTP stat (mtime, size) of
+    every config file, plus optionally their sha256 and the config-sync status
+    Returns: {'files': {path: [mtime, size]}, 'hashes': {...}, 'sync_status': ..., 'fingerprint': ...}
+    """
+    paths = list_partition_configs(sftp, config_path) if source == 'directory' else [config_path]
+    files = {}
+    for path in paths:
+        try:
+            attrs = sftp.stat(path)
+            files[path] = [int(attrs.st_mtime), attrs.st_size]
+        except TimeoutError:
+            # socket.timeout: the device stopped answering, not a missing file
+            raise
+        except IOError:
+            files[path] = None
+    
+    observed = {'files': files, 'hashes': {}, 'sync_status': None}
+    existing = [path for path, attrs in files.items() if attrs is not None]
+    
+    if with_hash and existing:
+        output = run_remote_command(ssh, 'sha256sum ' + ' '.join(shlex.quote(path) for path in existing))
+        for line in output.splitlines():
+            digest, _, path = line.partition('  ')
+            if path:
+                observed['hashes'][path] = digest
+    
+    if with_sync_status:
+        match = SYNC_STATUS_PATTERN.search(run_remote_command(ssh, 'tmsh show cm sync-status'))
+        observed['sync_status'] = match.group(1) if match else None
+    
+    observed['fingerprint'] = hashlib.blake2b(
+        json.dumps(observed, sort_keys=True).encode('utf-8'), digest_size=16
+    ).hexdigest()
+    return observed
+
+
+def check_device(
+    host: str,
+    username: str,
+    ssh_key_path: str,
+    config_path: str,
+    config_source: str = 'file',
+    transport_profile: str = 'default',
+    with_hash: bool = False,
+    with_sync_status: bool = False
+) -> Dict[str, Any]:
+    """Fingerprint one device's config (s3:// UCS backups via HEAD, devices via pooled SSH)"""
+    config_path = config_path.replace('{host}', host)
+    
+    if config_path.startswith('s3://'):
+        bucket, _, key = config_path[len('s3://'):].partition('/')
+        response = s3_client.head_object(Bucket=bucket, Key=key)
+        observed = {'files': {config_path: [response['ETag'], response['ContentLength']]}}
+        observed['fingerprint'] = hashlib.blake2b(
+            json.dumps(observed, sort_keys=True).encode('utf-8'), digest_size=16
+        ).hexdigest()
+        return observed
+    
+    source = get_config_source(config_path, config_source)
+    for attempt in range(2):
+        ssh, sftp = get_pooled_ssh(host, username, ssh_key_path, transport_profile)
+        try:
+            return stat_device_config(ssh, sftp, config_path, source, with_hash, with_sync_status)
+        except (paramiko.SSHException, EOFError, OSError):
+            # Stale or hung pooled session (timeouts are OSErrors) - evict, reconnect once
+            drop_pooled_ssh(host)
+            if attempt:
+                raise
+
+
+def load_sentinel_state(hosts: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Last seen fingerprints of hosts (one BatchGetItem round-trip per 100 hosts)"""
+    state = {}
+    for start in range(0, len(hosts), 100):
+        request = {
+            DYNAMODB_TABLE: {
+                'Keys': [
+                    {'comparison_id': f"{SENTINEL_PREFIX}#{host}", 'timestamp': 'latest'}
+                    for host in hosts[start:start + 100]
+                ]
+            }
+        }
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            for item in response.get('Responses', {}).get(DYNAMODB_TABLE, []):
+                state[item['host']] = item
+            request = response.get('UnprocessedKeys')
+    return state
+
+
+def store_sentinel_state(observed: Dict[str, Dict[str, Any]]) -> None:
+    """Persist the fingerprints seen in this sentinel run"""
+    checked_at = datetime.now().isoformat()
+    with comparison_table.batch_writer() as batch:
+        for host, device in observed.items():
+            batch.put_item(Item={
+                'comparison_id': f"{SENTINEL_PREFIX}#{host}",
+                'timestamp': 'latest',
+                'host': host,
+                'fingerprint': device['fingerprint'],
+                'files': json.dumps(device['files'], sort_keys=True),
+                'sync_status': device.get('sync_status'),
+                'checked_at': checked_at
+            })
+
+
+def dispatch_comparison(payload: Dict[str, Any]) -> bool:
+    """Invoke this function asynchronously with a comparison event"""
+    function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+    if not function_name:
+        logger.warning("No function name available - cannot dispatch comparison")
+        return False
+    
+    try:
+        lambda_client.invoke(FunctionName=function_name, InvocationType='Event', Payload=json.dumps(payload))
+        return True
+    except ClientError as e:
+        logger.error(f"Error dispatching comparison: {e}")
+        return False
+
+
+def handle_sentinel(event: Dict[str, Any], context) -> Dict[str, Any]:
+    """
+    Change sentinel: fingerprint every device's config (stat over pooled SSH
+    sessions, optionally sha256 / config-sync status) and dispatch full
+    comparisons only for pairs where a device changed
+    Event: {'action': 'sentinel', 'pairs' / 'groups' (or server1/server2),
+            'hash': bool, 'sync_status': bool, 'force': bool, + comparison options}
+    Fingerprints are only recorded once the affected comparisons were dispatched,
+    so a failed dispatch is retried by the next sentinel run
+    """
+    batch_mode = bool(event.get('pairs') or event.get('groups'))
+    if batch_mode:
+        try:
+            pairs = expand_pairs(event)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'message': str(e)})
+            }
+    else:
+        pairs = [(event.get('server1', os.environ.get('SERVER1', '10.x.x.x')),
+                  event.get('server2', os.environ.get('SERVER2', '10.x.x.x')))]
+    config_path = event.get('config_path', os.environ.get('CONFIG_PATH', '/home/vboxuser/bigip.conf'))
+    config_source = event.get('config_source', CONFIG_SOURCE)
+    transport_profile = event.get('transport_profile', TRANSPORT_PROFILE)
+    hosts = list(dict.fromkeys(host for pair in pairs for host in pair))
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        username, ssh_key_path = write_ssh_key(temp_dir)
+        
+        def probe(host: str) -> Tuple[str, Dict[str, Any]]:
+            try:
+                return host, check_device(
+                    host, username, ssh_key_path, config_path, config_source, transport_profile,
+                    event.get('hash', False), event.get('sync_status', False)
+                )
+            except Exception as e:
+                logger.error(f"Sentinel could not check {host}: {e}")
+                return host, None
+        
+        with ThreadPoolExecutor(max_workers=min(len(hosts), DIRECTORY_FETCH_WORKERS)) as executor:
+            observed = dict(executor.map(probe, hosts))
+    
+    unreachable = [host for host, device in observed.items() if device is None]
+    observed = {host: device for host, device in observed.items() if device is not None}
+    
+    try:
+        previous = load_sentinel_state(hosts)
+    except ClientError as e:
+        logger.error(f"Error loading sentinel state: {e}")
+        previous = {}
+    
+    changed_hosts = [
+        host for host, device in observed.items()
+        if event.get('force') or previous.get(host, {}).get('fingerprint') != device['fingerprint']
+    ]
+    changed_pairs = [
+        pair for pair in pairs
+        if set(pair) & set(changed_hosts) and not set(pair) & set(unreachable)
+    ]
+    
+    dispatched = False
+    if changed_pairs:
+        comparison_event = {
+            key: value for key, value in event.items()
+            if key not in ('action', 'pairs', 'groups', 'hash', 'sync_status', 'force')
+        }
+        if batch_mode:
+            comparison_event['pairs'] = [list(pair) for pair in changed_pairs]
+        dispatched = dispatch_comparison(comparison_event)
+    
+    # Record fingerprints of hosts with no changed pair left undispatched
+    pending_hosts = set() if dispatched else set(host for pair in changed_pairs for host in pair)
+    pending_hosts.update(host for pair in pairs if set(pair) & set(unreachable) for host in pair)
+    try:
+        store_sentinel_state({host: device for host, device in observed.items() if host not in pending_hosts})
+    except ClientError as e:
+        logger.error(f"Error storing sentinel state: {e}")
+    
+    logger.info(
+        f"Sentinel checked {len(hosts)} devices: {len(changed_hosts)} changed, "
+        f"{len(unreachable)} unreachable, {len(changed_pairs)} comparisons dispatched={dispatched}"
+    )
+    
+    return {
+        'statusCode': 200,
+        'body': json.dumps({
+            'message': 'F5 config change sentinel completed',
+            'devices': len(hosts),
+            'changed_devices': changed_hosts,
+            'unreachable_devices': unreachable,
+            'changed_pairs': [list(pair) for pair in changed_pairs],
+            'dispatched': dispatched
+        })
+    }
+
+
+def lambda_handler(event, context):
+    """AWS Lambda handler function"""
+    if event.get('action') == 'vs_timeline':
+        return handle_vs_timeline(event)
+    if event.get('action') == 'compare_shard':
+        return handle_compare_shard(event)
+    if event.get('action') == 'archive_compare':
+        return handle_archive_compare(event)
+    if event.get('action') == 'sentinel':
+        return handle_sentinel(event, context)
+    if event.get('pairs') or event.get('groups'):
+        return handle_batch(event, context)
+    
+    logger.info("Starting F5 LTM virtual server comparison with smart analysis")
+    logger.info(f"Event: {json.dumps(event)}")
+    
+    server1 = event.get('server1', os.environ.get('SERVER1', '10.x.x.x'))
+    server2 = event.get('server2', os.environ.get('SERVER2', '10.x.x.x'))
+    config_path = event.get('config_path', os.environ.get('CONFIG_PATH', '/home/vboxuser/bigip.conf'))
+    sftp_channels = int(event.get('sftp_channels', SFTP_CHANNELS))
+    transport_profile = event.get('transport_profile', TRANSPORT_PROFILE)
+    ingest_mode = event.get('ingest_mode', INGEST_MODE)
+    config_source = event.get('config_source', CONFIG_SOURCE)
+    shard_count = int(event.get('shards', 1))
+    shard_by = event.get('shard_by', 'hash')
+    shard_backend = event.get('shard_backend', SHARD_BACKEND)
+    resume_run_id = event.get('resume_run_id')
+    run_id = resume_run_id or getattr(context, 'aws_request_id', None) or uuid.uuid4().hex
+    
+    # Optional partition / environment / name-glob scope (pushed down into the parser)
+    scope = build_parse_scope(event)
+    if scope:
+        logger.info(f"Parse scope: {json.dumps({k: sorted(v) for k, v in scope.items() if k != 'name_regex'})}")
+    
+    with tempfile.TemporaryDirectory() as temp_dir:
+        try:
+            checkpoint = load_checkpoint(resume_run_id) if resume_run_id else None
+            exported = False
+            index1 = index2 = None
             
-            # Compare configurations with site-aware logic
-            comparison_data = compare_virtual_servers(vs1, vs2)
+            if checkpoint and checkpoint['stage'] == 'compared':
+                comparison_data = checkpoint['comparison_data']
+                comparison_stats = checkpoint.get('stats') or summarize_comparison(comparison_data)
+                exported = checkpoint.get('exported', False)
+            else:
+                if checkpoint:
+                    index1, index2 = checkpoint['index1'], checkpoint['index2']
+                else:
+                    index1, index2 = fetch_and_parse_configs(
+                        server1, server2, config_path, scope, temp_dir,
+                        sftp_channels, transport_profile, ingest_mode, config_source
+                    )
+                
+                # Not enough budget left to compare - checkpoint the parsed indexes and hand over
+                checkpoint_reason = 'deadline' if remaining_time_ms(context) < DEADLINE_COMPARE_MIN_MS else None
+                
+                if not checkpoint_reason:
+                    # Compare configurations with site-aware logic (optionally sharded map/reduce);
+                    # every statistic is accumulated during the comparison itself
+                    comparison_stats = new_comparison_stats()
+                    try:
+                        # Shard workers must answer while there is still time to checkpoint
+                        comparison_data = compare_config_indexes(
+                            index1, index2, shard_count, shard_by, shard_backend, run_id, comparison_stats,
+                            (remaining_time_ms(context) - DEADLINE_SHARD_MARGIN_MS) / 1000
+                        )
+                    except RuntimeError as e:
+                        # A failed or timed-out shard worker - the parsed indexes are still good
+                        logger.error(f"Sharded comparison of run {run_id} failed: {e}")
+                        checkpoint_reason = 'shard failure'
+                
+                if checkpoint_reason:
+                    save_checkpoint(run_id, 'parsed', {'index1': index1, 'index2': index2})
+                    resume_scheduled = schedule_resume(event, run_id)
+                    return {
+                        'statusCode': 202,
+                        'body': json.dumps({
+                            'message': f'F5 LTM comparison checkpointed after parsing ({checkpoint_reason})',
+                            'servers': [server1, server2],
+                            'run_id': run_id,
+                            'resume_scheduled': resume_scheduled
+                        })
+                    }
             
             # Smart analysis with environment-aware risk scoring
             logger.info("Running smart pattern analysis")
-            insights = analyze_patterns(comparison_data)
+            insights = analyze_patterns(comparison_data, stats=comparison_stats)
             logger.info(f"Analysis complete - Risk Level: {insights['risk_level']}")
             logger.info(f"Critical: {insights['critical_count']}/{insights['total_count']} ({insights['critical_percentage']}%)")
             logger.info(f"Assessment: {insights['assessment']}")
             
             # Statistics
-            stats = {
-                'total': len(comparison_data),
-                'differences': sum(1 for vs in comparison_data if vs['hasDifferences']),
-                'critical': sum(1 for vs in comparison_data if vs['isCritical']),
-                'warnings': sum(1 for vs in comparison_data if vs['isWarning']),
-                'no_redundancy': sum(1 for vs in comparison_data if vs['hasNoRedundancy'])
-            }
-            
-            # Generate report
-            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC')
-            html_content = generate_enhanced_html(comparison_data, server1, server2, timestamp, insights)
+            stats = build_stats(comparison_stats)
             
-            html_file = os.path.join(temp_dir, 'comparison.html')
-            zip_file = os.path.join(temp_dir, 'comparison.zip')
-            
-            with open(html_file, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            
-            logger.info("Enhanced HTML report generated")
-            
-            # Upload to S3
-            create_zip(html_file, zip_file)
-            s3_timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-            s3_key = f"comparisons/{s3_timestamp}_f5_ltm_comparison.zip"
-            s3_url = upload_to_s3(zip_file, BUCKET_NAME, s3_key)
+            # Not enough budget left for the HTML report - degrade to summary + NDJSON,
+            # checkpoint the comparison and let a follow-up invocation finish the report
+            if remaining_time_ms(context) < DEADLINE_REPORT_MIN_MS:
+                s3_timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+                export_keys = []
+                if EXPORT_RESULTS and not exported:
+                    export_keys = export_results(
+                        comparison_data, server1, server2, s3_timestamp, temp_dir, BUCKET_NAME
+                    )
+                save_checkpoint(run_id, 'compared', {
+                    'comparison_data': comparison_data,
+                    'stats': comparison_stats,
+                    'exported': exported or bool(export_keys)
+                })
+                resume_scheduled = schedule_resume(event, run_id)
+                logger.warning("Deadline approaching - skipped HTML report, emitted summary only")
+                
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({
+                        'message': 'F5 LTM comparison completed in degraded mode (deadline)',
+                        'degraded': True,
+                        'servers': [server1, server2],
+                        'run_id': run_id,
+                        'resume_scheduled': resume_scheduled,
+                        'exports': export_keys,
+                        'timestamp': s3_timestamp,
+                        'statistics': stats,
+                        'insights': insights
+                    })
+                }
             
-            # Store metadata in DynamoDB
-            store_comparison_metadata(
-                server1, server2, comparison_data, insights, s3_url,
-                datetime.now().isoformat()
+            # Report, exports, history, metrics and notifications
+            published = publish_comparison(
+                comparison_data, insights, stats, server1, server2, temp_dir, exported=exported, context=context
             )
+            s3_url = published['s3_url']
+            s3_timestamp = published['timestamp']
             
-            # Publish CloudWatch metrics
-            publish_cloudwatch_metrics(comparison_data, insights)
-            
-            # Send webhook with insights
-            if TEAMS_WEBHOOK_URL:
-                send_enhanced_webhook(
-                    TEAMS_WEBHOOK_URL, server1, server2, stats, insights, s3_url, timestamp
-                )
+            # Content-addressed archive of the masked parsed objects, once the report is out
+            # (the parsed indexes are gone when resuming from a 'compared' checkpoint)
+            manifests = {}
+            if ARCHIVE_CONFIGS and index1 is not None:
+                manifests = archive_parsed_configs({server1: index1, server2: index2}, scope, BUCKET_NAME, context)
             
             logger.info("F5 LTM comparison completed successfully")
             
@@ -1678,7 +5576,10 @@ def lambda_handler(event, context):
                     's3_url': s3_url,
                     'timestamp': s3_timestamp,
                     'statistics': stats,
-                    'insights': insights
+                    'insights': insights,
+                    'notifications': published['notifications'],
+                    'archive_manifests': [manifests.get(server1), manifests.get(server2)] if manifests else [],
+                    'scope': {k: sorted(v) for k, v in scope.items() if k != 'name_regex'}
                 })
             }
             
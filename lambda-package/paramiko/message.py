@@ -27,6 +27,12 @@ from paramiko import util
 from paramiko.common import zero_byte, max_byte, one_byte
 from paramiko.util import u
 
+_uint32 = struct.Struct(">I")
+_uint64 = struct.Struct(">Q")
+
+# Limit padding of short reads to 1 MB
+_max_pad_size = 1 << 20
+
 
 class Message:
     """
@@ -49,10 +55,21 @@ class Message:
             the byte stream to use as the message content (passed in only when
             decomposing a message).
         """
-        if content is not None:
-            self.packet = BytesIO(content)
+        # Parsing reads straight out of the `bytes` content with a cursor and
+        # precompiled structs (no copies but the returned strings).  Building
+        # collects the encoded parts, joined once when the content is needed.
+        # Reads and writes share the cursor, as with the stream this used to
+        # be: writing at the end appends (and leaves the cursor there), while
+        # writing with the cursor inside the content (e.g. after
+        # ``Message(content)`` or `rewind`) overwrites from the cursor on.
+        if content is None:
+            self._data = bytes()
+        elif type(content) is bytes:
+            self._data = content
         else:
-            self.packet = BytesIO()
+            self._data = memoryview(content).tobytes()
+        self._parts = []
+        self._pos = 0
 
     def __bytes__(self):
         return self.asbytes()
@@ -61,31 +78,62 @@ class Message:
         """
         Returns a string representation of this object, for debugging.
         """
-        return "paramiko.Message(" + repr(self.packet.getvalue()) + ")"
+        return "paramiko.Message(" + repr(self.asbytes()) + ")"
+
+    @property
+    def packet(self):
+        """
+        The message content as a `BytesIO` positioned at the parse cursor.
+
+        Kept for backwards compatibility only: it is a copy, so writing to it
+        does not change the message.
+        """
+        packet = BytesIO(self.asbytes())
+        packet.seek(self._pos)
+        return packet
+
+    def _join(self):
+        # append the parts added since the last call to the content
+        self._parts.insert(0, self._data)
+        self._data = bytes().join(self._parts)
+        self._parts = []
+        self._pos = len(self._data)
+
+    def _overwrite(self, b):
+        # write with the cursor inside the content (pending parts imply the
+        # cursor is at the end, so the add_* methods append those directly)
+        pos = self._pos
+        end = pos + len(b)
+        self._data = self._data[:pos] + b + self._data[end:]
+        self._pos = end
+        return self
 
     # TODO 4.0: just merge into __bytes__ (everywhere)
     def asbytes(self):
         """
         Return the byte stream content of this Message, as a `bytes`.
         """
-        return self.packet.getvalue()
+        if self._parts:
+            self._join()
+        return self._data
 
     def rewind(self):
         """
         Rewind the message to the beginning as if no items had been parsed
         out of it yet.
         """
-        self.packet.seek(0)
+        if self._parts:
+            self._join()
+        self._pos = 0
 
     def get_remainder(self):
         """
         Return the `bytes` of this message that haven't already been parsed and
         returned.
         """
-        position = self.packet.tell()
-        remainder = self.packet.read()
-        self.packet.seek(position)
-        return remainder
+        if self._parts:
+            self._join()
+        return self._data[self._pos :]
 
     def get_so_far(self):
         """
@@ -93,9 +141,9 @@ class Message:
         returned. The string passed into a message's constructor can be
         regenerated by concatenating ``get_so_far`` and `get_remainder`.
         """
-        position = self.packet.tell()
-        self.rewind()
-        return self.packet.read(position)
+        if self._parts:
+            self._join()
+        return self._data[: self._pos]
 
     def get_bytes(self, n):
         """
@@ -104,9 +152,12 @@ class Message:
         string of ``n`` zero bytes if there weren't ``n`` bytes remaining in
         the message.
         """
-        b = self.packet.read(n)
-        max_pad_size = 1 << 20  # Limit padding to 1 MB
-        if len(b) < n < max_pad_size:
+        if self._parts:
+            self._join()
+        pos = self._pos
+        b = self._data[pos : pos + n] if n >= 0 else self._data[pos:]
+        self._pos = pos + len(b)
+        if len(b) < n < _max_pad_size:
             return b + zero_byte * (n - len(b))
         return b
 
@@ -125,8 +176,11 @@ class Message:
         """
         Fetch a boolean from the stream.
         """
-        b = self.get_bytes(1)
-        return b != zero_byte
+        pos = self._pos
+        if pos < len(self._data) and not self._parts:
+            self._pos = pos + 1
+            return self._data[pos] != 0
+        return self.get_bytes(1) != zero_byte
 
     def get_adaptive_int(self):
         """
@@ -134,17 +188,22 @@ class Message:
 
         :return: a 32-bit unsigned `int`.
         """
-        byte = self.get_bytes(1)
-        if byte == max_byte:
+        pos = self._pos
+        data = self._data
+        if pos < len(data) and data[pos] == max_byte[0] and not self._parts:
+            self._pos = pos + 1
             return util.inflate_long(self.get_binary())
-        byte += self.get_bytes(3)
-        return struct.unpack(">I", byte)[0]
+        return self.get_int()
 
     def get_int(self):
         """
         Fetch an int from the stream.
         """
-        return struct.unpack(">I", self.get_bytes(4))[0]
+        pos = self._pos
+        if pos + 4 <= len(self._data) and not self._parts:
+            self._pos = pos + 4
+            return _uint32.unpack_from(self._data, pos)[0]
+        return _uint32.unpack(self.get_bytes(4))[0]
 
     def get_int64(self):
         """
@@ -152,7 +211,11 @@ class Message:
 
         :return: a 64-bit unsigned integer (`int`).
         """
-        return struct.unpack(">Q", self.get_bytes(8))[0]
+        pos = self._pos
+        if pos + 8 <= len(self._data) and not self._parts:
+            self._pos = pos + 8
+            return _uint64.unpack_from(self._data, pos)[0]
+        return _uint64.unpack(self.get_bytes(8))[0]
 
     def get_mpint(self):
         """
@@ -170,7 +233,7 @@ class Message:
         object, and may contain unprintable characters.  (It's not unheard of
         for a string to contain another byte-stream message.)
         """
-        return self.get_bytes(self.get_int())
+        return self.get_binary()
 
     # TODO 4.0: also consider having this take over the get_string name, and
     # remove this name instead.
@@ -187,6 +250,13 @@ class Message:
         """
         Alias for `get_string` (obtains a bytestring).
         """
+        data = self._data
+        start = self._pos + 4
+        if start <= len(data) and not self._parts:
+            end = start + _uint32.unpack_from(data, start - 4)[0]
+            if end <= len(data):
+                self._pos = end
+                return data[start:end]
         return self.get_bytes(self.get_int())
 
     def get_list(self):
@@ -203,7 +273,11 @@ class Message:
 
         :param bytes b: bytes to add
         """
-        self.packet.write(b)
+        if type(b) is not bytes:
+            b = memoryview(b).tobytes()
+        if self._pos < len(self._data):
+            return self._overwrite(b)
+        self._parts.append(b)
         return self
 
     def add_byte(self, b):
@@ -212,7 +286,11 @@ class Message:
 
         :param bytes b: byte to add
         """
-        self.packet.write(b)
+        if type(b) is not bytes:
+            b = memoryview(b).tobytes()
+        if self._pos < len(self._data):
+            return self._overwrite(b)
+        self._parts.append(b)
         return self
 
     def add_boolean(self, b):
@@ -221,10 +299,10 @@ class Message:
 
         :param bool b: boolean value to add
         """
-        if b:
-            self.packet.write(one_byte)
-        else:
-            self.packet.write(zero_byte)
+        b = one_byte if b else zero_byte
+        if self._pos < len(self._data):
+            return self._overwrite(b)
+        self._parts.append(b)
         return self
 
     def add_int(self, n):
@@ -233,7 +311,9 @@ class Message:
 
         :param int n: integer to add
         """
-        self.packet.write(struct.pack(">I", n))
+        if self._pos < len(self._data):
+            return self._overwrite(_uint32.pack(n))
+        self._parts.append(_uint32.pack(n))
         return self
 
     def add_adaptive_int(self, n):
@@ -243,11 +323,9 @@ class Message:
         :param int n: integer to add
         """
         if n >= Message.big_int:
-            self.packet.write(max_byte)
-            self.add_string(util.deflate_long(n))
-        else:
-            self.packet.write(struct.pack(">I", n))
-        return self
+            self.add_byte(max_byte)
+            return self.add_string(util.deflate_long(n))
+        return self.add_int(n)
 
     def add_int64(self, n):
         """
@@ -255,7 +333,9 @@ class Message:
 
         :param int n: long int to add
         """
-        self.packet.write(struct.pack(">Q", n))
+        if self._pos < len(self._data):
+            return self._overwrite(_uint64.pack(n))
+        self._parts.append(_uint64.pack(n))
         return self
 
     def add_mpint(self, z):
@@ -277,8 +357,12 @@ class Message:
         :param byte s: bytestring to add
         """
         s = util.asbytes(s)
-        self.add_int(len(s))
-        self.packet.write(s)
+        if type(s) is not bytes:
+            s = memoryview(s).tobytes()
+        if self._pos < len(self._data):
+            return self._overwrite(_uint32.pack(len(s)) + s)
+        self._parts.append(_uint32.pack(len(s)))
+        self._parts.append(s)
         return self
 
     def add_list(self, l):  # noqa: E741
@@ -26,7 +26,7 @@ import socket
 import struct
 import threading
 import time
-from hmac import HMAC
+from hmac import HMAC, compare_digest
 
 from paramiko import util
 from paramiko.common import (
@@ -47,6 +47,14 @@ def compute_hmac(key, message, digest_class):
     return HMAC(key, message, digest_class).digest()
 
 
+def compute_hmac_parts(key, parts, digest_class):
+    # HMAC over the concatenation of parts (bytes-like), without building it
+    mac = HMAC(key, None, digest_class)
+    for part in parts:
+        mac.update(part)
+    return mac.digest()
+
+
 class NeedRekeyException(Exception):
     """
     Exception indicating a rekey is needed.
@@ -78,6 +86,18 @@ class Packetizer:
     # Allow receiving this many bytes after a re-key request before terminating
     REKEY_BYTES_OVERFLOW_MAX = pow(2, 29)
 
+    # Initial size of the reusable inbound buffers (grown on demand): room
+    # for a full 32 KB channel data packet plus whatever follows it
+    INBOUND_BUFFER_SIZE = 64 * 1024
+
+    # Outbound batching (see start_batch): queued packets are flushed once
+    # this many bytes are pending, or FLUSH_DEADLINE seconds after being
+    # queued at the latest
+    BATCH_FLUSH_BYTES = 64 * 1024
+    FLUSH_DEADLINE = 0.002
+    # Buffers handed to a single sendmsg call (Linux IOV_MAX is 1024)
+    MAX_SEND_BUFFERS = 512
+
     def __init__(self, socket):
         self.__socket = socket
         self.__logger = None
@@ -121,9 +141,31 @@ class Packetizer:
         self.__iv_out = None
         self.__iv_in = None
 
+        # reusable inbound buffers: raw (as received) and decrypted packet.
+        # The socket is read with recv_into into the free tail of the raw
+        # buffer, so one read may pick up several packets; the unconsumed
+        # bytes are raw[start:end].  Packets are decrypted with update_into
+        # into the plain buffer.
+        self.__inbound_raw = bytearray(self.INBOUND_BUFFER_SIZE)
+        self.__inbound_plain = bytearray(self.INBOUND_BUFFER_SIZE)
+        self.__inbound_start = 0
+        self.__inbound_end = 0
+
         # lock around outbound writes (packet computation)
         self.__write_lock = threading.RLock()
 
+        # outbound batching: packets sent by the batch owner thread are
+        # encrypted right away but queued, then written together
+        self.__batch_owner = None
+        self.__batch_depth = 0
+        self.__outbound = []
+        self.__outbound_bytes = 0
+        self.__outbound_since = 0.0
+        # signalled when a batch queues its first packet or ends
+        self.__outbound_cv = threading.Condition(self.__write_lock)
+        self.__flusher = None
+        self._disable_nagle()
+
         # keepalives:
         self.__keepalive_interval = 0
         self.__keepalive_last = time.time()
@@ -226,6 +268,113 @@ class Packetizer:
     def close(self):
         self.__closed = True
         self.__socket.close()
+        # let an idle batch flusher exit; never block on a pending write
+        if self.__write_lock.acquire(False):
+            try:
+                self.__outbound_cv.notify_all()
+            finally:
+                self.__write_lock.release()
+
+    def _disable_nagle(self):
+        # Packets are coalesced here (see start_batch), so Nagle's algorithm
+        # only delays the small writes left, eg an SFTP read request right
+        # after a window adjust, by the peer's delayed ACK (~40ms).
+        try:
+            self.__socket.setsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NODELAY, 1
+            )
+        except (AttributeError, OSError):
+            # not a TCP socket (ProxyCommand, Channel, socketpair, ...)
+            pass
+
+    def start_batch(self):
+        """
+        Start coalescing the packets sent by the calling thread: they are
+        encrypted (and numbered) as usual but queued, and written together
+        with one gathered write by `flush` or `end_batch`, once
+        `BATCH_FLUSH_BYTES` are pending, or after `FLUSH_DEADLINE` at the
+        latest.  A packet sent by any other thread flushes the queue ahead of
+        itself.  Batches nest; they only pay off for bursts of small packets,
+        eg pipelined SFTP read requests.
+
+        :return:
+            ``True`` if the batch was started (call `end_batch` when done),
+            ``False`` if another thread is batching already
+        """
+        self.__write_lock.acquire()
+        try:
+            owner = threading.get_ident()
+            if self.__batch_depth > 0 and self.__batch_owner != owner:
+                # another thread is batching: leave its batch alone
+                return False
+            self.__batch_owner = owner
+            self.__batch_depth += 1
+            if self.__flusher is None:
+                # enforces FLUSH_DEADLINE while batches are open
+                self.__flusher = threading.Thread(
+                    target=self._batch_flusher, name="paramiko-flusher"
+                )
+                self.__flusher.daemon = True
+                self.__flusher.start()
+            return True
+        finally:
+            self.__write_lock.release()
+
+    def end_batch(self):
+        """
+        End a batch started (successfully) with `start_batch`; the outermost
+        one flushes the queued packets.
+        """
+        self.__write_lock.acquire()
+        try:
+            self.__batch_depth -= 1
+            if self.__batch_depth == 0:
+                self.__batch_owner = None
+                self.flush()
+                self.__outbound_cv.notify_all()
+        finally:
+            self.__write_lock.release()
+
+    def flush(self):
+        """
+        Write out the packets queued by a batch.  Batch owners should call
+        this before blocking on replies to them.
+        """
+        self.__write_lock.acquire()
+        try:
+            if not self.__outbound:
+                return
+            bufs = self.__outbound
+            self.__outbound = []
+            self.__outbound_bytes = 0
+            self.write_buffers(bufs)
+        finally:
+            self.__write_lock.release()
+
+    def _batch_flusher(self):
+        # Idle (no timer) until a batch queues its first packet, then flushes
+        # it FLUSH_DEADLINE later unless the owner flushed it meanwhile
+        with self.__outbound_cv:
+            try:
+                while self.__batch_depth > 0 and not self.__closed:
+                    if not self.__outbound:
+                        self.__outbound_cv.wait()
+                        continue
+                    wait = (
+                        self.__outbound_since
+                        + self.FLUSH_DEADLINE
+                        - time.monotonic()
+                    )
+                    if wait > 0:
+                        self.__outbound_cv.wait(wait)
+                    else:
+                        self.flush()
+            except (EOFError, socket.error) as e:
+                # the transport notices the dead socket on its next read
+                msg = "Failed to flush queued packets: {}"
+                self._log(DEBUG, msg.format(e))
+            finally:
+                self.__flusher = None
 
     def set_hexdump(self, hexdump):
         self.__dump_packets = hexdump
@@ -308,22 +457,51 @@ class Packetizer:
             ``EOFError`` -- if the socket was closed before all the bytes could
             be read
         """
-        out = bytes()
-        # handle over-reading from reading the banner line
-        if len(self.__remainder) > 0:
-            out = self.__remainder[:n]
-            self.__remainder = self.__remainder[n:]
-            n -= len(out)
-        while n > 0:
+        self._fill_inbound(n, check_rekey)
+        start = self.__inbound_start
+        self.__inbound_start = start + n
+        return bytes(self.__inbound_raw[start : start + n])
+
+    def _fill_inbound(self, n, check_rekey=False):
+        """
+        Make sure at least ``n`` unconsumed bytes are in the raw inbound
+        buffer, blocking as long as necessary.
+
+        :raises:
+            ``EOFError`` -- if the socket was closed before all the bytes could
+            be read
+        """
+        start, end = self.__inbound_start, self.__inbound_end
+        if end - start >= n:
+            return
+        buf = self.__inbound_raw
+        if start + n > len(buf):
+            # move the partial packet to the front, growing if it won't fit
+            if n > len(buf):
+                buf = bytearray(max(n, 2 * len(buf)))
+                buf[: end - start] = self.__inbound_raw[start:end]
+                self.__inbound_raw = buf
+            else:
+                buf[: end - start] = buf[start:end]
+            start, end = 0, end - start
+            self.__inbound_start, self.__inbound_end = start, end
+        view = memoryview(buf)
+        while end - start < n:
+            # handle over-reading from reading the banner line
+            if len(self.__remainder) > 0:
+                x = min(len(buf) - end, len(self.__remainder))
+                buf[end : end + x] = self.__remainder[:x]
+                self.__remainder = self.__remainder[x:]
+                end = self.__inbound_end = end + x
+                continue
             got_timeout = False
             if self.handshake_timed_out():
                 raise EOFError()
             try:
-                x = self.__socket.recv(n)
-                if len(x) == 0:
+                x = self._recv_into(view[end:])
+                if x == 0:
                     raise EOFError()
-                out += x
-                n -= len(x)
+                end = self.__inbound_end = end + x
             except socket.timeout:
                 got_timeout = True
             except socket.error as e:
@@ -340,18 +518,43 @@ class Packetizer:
             if got_timeout:
                 if self.__closed:
                     raise EOFError()
-                if check_rekey and (len(out) == 0) and self.__need_rekey:
+                if check_rekey and (end == start) and self.__need_rekey:
                     raise NeedRekeyException()
                 self._check_keepalive()
-        return out
+
+    def _recv_into(self, view):
+        # ProxyCommand and Channel "sockets" only implement recv()
+        recv_into = getattr(self.__socket, "recv_into", None)
+        if recv_into is not None:
+            return recv_into(view)
+        x = self.__socket.recv(len(view))
+        view[: len(x)] = x
+        return len(x)
 
     def write_all(self, out):
+        self.write_buffers([out])
+
+    def write_buffers(self, bufs):
+        """
+        Write a list of buffers, in order, with as few system calls as
+        possible: gathered with ``sendmsg`` when the socket supports it.
+
+        :raises: ``EOFError`` -- if the socket was closed
+        """
         self.__keepalive_last = time.time()
+        # ProxyCommand and Channel "sockets" only implement send()
+        sendmsg = getattr(self.__socket, "sendmsg", None)
+        bufs = [buf for buf in bufs if len(buf) > 0]
         iteration_with_zero_as_return_value = 0
-        while len(out) > 0:
+        while bufs:
+            if len(bufs) > 1 and sendmsg is None:
+                bufs = [b"".join(bufs)]
             retry_write = False
             try:
-                n = self.__socket.send(out)
+                if len(bufs) == 1:
+                    n = self.__socket.send(bufs[0])
+                else:
+                    n = sendmsg(bufs[: self.MAX_SEND_BUFFERS])
             except socket.timeout:
                 retry_write = True
             except socket.error as e:
@@ -380,9 +583,11 @@ class Packetizer:
                 iteration_with_zero_as_return_value += 1
             if n < 0:
                 raise EOFError()
-            if n == len(out):
-                break
-            out = out[n:]
+            # drop what was sent, keeping the unsent tail of a partial buffer
+            while bufs and n >= len(bufs[0]):
+                n -= len(bufs.pop(0))
+            if n > 0:
+                bufs[0] = memoryview(bufs[0])[n:]
         return
 
     def readline(self, timeout):
@@ -452,22 +657,39 @@ class Packetizer:
                     out = self.__block_engine_out.update(packet)
             else:
                 out = packet
-            # Append an MAC when needed (eg, not under AES-GCM)
+            # Append an MAC when needed (eg, not under AES-GCM); it is kept
+            # as a separate buffer of the gathered write
+            bufs = [out]
             if self.__block_engine_out is not None and not self.__aead_out:
                 packed = struct.pack(">I", self.__sequence_number_out)
-                payload = packed + (out if self.__etm_out else packet)
-                out += compute_hmac(
-                    self.__mac_key_out, payload, self.__mac_engine_out
-                )[: self.__mac_size_out]
+                bufs.append(
+                    compute_hmac_parts(
+                        self.__mac_key_out,
+                        (packed, out if self.__etm_out else packet),
+                        self.__mac_engine_out,
+                    )[: self.__mac_size_out]
+                )
             next_seq = (self.__sequence_number_out + 1) & xffffffff
             if next_seq == 0 and not self._initial_kex_done:
                 raise SSHException(
                     "Sequence number rolled over during initial kex!"
                 )
             self.__sequence_number_out = next_seq
-            self.write_all(out)
+            sent = sum(len(buf) for buf in bufs)
+            if not self.__outbound:
+                self.__outbound_since = time.monotonic()
+            self.__outbound.extend(bufs)
+            self.__outbound_bytes += sent
+            if (
+                self.__batch_owner != threading.get_ident()
+                or self.__outbound_bytes >= self.BATCH_FLUSH_BYTES
+            ):
+                self.flush()
+            elif len(self.__outbound) == len(bufs):
+                # first packet of the batch queue: arm the flush deadline
+                self.__outbound_cv.notify()
 
-            self.__sent_bytes += len(out)
+            self.__sent_bytes += sent
             self.__sent_packets += 1
             sent_too_much = (
                 self.__sent_packets >= self.REKEY_PACKETS
@@ -493,80 +715,60 @@ class Packetizer:
         :raises: `.SSHException` -- if the packet is mangled
         :raises: `.NeedRekeyException` -- if the transport should rekey
         """
-        header = self.read_all(self.__block_size_in, check_rekey=True)
-        if self.__etm_in:
-            packet_size = struct.unpack(">I", header[:4])[0]
-            remaining = packet_size - self.__block_size_in + 4
-            packet = header[4:] + self.read_all(remaining, check_rekey=False)
-            mac = self.read_all(self.__mac_size_in, check_rekey=False)
-            mac_payload = (
-                struct.pack(">II", self.__sequence_number_in, packet_size)
-                + packet
-            )
-            my_mac = compute_hmac(
-                self.__mac_key_in, mac_payload, self.__mac_engine_in
-            )[: self.__mac_size_in]
-            if not util.constant_time_bytes_eq(my_mac, mac):
-                raise SSHException("Mismatched MAC")
-            header = packet
-
-        if self.__aead_in:
-            # Grab unencrypted (considered 'additional data' under GCM) packet
-            # length.
-            packet_size = struct.unpack(">I", header[:4])[0]
-            aad = header[:4]
-            remaining = (
-                packet_size - self.__block_size_in + 4 + self.__mac_size_in
-            )
-            packet = header[4:] + self.read_all(remaining, check_rekey=False)
-            header = self.__block_engine_in.decrypt(self.__iv_in, packet, aad)
-
-            self.__iv_in = self._inc_iv_counter(self.__iv_in)
-
-        if self.__block_engine_in is not None and not self.__aead_in:
-            header = self.__block_engine_in.update(header)
-        if self.__dump_packets:
-            self._log(DEBUG, util.format_binary(header, "IN: "))
+        block_size = self.__block_size_in
+        mac_size = self.__mac_size_in
+        self._fill_inbound(block_size, check_rekey=True)
 
-        # When ETM or AEAD (GCM) are in use, we've already read the packet size
-        # & decrypted everything, so just set the packet back to the header we
-        # obtained.
         if self.__etm_in or self.__aead_in:
-            packet = header
-        # Otherwise, use the older non-ETM logic
+            # packet length is sent in the clear
+            packet_size = struct.unpack_from(
+                ">I", self.__inbound_raw, self.__inbound_start
+            )[0]
+            end = 4 + packet_size
+            raw = self._take_inbound(end + mac_size)
+            if self.__etm_in:
+                my_mac = compute_hmac_parts(
+                    self.__mac_key_in,
+                    (struct.pack(">I", self.__sequence_number_in), raw[:end]),
+                    self.__mac_engine_in,
+                )[:mac_size]
+                if not compare_digest(my_mac, raw[end:]):
+                    raise SSHException("Mismatched MAC")
+                packet = self._decrypt_into(raw, 4, end)[4:]
+            else:
+                # Packet-length field is the 'associated data' under GCM
+                plain = self.__block_engine_in.decrypt(
+                    self.__iv_in, raw[4:], raw[:4]
+                )
+                self.__iv_in = self._inc_iv_counter(self.__iv_in)
+                packet = memoryview(plain)
         else:
-            packet_size = struct.unpack(">I", header[:4])[0]
-
-            # leftover contains decrypted bytes from the first block (after the
-            # length field)
-            leftover = header[4:]
-            if (packet_size - len(leftover)) % self.__block_size_in != 0:
+            # the length is encrypted: decrypt the first block to learn it
+            start = self.__inbound_start
+            raw = memoryview(self.__inbound_raw)[start : start + block_size]
+            plain = self._decrypt_into(raw, 0, block_size)
+            packet_size = struct.unpack_from(">I", plain)[0]
+            end = 4 + packet_size
+            if (end - block_size) % block_size != 0:
                 raise SSHException("Invalid packet blocking")
-            buf = self.read_all(
-                packet_size + self.__mac_size_in - len(leftover)
-            )
-            packet = buf[: packet_size - len(leftover)]
-            post_packet = buf[packet_size - len(leftover) :]
-
-            if self.__block_engine_in is not None:
-                packet = self.__block_engine_in.update(packet)
-            packet = leftover + packet
+            raw = self._take_inbound(end + mac_size)
+            plain = self._decrypt_into(raw, block_size, end)
+            if mac_size > 0:
+                # MAC over sequence number + (plaintext) length + packet
+                seqno = struct.pack(">I", self.__sequence_number_in)
+                my_mac = compute_hmac_parts(
+                    self.__mac_key_in,
+                    (seqno, plain),
+                    self.__mac_engine_in,
+                )[:mac_size]
+                if not compare_digest(my_mac, raw[end:]):
+                    raise SSHException("Mismatched MAC")
+            packet = plain[4:]
 
         if self.__dump_packets:
-            self._log(DEBUG, util.format_binary(packet, "IN: "))
+            self._log(DEBUG, util.format_binary(bytes(packet), "IN: "))
 
-        if self.__mac_size_in > 0 and not self.__etm_in and not self.__aead_in:
-            mac = post_packet[: self.__mac_size_in]
-            mac_payload = (
-                struct.pack(">II", self.__sequence_number_in, packet_size)
-                + packet
-            )
-            my_mac = compute_hmac(
-                self.__mac_key_in, mac_payload, self.__mac_engine_in
-            )[: self.__mac_size_in]
-            if not util.constant_time_bytes_eq(my_mac, mac):
-                raise SSHException("Mismatched MAC")
-        padding = byte_ord(packet[0])
+        padding = packet[0]
         payload = packet[1 : packet_size - padding]
 
         if self.__dump_packets:
@@ -578,9 +780,10 @@ class Packetizer:
             )
 
         if self.__compress_engine_in is not None:
-            payload = self.__compress_engine_in(payload)
+            payload = self.__compress_engine_in(bytes(payload))
 
-        msg = Message(payload[1:])
+        # the only copy out of the reusable buffers: the message body
+        msg = Message(bytes(payload[1:]))
         msg.seqno = self.__sequence_number_in
         next_seq = (self.__sequence_number_in + 1) & xffffffff
         if next_seq == 0 and not self._initial_kex_done:
@@ -673,6 +876,35 @@ class Packetizer:
                 raise socket.timeout()
         return x
 
+    def _take_inbound(self, n):
+        """
+        Consume the next ``n`` bytes of the raw inbound buffer (receiving as
+        needed) and return a view of them, valid until the next read.
+        """
+        self._fill_inbound(n)
+        start = self.__inbound_start
+        self.__inbound_start = start + n
+        return memoryview(self.__inbound_raw)[start : start + n]
+
+    def _decrypt_into(self, raw, start, end):
+        """
+        Decrypt ``raw[start:end]`` into the same range of the plain buffer
+        and return a view of ``[:end]`` of it (``raw`` itself when no cipher
+        is active yet).
+        """
+        engine = self.__block_engine_in
+        if engine is None:
+            return raw[:end]
+        # update_into wants block_size - 1 bytes of output slack
+        if len(self.__inbound_plain) < end + 32:
+            plain = bytearray(max(end + 32, 2 * len(self.__inbound_plain)))
+            plain[:start] = self.__inbound_plain[:start]
+            self.__inbound_plain = plain
+        plain = memoryview(self.__inbound_plain)
+        if start < end:
+            engine.update_into(raw[start:end], plain[start:])
+        return plain[:end]
+
     def _build_packet(self, payload):
         # pad up at least 4 bytes, to nearest block-size (usually 8)
         bsize = self.__block_size_out
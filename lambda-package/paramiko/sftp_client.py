@@ -856,6 +856,14 @@ class SFTPClient(BaseSFTP, ClosingContextManager):
         num = self._async_request(type(None), t, *args)
         return self._read_response(num)
 
+    def _get_packetizer(self):
+        # the transport's Packetizer, to batch bursts of requests; None when
+        # not running over an SSH channel
+        get_transport = getattr(self.sock, "get_transport", None)
+        if get_transport is None:
+            return None
+        return get_transport().packetizer
+
     def _async_request(self, fileobj, t, *args):
         # this method may be called from other threads (prefetch)
         self._lock.acquire()
@@ -22,11 +22,12 @@ SFTP file object
 
 
 from binascii import hexlify
+from bisect import bisect_left, bisect_right, insort
 from collections import deque
 import socket
 import threading
 import time
-from paramiko.common import DEBUG, io_sleep
+from paramiko.common import DEBUG
 
 from paramiko.file import BufferedFile
 from paramiko.util import u
@@ -58,6 +59,20 @@ class SFTPFile(BufferedFile):
     # this size.
     MAX_REQUEST_SIZE = 32768
 
+    # Adaptive prefetch: the number of in-flight read requests follows an
+    # AIMD controller.  Once per round (a window's worth of responses) the
+    # requests queued beyond the bandwidth-delay product are estimated from
+    # the round's throughput (window / mean RTT) and the minimum RTT seen:
+    # queued = window - throughput * min_rtt.  While fewer than
+    # ADAPTIVE_QUEUE_LOW of the window is queued the window grows (doubling
+    # until the first decrease, then by one); above ADAPTIVE_QUEUE_HIGH it
+    # is halved.  In between, the link is full with some headroom.
+    ADAPTIVE_INITIAL_REQUESTS = 8
+    ADAPTIVE_MIN_REQUESTS = 2
+    ADAPTIVE_MAX_REQUESTS = 256
+    ADAPTIVE_QUEUE_LOW = 0.25
+    ADAPTIVE_QUEUE_HIGH = 0.5
+
     def __init__(self, sftp, handle, mode="r", bufsize=-1):
         BufferedFile.__init__(self)
         self.sftp = sftp
@@ -68,7 +83,19 @@ class SFTPFile(BufferedFile):
         self._prefetch_done = False
         self._prefetch_data = {}
         self._prefetch_extents = {}
+        # sorted offset indexes over _prefetch_data keys and over the
+        # outstanding extents as (offset, length, num), so lookups by file
+        # position are O(log n) instead of a scan of every buffer/request
+        self._prefetch_data_offsets = []
+        self._prefetch_extent_index = []
         self._prefetch_lock = threading.Lock()
+        # signalled whenever an extent is registered or answered (or the
+        # file is closed), so neither side has to poll
+        self._prefetch_cv = threading.Condition(self._prefetch_lock)
+        self._prefetch_issuing = False
+        self._prefetch_sent = {}
+        self._prefetch_window = None
+        self._prefetch_max_requests = None
         self._saved_exception = None
         self._reqs = deque()
 
@@ -95,6 +122,10 @@ class SFTPFile(BufferedFile):
         if self.pipelined:
             self.sftp._finish_responses(self)
         BufferedFile.close(self)
+        with self._prefetch_cv:
+            # wake a prefetch thread waiting for window space; only now that
+            # _closed is set will it see the file closed and exit
+            self._prefetch_cv.notify_all()
         try:
             if async_:
                 # GC'd file handle could be called from an arbitrary thread
@@ -110,24 +141,36 @@ class SFTPFile(BufferedFile):
             pass
 
     def _data_in_prefetch_requests(self, offset, size):
-        k = [
-            x for x in list(self._prefetch_extents.values()) if x[0] <= offset
-        ]
-        if len(k) == 0:
-            return False
-        k.sort(key=lambda x: x[0])
-        buf_offset, buf_size = k[-1]
-        if buf_offset + buf_size <= offset:
-            # prefetch request ends before this one begins
-            return False
-        if buf_offset + buf_size >= offset + size:
-            # inclusive
-            return True
-        # well, we have part of the request.  see if another chunk has
-        # the rest.
-        return self._data_in_prefetch_requests(
-            buf_offset + buf_size, offset + size - buf_offset - buf_size
-        )
+        with self._prefetch_lock:
+            extents = self._prefetch_extent_index
+            end = offset + size
+            while True:
+                # last extent starting at or before offset
+                i = bisect_right(extents, (offset, float("inf"))) - 1
+                if i < 0:
+                    return False
+                buf_offset, buf_size, _ = extents[i]
+                if buf_offset + buf_size <= offset:
+                    # prefetch request ends before this one begins
+                    return False
+                if buf_offset + buf_size >= end:
+                    # inclusive
+                    return True
+                # well, we have part of the request.  see if another chunk
+                # has the rest.
+                offset = buf_offset + buf_size
+
+    def _add_prefetch_data(self, offset, data):
+        # caller holds _prefetch_lock
+        if offset not in self._prefetch_data:
+            insort(self._prefetch_data_offsets, offset)
+        self._prefetch_data[offset] = data
+
+    def _pop_prefetch_data(self, offset):
+        # caller holds _prefetch_lock
+        offsets = self._prefetch_data_offsets
+        del offsets[bisect_left(offsets, offset)]
+        return self._prefetch_data.pop(offset)
 
     def _data_in_prefetch_buffers(self, offset):
         """
@@ -136,15 +179,17 @@ class SFTPFile(BufferedFile):
         return None.  this guarantees nothing about the number of bytes
         collected in the prefetch buffer so far.
         """
-        k = [i for i in self._prefetch_data.keys() if i <= offset]
-        if len(k) == 0:
-            return None
-        index = max(k)
-        buf_offset = offset - index
-        if buf_offset >= len(self._prefetch_data[index]):
-            # it's not here
-            return None
-        return index
+        with self._prefetch_lock:
+            offsets = self._prefetch_data_offsets
+            i = bisect_right(offsets, offset) - 1
+            if i < 0:
+                return None
+            index = offsets[i]
+            buf_offset = offset - index
+            if buf_offset >= len(self._prefetch_data[index]):
+                # it's not here
+                return None
+            return index
 
     def _read_prefetch(self, size):
         """
@@ -164,16 +209,18 @@ class SFTPFile(BufferedFile):
         if offset is None:
             self._prefetching = False
             return None
-        prefetch = self._prefetch_data[offset]
-        del self._prefetch_data[offset]
-
-        buf_offset = self._realpos - offset
-        if buf_offset > 0:
-            self._prefetch_data[offset] = prefetch[:buf_offset]
-            prefetch = prefetch[buf_offset:]
-        if size < len(prefetch):
-            self._prefetch_data[self._realpos + size] = prefetch[size:]
-            prefetch = prefetch[:size]
+        with self._prefetch_lock:
+            prefetch = self._pop_prefetch_data(offset)
+
+            buf_offset = self._realpos - offset
+            if buf_offset > 0:
+                self._add_prefetch_data(offset, prefetch[:buf_offset])
+                prefetch = prefetch[buf_offset:]
+            if size < len(prefetch):
+                self._add_prefetch_data(
+                    self._realpos + size, prefetch[size:]
+                )
+                prefetch = prefetch[:size]
         return prefetch
 
     def _read(self, size):
@@ -435,7 +482,9 @@ class SFTPFile(BufferedFile):
         """
         self.pipelined = pipelined
 
-    def prefetch(self, file_size=None, max_concurrent_requests=None):
+    def prefetch(
+        self, file_size=None, max_concurrent_requests=None, adaptive=False
+    ):
         """
         Pre-fetch the remaining contents of this file in anticipation of future
         `.read` calls.  If reading the entire file, pre-fetching can
@@ -457,7 +506,12 @@ class SFTPFile(BufferedFile):
         :param int max_concurrent_requests:
             The maximum number of concurrent read requests to prefetch. See
             `.SFTPClient.get` (its ``max_concurrent_prefetch_requests`` param)
-            for details.
+            for details. With ``adaptive`` this is the upper bound of the
+            adaptive window.
+        :param bool adaptive:
+            When ``True``, grow and shrink the number of concurrent read
+            requests with the measured RTT and throughput (AIMD) instead of
+            keeping it fixed.
 
         .. versionadded:: 1.5.1
         .. versionchanged:: 1.16.0
@@ -479,9 +533,11 @@ class SFTPFile(BufferedFile):
             chunks.append((n, chunk))
             n += chunk
         if len(chunks) > 0:
-            self._start_prefetch(chunks, max_concurrent_requests)
+            self._start_prefetch(chunks, max_concurrent_requests, adaptive)
 
-    def readv(self, chunks, max_concurrent_prefetch_requests=None):
+    def readv(
+        self, chunks, max_concurrent_prefetch_requests=None, adaptive=False
+    ):
         """
         Read a set of blocks from the file by (offset, length).  This is more
         efficient than doing a series of `.seek` and `.read` calls, since the
@@ -495,6 +551,8 @@ class SFTPFile(BufferedFile):
             The maximum number of concurrent read requests to prefetch. See
             `.SFTPClient.get` (its ``max_concurrent_prefetch_requests`` param)
             for details.
+        :param bool adaptive:
+            adapt the number of concurrent read requests (see `prefetch`)
         :return: a list of blocks read, in the same order as in ``chunks``
 
         .. versionadded:: 1.5.4
@@ -520,7 +578,9 @@ class SFTPFile(BufferedFile):
                 offset += chunk_size
                 size -= chunk_size
 
-        self._start_prefetch(read_chunks, max_concurrent_prefetch_requests)
+        self._start_prefetch(
+            read_chunks, max_concurrent_prefetch_requests, adaptive
+        )
         # now we can just devolve to a bunch of read()s :)
         for x in chunks:
             self.seek(x[0])
@@ -534,9 +594,28 @@ class SFTPFile(BufferedFile):
         except:
             return 0
 
-    def _start_prefetch(self, chunks, max_concurrent_requests=None):
+    def _start_prefetch(
+        self, chunks, max_concurrent_requests=None, adaptive=False
+    ):
         self._prefetching = True
         self._prefetch_done = False
+        with self._prefetch_cv:
+            self._prefetch_issuing = True
+            self._prefetch_max_requests = max_concurrent_requests
+            if adaptive:
+                limit = max_concurrent_requests or self.ADAPTIVE_MAX_REQUESTS
+                self._prefetch_window = {
+                    "size": min(self.ADAPTIVE_INITIAL_REQUESTS, limit),
+                    "limit": limit,
+                    "slow_start": True,
+                    "min_rtt": None,
+                    "received": 0,
+                    "round_end": 0,
+                    "round_rtt": 0.0,
+                    "round_received": 0,
+                }
+            else:
+                self._prefetch_window = None
 
         t = threading.Thread(
             target=self._prefetch_thread,
@@ -545,24 +624,88 @@ class SFTPFile(BufferedFile):
         t.daemon = True
         t.start()
 
+    def _prefetch_limit(self, max_concurrent_requests):
+        # caller holds _prefetch_lock
+        if self._prefetch_window is not None:
+            return int(self._prefetch_window["size"])
+        return max_concurrent_requests
+
+    def _prefetch_has_room(self, max_concurrent_requests):
+        # caller holds _prefetch_lock
+        limit = self._prefetch_limit(max_concurrent_requests)
+        return limit is None or len(self._prefetch_extents) < limit
+
     def _prefetch_thread(self, chunks, max_concurrent_requests):
         # do these read requests in a temporary thread because there may be
-        # a lot of them, so it may block.
-        for offset, length in chunks:
-            # Limit the number of concurrent requests in a busy-loop
-            if max_concurrent_requests is not None:
-                while True:
-                    with self._prefetch_lock:
-                        pf_len = len(self._prefetch_extents)
-                        if pf_len < max_concurrent_requests:
+        # a lot of them, so it may block.  Requests issued between waits are
+        # coalesced into as few writes as possible (Packetizer.start_batch).
+        packetizer = self.sftp._get_packetizer()
+        batching = packetizer is not None and packetizer.start_batch()
+        try:
+            for offset, length in chunks:
+                with self._prefetch_cv:
+                    full = not self._prefetch_has_room(max_concurrent_requests)
+                if full and batching:
+                    # about to wait for replies: send the queued requests
+                    packetizer.flush()
+                with self._prefetch_cv:
+                    # wait for window space (responses notify)
+                    while not self._closed:
+                        if self._prefetch_has_room(max_concurrent_requests):
                             break
-                    time.sleep(io_sleep)
+                        self._prefetch_cv.wait()
+                    if self._closed:
+                        return
+
+                sent = time.monotonic()
+                num = self.sftp._async_request(
+                    self, CMD_READ, self.handle, int64(offset), int(length)
+                )
+                with self._prefetch_cv:
+                    self._prefetch_extents[num] = (offset, length)
+                    self._prefetch_sent[num] = sent
+                    insort(self._prefetch_extent_index, (offset, length, num))
+                    self._prefetch_cv.notify_all()
+        finally:
+            try:
+                if batching:
+                    packetizer.end_batch()
+            finally:
+                with self._prefetch_cv:
+                    self._prefetch_issuing = False
+                    if len(self._prefetch_extents) == 0:
+                        self._prefetch_done = True
+                    self._prefetch_cv.notify_all()
+
+    def _adapt_prefetch_window(self, rtt):
+        # caller holds _prefetch_lock; called once per answered request
+        window = self._prefetch_window
+        if window["min_rtt"] is None or rtt < window["min_rtt"]:
+            window["min_rtt"] = rtt
+        window["received"] += 1
+        window["round_rtt"] += rtt
+        if window["received"] < window["round_end"]:
+            return
 
-            num = self.sftp._async_request(
-                self, CMD_READ, self.handle, int64(offset), int(length)
-            )
-            with self._prefetch_lock:
-                self._prefetch_extents[num] = (offset, length)
+        # end of a round: throughput over the round vs. what the window
+        # would carry with no queueing
+        received = window["received"] - window["round_received"]
+        mean_rtt = window["round_rtt"] / received
+        size = window["size"]
+        if mean_rtt > 0:
+            queued = size - size / mean_rtt * window["min_rtt"]
+            if queued > size * self.ADAPTIVE_QUEUE_HIGH:
+                # multiplicative decrease
+                size = max(self.ADAPTIVE_MIN_REQUESTS, size / 2)
+                window["slow_start"] = False
+            elif queued < size * self.ADAPTIVE_QUEUE_LOW:
+                # additive increase (exponential before the first decrease)
+                size = size * 2 if window["slow_start"] else size + 1
+            window["size"] = min(size, window["limit"])
+
+        window["round_rtt"] = 0.0
+        window["round_received"] = window["received"]
+        window["round_end"] = window["received"] + int(window["size"])
 
     def _async_response(self, t, msg, num):
         if t == CMD_STATUS:
@@ -575,16 +718,25 @@ class SFTPFile(BufferedFile):
         if t != CMD_DATA:
             raise SFTPError("Expected data")
         data = msg.get_string()
-        while True:
-            with self._prefetch_lock:
-                # spin if in race with _prefetch_thread
-                if num in self._prefetch_extents:
-                    offset, length = self._prefetch_extents[num]
-                    self._prefetch_data[offset] = data
-                    del self._prefetch_extents[num]
-                    if len(self._prefetch_extents) == 0:
-                        self._prefetch_done = True
-                    break
+        with self._prefetch_cv:
+            # the response can beat _prefetch_thread registering the extent
+            while num not in self._prefetch_extents:
+                self._prefetch_cv.wait()
+            offset, length = self._prefetch_extents.pop(num)
+            sent = self._prefetch_sent.pop(num)
+            extents = self._prefetch_extent_index
+            del extents[bisect_left(extents, (offset, length, num))]
+            self._add_prefetch_data(offset, data)
+            if self._prefetch_window is not None:
+                self._adapt_prefetch_window(time.monotonic() - sent)
+            in_flight = len(self._prefetch_extents)
+            if in_flight == 0 and not self._prefetch_issuing:
+                self._prefetch_done = True
+            # wake the prefetch thread once a batch of window space is free
+            # rather than after every response
+            limit = self._prefetch_limit(self._prefetch_max_requests)
+            if limit is None or in_flight <= limit - max(1, limit // 8):
+                self._prefetch_cv.notify_all()
 
     def _check_exception(self):
         """if there's a saved exception, raise & clear it"""
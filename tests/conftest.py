@@ -0,0 +1,7 @@
+import os
+import sys
+
+# lambda_function and its vendored dependencies are deployed from
+# lambda-package/; appended so platform wheels installed for the tests win
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'lambda-package'))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
@@ -0,0 +1,113 @@
+import gzip
+import io
+import json
+import threading
+
+import pytest
+from botocore.exceptions import ClientError
+
+import lambda_function as lf
+
+DEVICES = {
+    'bigip-a': {
+        'virtual_servers': {'/Common/vs1': {'destination': '/Common/10.0.0.1:443', 'pool': '/Common/P'}},
+        'objects': {'ltm pool /Common/P': {'load-balancing-mode': 'round-robin'}},
+        'references': {'/Common/vs1': ['ltm pool /Common/P']},
+        'defined': ['ltm pool /Common/P']
+    },
+    'bigip-b': {
+        'virtual_servers': {'/Common/vs1': {'destination': '/Common/10.0.0.1:443', 'pool': '/Common/P'}},
+        'objects': {'ltm pool /Common/P': {'load-balancing-mode': 'least-connections-member'}},
+        'references': {'/Common/vs1': ['ltm pool /Common/P']},
+        'defined': ['ltm pool /Common/P']
+    }
+}
+
+
+class StubS3:
+    """In-memory put_object / get_object"""
+
+    def __init__(self):
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        with self.lock:
+            self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def blobs(self):
+        return [key for key in self.objects if key.startswith(f"{lf.ARCHIVE_PREFIX}/objects/")]
+
+
+class Context:
+    """Reports the given remaining times in turn, then the last one"""
+
+    def __init__(self, *remaining_ms):
+        self.remaining_ms = list(remaining_ms)
+        self.lock = threading.Lock()
+
+    def get_remaining_time_in_millis(self):
+        with self.lock:
+            return self.remaining_ms.pop(0) if len(self.remaining_ms) > 1 else self.remaining_ms[0]
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    stub = StubS3()
+    monkeypatch.setattr(lf, 's3_client', stub)
+    return stub
+
+
+def test_archive_writes_manifests_and_deduplicates(s3):
+    manifests = lf.archive_parsed_configs(DEVICES, {}, 'bucket', Context(60000))
+    assert set(manifests) == {'bigip-a', 'bigip-b'}
+    # the identical virtual server is stored once
+    assert len(s3.blobs()) == 3
+    manifest = json.loads(gzip.decompress(s3.objects[manifests['bigip-a']]))
+    assert manifest['defined'] == ['ltm pool /Common/P']
+    assert lf.load_latest_manifest('bucket', 'bigip-a') == manifest
+
+    s3.objects = {key: body for key, body in s3.objects.items() if '/manifests/' in key}
+    lf.archive_parsed_configs(DEVICES, {}, 'bucket', Context(60000))
+    # everything the previous manifests point at is assumed stored
+    assert s3.blobs() == []
+
+
+def test_archive_skipped_near_deadline(s3):
+    assert lf.archive_parsed_configs(DEVICES, {}, 'bucket', Context(lf.DEADLINE_ARCHIVE_MIN_MS - 1)) == {}
+    assert s3.objects == {}
+
+
+def test_archive_interrupted_writes_no_manifest(s3):
+    # enough budget to start and upload one blob, not all three
+    context = Context(lf.DEADLINE_ARCHIVE_MIN_MS, lf.DEADLINE_ARCHIVE_STOP_MS, lf.DEADLINE_ARCHIVE_STOP_MS - 1)
+    assert lf.archive_parsed_configs(DEVICES, {}, 'bucket', context) == {}
+    assert len(s3.blobs()) == 1
+    assert not [key for key in s3.objects if '/manifests/' in key]
+
+
+def test_blobs_are_canonical_representatives(s3):
+    # Same pool, written with different list order and spacing on each device
+    devices = {
+        host: {
+            'virtual_servers': {},
+            'objects': {'ltm pool /Common/P': {'members': members}},
+            'references': {},
+            'defined': ['ltm pool /Common/P']
+        }
+        for host, members in (('bigip-a', '{ /Common/a:80 { } /Common/b:80 { } }'),
+                              ('bigip-b', '{  /Common/b:80 { }  /Common/a:80 { } }'))
+    }
+    manifests = lf.archive_parsed_configs(devices, {}, 'bucket', Context(60000))
+    [digest] = {
+        json.loads(gzip.decompress(s3.objects[key]))['objects']['ltm pool /Common/P'] for key in manifests.values()
+    }
+    [blob] = s3.blobs()
+    # One blob for both: the first device's raw value stands for the canonical form
+    assert json.loads(gzip.decompress(s3.objects[blob])) == devices['bigip-a']['objects']['ltm pool /Common/P']
+    assert lf.archive_blob_key(digest) == blob
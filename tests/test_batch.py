@@ -0,0 +1,88 @@
+import json
+
+import pytest
+
+import lambda_function as lf
+from test_dependencies import CONFIG
+
+
+class StubS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+
+class Context:
+    """Reports the given remaining times in turn, then the last one"""
+
+    def __init__(self, *remaining_ms):
+        self.remaining_ms = list(remaining_ms)
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms.pop(0) if len(self.remaining_ms) > 1 else self.remaining_ms[0]
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    """Devices parsed from CONFIG (C with a pool member moved); returns (published reports, S3 stub)"""
+    published = []
+    s3 = StubS3()
+
+    def fetch_and_parse_devices(hosts, *args):
+        changed = CONFIG.replace(b'address 10.100.1.1', b'address 10.100.1.9')
+        return {
+            host: lf.parse_ltm_config(changed if host == 'C' else CONFIG, None, True, True)
+            for host in dict.fromkeys(hosts)
+        }
+
+    def publish_comparison(comparison_data, insights, stats, server1, server2, temp_dir, report_name, context):
+        published.append(report_name)
+        return {'s3_url': f's3://reports/{report_name}.zip', 'timestamp': '20260101-000000'}
+
+    monkeypatch.setattr(lf, 'fetch_and_parse_devices', fetch_and_parse_devices)
+    monkeypatch.setattr(lf, 'publish_comparison', publish_comparison)
+    monkeypatch.setattr(lf, 's3_client', s3)
+    monkeypatch.setattr(lf, 'ARCHIVE_CONFIGS', False)
+    return published, s3
+
+
+def test_invalid_batches_are_rejected(batch):
+    for event in (
+        {'groups': [['A']]},
+        {'groups': [['A', 'A']]},
+        {'pairs': [['A']]},
+        {'pairs': [['A', 'A']]},
+        {'pairs': ['AB']},
+        {'action': 'sentinel', 'groups': [['A']]},
+    ):
+        response = lf.lambda_handler(event, Context(300000))
+        assert response['statusCode'] == 400, event
+        assert 'pair' in json.loads(response['body'])['message']
+    assert batch[0] == []
+
+
+def test_consolidated_summary(batch):
+    response = lf.lambda_handler({'groups': [['A', 'B', 'C']], 'pairs': [['A', 'B']]}, Context(300000))
+    assert response['statusCode'] == 200
+    summary = json.loads(response['body'])
+    assert summary['devices'] == ['A', 'B', 'C']
+    assert [result['servers'] for result in summary['pairs']] == [['A', 'B'], ['A', 'C'], ['B', 'C']]
+    published, s3 = batch
+    assert published == ['A_vs_B', 'A_vs_C', 'B_vs_C']
+    assert summary['skipped_pairs'] == []
+    # The moved member only differs in the pairs with C
+    assert [result['statistics']['critical'] for result in summary['pairs']] == [0, 1, 1]
+    assert summary['totals'] == {'total': 3, 'differences': 2, 'critical': 2, 'warnings': 0, 'no_redundancy': 0}
+    stored = json.loads(s3.objects[summary['summary_key']])
+    assert stored == {key: value for key, value in summary.items() if key != 'summary_key'}
+
+
+def test_deadline_skips_remaining_pairs(batch):
+    context = Context(300000, lf.DEADLINE_REPORT_MIN_MS - 1)
+    summary = json.loads(lf.lambda_handler({'groups': [['A', 'B', 'C']]}, context)['body'])
+    assert [result['servers'] for result in summary['pairs']] == [['A', 'B']]
+    assert summary['skipped_pairs'] == [['A', 'C'], ['B', 'C']]
+    assert batch[0] == ['A_vs_B']
+    assert summary['totals']['total'] == 1
@@ -0,0 +1,32 @@
+import lambda_function as lf
+
+RULE = '''when HTTP_REQUEST {
+    if { [HTTP::uri] starts_with "/api" } { pool /Common/api }
+    if { [HTTP::host] eq "www.example.com" } { pool /Common/web }
+}'''
+
+
+def test_rule_bodies_keep_their_order():
+    lines = RULE.splitlines()
+    swapped = '\n'.join([lines[0], lines[2], lines[1], lines[3]])
+    assert lf.canonical_value_hash('definition', RULE) != lf.canonical_value_hash('definition', swapped)
+    assert lf.archive_digest({'definition': RULE}) != lf.archive_digest({'definition': swapped})
+
+
+def test_rule_bodies_ignore_whitespace():
+    reindented = '\n\n'.join('\t' + '  '.join(line.split()) for line in RULE.splitlines())
+    assert lf.canonical_value_hash('definition', RULE) == lf.canonical_value_hash('definition', reindented)
+
+
+def test_set_valued_keys_are_sorted():
+    assert lf.canonical_value_hash('profiles', '{ /Common/tcp { } /Common/http { context all } }') == \
+        lf.canonical_value_hash('profiles', '{ /Common/http { context all } /Common/tcp { } }')
+    assert lf.canonical_value_hash('vlans', '{ /Common/v2 /Common/v1 }') == \
+        lf.canonical_value_hash('vlans', '{ /Common/v1 /Common/v2 }')
+
+
+def test_other_groups_keep_their_order():
+    assert lf.canonical_value_hash('rules', '{ /Common/a /Common/b }') != \
+        lf.canonical_value_hash('rules', '{ /Common/b /Common/a }')
+    assert lf.canonical_value_hash('actions', '{ 0 { forward } 1 { drop } }') != \
+        lf.canonical_value_hash('actions', '{ 1 { drop } 0 { forward } }')
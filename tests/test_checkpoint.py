@@ -0,0 +1,213 @@
+import gzip
+import io
+import json
+
+import pytest
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+import lambda_function as lf
+
+CONFIG = b'''ltm pool /Common/P {
+    members {
+        /Common/n1:80 {
+            address 10.100.1.1
+        }
+    }
+}
+ltm virtual /Common/prod-vs1 {
+    destination /Common/10.100.0.1:443
+    pool /Common/P
+}
+ltm virtual /Common/prod-vs2 {
+    destination /Common/10.100.0.2:443
+    pool /Common/P
+}
+'''
+
+
+class StubS3:
+    """In-memory put_object / get_object"""
+
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+    def checkpoint(self, run_id, stage):
+        key = f"{lf.CHECKPOINT_PREFIX}/{run_id}/{stage}.json.gz"
+        return json.loads(gzip.decompress(self.objects[key])) if key in self.objects else None
+
+
+class StubLambda:
+    """Records asynchronous invocations"""
+
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.invocations.append(json.loads(Payload))
+
+
+class Context:
+    aws_request_id = 'run-1'
+
+    def __init__(self, remaining_ms=300000):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+@pytest.fixture
+def aws(monkeypatch):
+    """Stub S3 and Lambda clients, and a handler that can resume itself"""
+    s3, lambda_client = StubS3(), StubLambda()
+    monkeypatch.setattr(lf, 's3_client', s3)
+    monkeypatch.setattr(lf, 'lambda_client', lambda_client)
+    monkeypatch.setattr(lf, 'AUTO_RESUME', True)
+    monkeypatch.setenv('AWS_LAMBDA_FUNCTION_NAME', 'f5-compare')
+    return s3, lambda_client
+
+
+@pytest.fixture
+def parsed(monkeypatch):
+    """fetch_and_parse_configs answers from CONFIG; yields the fetch count"""
+    fetches = []
+
+    def fetch_and_parse_configs(server1, server2, *args):
+        fetches.append((server1, server2))
+        index = lf.parse_ltm_config(CONFIG, None, True, True)
+        return index, index
+
+    monkeypatch.setattr(lf, 'fetch_and_parse_configs', fetch_and_parse_configs)
+    return fetches
+
+
+def test_shard_timeout_checkpoints_and_resumes(aws, parsed, monkeypatch):
+    s3, lambda_client = aws
+    timeouts = []
+
+    def run_shards_timeout(shards, run_id, timeout_seconds):
+        timeouts.append(timeout_seconds)
+        raise ReadTimeoutError(endpoint_url='https://lambda.us-east-1.amazonaws.com')
+
+    monkeypatch.setitem(lf.SHARD_BACKENDS, 'stub', run_shards_timeout)
+    event = {'server1': 'a', 'server2': 'b', 'shards': 4, 'shard_backend': 'stub'}
+    response = lf.lambda_handler(event, Context())
+
+    assert response['statusCode'] == 202
+    body = json.loads(response['body'])
+    assert body['message'] == 'F5 LTM comparison checkpointed after parsing (shard failure)'
+    assert body['resume_scheduled'] is True
+    assert timeouts == [(300000 - lf.DEADLINE_SHARD_MARGIN_MS) / 1000]
+    assert set(s3.checkpoint('run-1', 'parsed')) == {'index1', 'index2'}
+    assert lambda_client.invocations == [dict(event, resume_run_id='run-1', resume_attempt=1)]
+
+
+def test_shard_worker_rejects_bad_payload(aws):
+    s3, _ = aws
+    s3.objects['shards/bad.json.gz'] = gzip.compress(b'{"vs1": {}}')
+    for event in ({'action': 'compare_shard'}, {'action': 'compare_shard', 'input_key': 'shards/bad.json.gz'}):
+        response = lf.lambda_handler(event, Context())
+        assert response['statusCode'] == 500
+        assert json.loads(response['body'])['message'] == 'Error processing shard'
+
+
+@pytest.fixture
+def outputs(monkeypatch):
+    """export_results / publish_comparison replaced by recorders"""
+    calls = {'export': [], 'publish': []}
+
+    def export_results(comparison_data, server1, server2, timestamp, temp_dir, bucket):
+        calls['export'].append(len(comparison_data))
+        return [f"exports/{timestamp}.ndjson.gz"]
+
+    def publish_comparison(comparison_data, insights, stats, server1, server2, temp_dir, exported=False, context=None):
+        calls['publish'].append(exported)
+        return {'s3_url': 's3://reports/report.zip', 'timestamp': '20260101-000000', 'notifications': []}
+
+    monkeypatch.setattr(lf, 'export_results', export_results)
+    monkeypatch.setattr(lf, 'publish_comparison', publish_comparison)
+    monkeypatch.setattr(lf, 'ARCHIVE_CONFIGS', False)
+    return calls
+
+
+EVENT = {'server1': 'a', 'server2': 'b'}
+
+
+def test_deadline_before_compare_returns_202(aws, parsed, outputs):
+    s3, lambda_client = aws
+    response = lf.lambda_handler(EVENT, Context(lf.DEADLINE_COMPARE_MIN_MS - 1))
+    assert response['statusCode'] == 202
+    body = json.loads(response['body'])
+    assert body['message'] == 'F5 LTM comparison checkpointed after parsing (deadline)'
+    assert (body['run_id'], body['resume_scheduled']) == ('run-1', True)
+    assert s3.checkpoint('run-1', 'parsed')['index1']['virtual_servers']
+    assert lambda_client.invocations == [dict(EVENT, resume_run_id='run-1', resume_attempt=1)]
+    assert outputs == {'export': [], 'publish': []}
+
+
+def test_parsed_resume_compares_without_fetching(aws, parsed, outputs):
+    s3, lambda_client = aws
+    index = lf.parse_ltm_config(CONFIG, None, True, True)
+    lf.save_checkpoint('run-0', 'parsed', {'index1': index, 'index2': index})
+    event = dict(EVENT, resume_run_id='run-0', resume_attempt=1)
+    response = lf.lambda_handler(event, Context())
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['statistics']['total'] == 2
+    assert parsed == []
+    assert outputs['publish'] == [False]
+    assert lambda_client.invocations == []
+
+
+def test_degraded_report_checkpoints_comparison(aws, parsed, outputs):
+    s3, lambda_client = aws
+    response = lf.lambda_handler(EVENT, Context(lf.DEADLINE_REPORT_MIN_MS - 1))
+    assert response['statusCode'] == 200
+    body = json.loads(response['body'])
+    assert (body['degraded'], body['resume_scheduled']) == (True, True)
+    assert body['exports'] == [f"exports/{body['timestamp']}.ndjson.gz"]
+    checkpoint = s3.checkpoint('run-1', 'compared')
+    assert checkpoint['exported'] is True
+    assert len(checkpoint['comparison_data']) == 2
+    assert outputs == {'export': [2], 'publish': []}
+
+
+def test_compared_resume_skips_reexport(aws, parsed, outputs):
+    s3, lambda_client = aws
+    lf.lambda_handler(EVENT, Context(lf.DEADLINE_REPORT_MIN_MS - 1))
+    [resume_event] = lambda_client.invocations
+
+    # Still short on time: degraded again, but the NDJSON export is not repeated
+    response = lf.lambda_handler(resume_event, Context(lf.DEADLINE_REPORT_MIN_MS - 1))
+    assert json.loads(response['body'])['exports'] == []
+    # Enough time: the report is published, flagged as already exported
+    response = lf.lambda_handler(resume_event, Context())
+    assert json.loads(response['body'])['message'] == 'F5 LTM comparison completed successfully'
+    assert parsed == [('a', 'b')]
+    assert outputs == {'export': [2], 'publish': [True]}
+
+
+def test_resume_attempts_are_bounded(aws, parsed, outputs):
+    s3, lambda_client = aws
+    event = dict(EVENT, resume_run_id='run-0', resume_attempt=lf.MAX_RESUME_ATTEMPTS)
+    response = lf.lambda_handler(event, Context(lf.DEADLINE_COMPARE_MIN_MS - 1))
+    assert response['statusCode'] == 202
+    assert json.loads(response['body'])['resume_scheduled'] is False
+    assert lambda_client.invocations == []
+    assert lf.schedule_resume(dict(EVENT, resume_attempt=lf.MAX_RESUME_ATTEMPTS - 1), 'run-0') is True
+    assert lambda_client.invocations[-1]['resume_attempt'] == lf.MAX_RESUME_ATTEMPTS
+
+
+def test_load_checkpoint_prefers_compared(aws):
+    assert lf.load_checkpoint('run-0') is None
+    lf.save_checkpoint('run-0', 'parsed', {'index1': {}, 'index2': {}})
+    assert lf.load_checkpoint('run-0')['stage'] == 'parsed'
+    lf.save_checkpoint('run-0', 'compared', {'comparison_data': [], 'exported': False})
+    assert lf.load_checkpoint('run-0') == {'comparison_data': [], 'exported': False, 'stage': 'compared'}
@@ -0,0 +1,79 @@
+import lambda_function as lf
+
+CONFIG = b'''ltm pool /Common/P {
+    members {
+        /Common/n1:80 {
+            address 10.100.1.1
+        }
+    }
+}
+ltm rule /Common/R {
+when HTTP_REQUEST {
+    if { [HTTP::uri] eq "/brace" } {
+        HTTP::respond 200 content "{"
+    }
+    log local0. "escaped \\" quote"
+}
+}
+ltm virtual /Common/vs1 {
+    destination /Common/10.100.0.1:443
+    pool /Common/P
+    rules {
+        /Common/R
+    }
+}
+ltm virtual /Common/vs2 {
+    description "not a block { here"
+    destination /Common/10.100.0.2:443
+}
+ltm rule /Common/Broken {
+when HTTP_REQUEST {
+    HTTP::respond 200 content "unterminated {
+}
+}
+ltm virtual /Common/vs3 {
+    destination /Common/10.100.0.3:443
+}
+'''
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_stream_matches_file_mode():
+    expected = lf.parse_ltm_config(CONFIG, None, True, True)
+    assert set(expected['virtual_servers']) == {'/Common/vs1', '/Common/vs2', '/Common/vs3'}
+    assert 'rule /Common/R' in expected['objects']
+    # The header index still lists the unbalanced rule; the stream split drops it
+    expected['defined'].remove('rule /Common/Broken')
+    for size in (1, 3, 7, 64, len(CONFIG)):
+        assert lf.parse_config_stream(chunked(CONFIG, size)) == expected
+
+
+def test_statement_split_resyncs_after_unbalanced_block():
+    statements = list(lf.iter_config_statements(chunked(CONFIG, 5)))
+    headers = [statement.strip().split(b'\n', 1)[0] for statement in statements]
+    assert headers == [
+        b'ltm pool /Common/P {',
+        b'ltm rule /Common/R {',
+        b'ltm virtual /Common/vs1 {',
+        b'ltm virtual /Common/vs2 {',
+        b'ltm virtual /Common/vs3 {',
+    ]
+
+
+def test_partition_pushdown_matches_is_in_scope():
+    config = (
+        b'ltm virtual prod_app {\n    destination /Common/10.100.0.4:443\n}\n'
+        b'ltm virtual /App1/sub/sb_app {\n    destination /App1/10.100.0.5:443\n}\n'
+        b'ltm virtual /Other/vs {\n    destination /Other/10.100.0.6:443\n}\n'
+    ) + CONFIG
+    names = set(lf.parse_ltm_config(config)['virtual_servers'])
+    assert 'prod_app' in names
+    for partitions in (['Common'], ['App1'], ['Common', 'App1'], ['Other']):
+        scope = lf.build_parse_scope({'partitions': partitions})
+        expected = {name for name in names if lf.is_in_scope(name, scope)}
+        assert set(lf.parse_ltm_config(config, scope)['virtual_servers']) == expected
+        assert set(lf.parse_config_stream(chunked(config, 7), scope)['virtual_servers']) == expected
+        assert ('prod_app' in expected) == ('Common' in partitions)
@@ -0,0 +1,117 @@
+import lambda_function as lf
+
+CONFIG = b'''ltm pool /Common/P {
+    members {
+        /Common/n1:80 {
+            address 10.100.1.1
+        }
+    }
+}
+ltm pool /Common/Q {
+    members {
+        /Common/n2:80 {
+            address 10.100.1.2
+        }
+    }
+}
+ltm virtual /Common/prod-vs1 {
+    destination /Common/10.100.0.1:443
+    pool /Common/P
+}
+'''
+
+
+def compare(config1, config2):
+    return lf.compare_config_indexes(
+        lf.parse_ltm_config(config1, None, True, True),
+        lf.parse_ltm_config(config2, None, True, True)
+    )
+
+
+def diff_rows(vs):
+    return {config['key']: config for config in vs['configurations'] if config['isDiff']}
+
+
+def test_switched_pool_is_one_vs_attribute_diff():
+    [vs] = compare(CONFIG, CONFIG.replace(b'pool /Common/P\n}', b'pool /Common/Q\n}'))
+    rows = diff_rows(vs)
+    assert list(rows) == ['pool']
+    assert (rows['pool']['file1'], rows['pool']['file2']) == ('/Common/P', '/Common/Q')
+    assert vs['badgeType'] == 'WARNING'
+    assert vs['dependencyDiffs'] == []
+
+
+def test_undefined_pool_is_missing():
+    config2 = CONFIG.replace(b'ltm pool /Common/P {', b'ltm pool /Common/P-old {')
+    [vs] = compare(CONFIG, config2)
+    row = diff_rows(vs)['pool /Common/P']
+    assert (row['file1'], row['file2']) == ('defined', '(missing)')
+    assert vs['badgeType'] == 'CRITICAL'
+
+
+def build_config(pools, virtual_servers):
+    statements = [
+        f"ltm pool {name} {{\n    members {{\n        /Common/n1:80 {{\n            address {address}\n"
+        f"        }}\n    }}\n    monitor {monitor}\n}}\n"
+        for name, address, monitor in pools
+    ]
+    statements += [
+        f"ltm virtual {name} {{\n    destination /Common/10.100.0.{i}:443\n    pool {pool}\n}}\n"
+        for i, (name, pool) in enumerate(virtual_servers)
+    ]
+    return ''.join(statements).encode('utf-8')
+
+
+def test_sharded_matches_single_run():
+    names = [f"/Common/prod-vs{i}" for i in range(24)]
+    pools1 = [('/Common/P', '10.100.1.1', '/Common/http'), ('/Common/Q', '10.100.1.2', '/Common/http')]
+    pools2 = [('/Common/P', '10.100.1.1', '/Common/http'), ('/Common/Q', '10.100.1.2', '/Common/tcp')]
+    # Even VSs move from P to Q (changed on side 2), odd ones stay on Q
+    index1 = lf.parse_ltm_config(build_config(pools1, [
+        (name, '/Common/P' if i % 2 == 0 else '/Common/Q') for i, name in enumerate(names)
+    ]), None, True, True)
+    index2 = lf.parse_ltm_config(build_config(pools2, [
+        (name, '/Common/Q') for name in names
+    ]), None, True, True)
+    
+    single_stats, sharded_stats = lf.new_comparison_stats(), lf.new_comparison_stats()
+    single = lf.compare_config_indexes(index1, index2, stats=single_stats)
+    sharded = lf.compare_config_indexes(index1, index2, 3, 'hash', 'local', stats=sharded_stats)
+    assert sharded == single
+    assert sharded_stats == single_stats
+    assert all('pool /Common/Q: monitor' in diff_rows(vs) for vs in single)
+    assert not any('pool /Common/Q' in diff_rows(vs) for vs in single)
+
+
+def test_pool_member_address_change_without_node():
+    # No 'ltm node' defines n1: the member address only lives in the pool block
+    rows = diff_rows(compare(CONFIG, CONFIG.replace(b'address 10.100.1.1', b'address 10.100.1.9'))[0])
+    assert list(rows) == ['pool /Common/P: members']
+    assert (rows['pool /Common/P: members']['file1'], rows['pool /Common/P: members']['file2']) == (
+        '10.100.1.1:80', '10.100.1.9:80'
+    )
+    assert rows['pool /Common/P: members']['severity'] == 'CRITICAL'
+
+    corp = CONFIG.replace(b'prod-vs1', b'corp-vs1')
+    [vs] = compare(corp, corp.replace(b'address 10.100.1.1', b'address 10.100.1.9'))
+    assert vs['badgeType'] == 'WARNING'
+
+    # Same host at the other site, or a different host there: expected, like a VS destination
+    for address in (b'10.200.1.1', b'10.200.1.9'):
+        [vs] = compare(CONFIG, CONFIG.replace(b'address 10.100.1.1', b'address ' + address))
+        assert vs['badgeType'] == 'MATCH'
+
+
+def test_pool_members_named_by_address():
+    named = CONFIG.replace(b'/Common/n1:80 {\n            address 10.100.1.1\n        }', b'/Common/10.100.1.1:80 { }')
+    [vs] = compare(named, named.replace(b'10.100.1.1', b'10.100.1.9'))
+    assert vs['badgeType'] == 'CRITICAL'
+    assert diff_rows(vs)['pool /Common/P: members']['severity'] == 'CRITICAL'
+    [vs] = compare(named, named.replace(b'10.100.1.1', b'10.200.1.1'))
+    assert vs['badgeType'] == 'MATCH'
+
+    added = CONFIG.replace(b'        }\n    }\n}\nltm pool /Common/Q', b'        }\n        /Common/n3:80 {\n'
+                           b'            address 10.100.1.3\n        }\n    }\n}\nltm pool /Common/Q', 1)
+    [vs] = compare(CONFIG, added)
+    row = diff_rows(vs)['pool /Common/P: members']
+    assert (row['file2'], row['severity']) == ('10.100.1.1:80 10.100.1.3:80', 'CRITICAL')
@@ -0,0 +1,48 @@
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+import lambda_function as lf
+
+
+def vs_row(name, file1):
+    return {
+        'path': f"/Common/{name}", 'name': name, 'environment': 'prod', 'badgeType': 'critical',
+        'hasDifferences': True, 'isCritical': True, 'isWarning': False, 'hasNoRedundancy': False,
+        'hash1': 'a', 'hash2': 'b',
+        'configurations': [{'key': 'pool', 'file1': file1, 'file2': 'P2', 'severity': 'critical', 'isDiff': True}]
+    }
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    client = boto3.client('s3', aws_access_key_id='test', aws_secret_access_key='test')
+    monkeypatch.setattr(lf, 's3_client', client)
+    with Stubber(client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_export_uploads_ndjson_and_parquet(s3, tmp_path):
+    pytest.importorskip('pyarrow')
+    s3.add_response('put_object', {})
+    s3.add_response('put_object', {})
+    keys = lf.export_results([vs_row('vs1', 'P1')], 'a', 'b', '20240101-120000', str(tmp_path), 'bucket')
+    assert keys == [
+        f"{lf.EXPORT_PREFIX}/dt=2024-01-01/pair=a_vs_b/20240101-120000.ndjson.gz",
+        f"{lf.EXPORT_PREFIX}/dt=2024-01-01/pair=a_vs_b/20240101-120000.parquet"
+    ]
+
+
+def test_parquet_failure_keeps_ndjson_export(s3, tmp_path):
+    pytest.importorskip('pyarrow')
+    s3.add_response('put_object', {})
+    # mixed value types in one column cannot be converted to an Arrow table
+    rows = [vs_row('vs1', 'P1'), vs_row('vs2', {'members': ['m1']})]
+    keys = lf.export_results(rows, 'a', 'b', '20240101-120000', str(tmp_path), 'bucket')
+    assert keys == [f"{lf.EXPORT_PREFIX}/dt=2024-01-01/pair=a_vs_b/20240101-120000.ndjson.gz"]
+
+
+def test_s3_error_is_logged_not_raised(s3, tmp_path):
+    s3.add_client_error('put_object', service_error_code='AccessDenied', http_status_code=403)
+    assert lf.export_results([vs_row('vs1', 'P1')], 'a', 'b', '20240101-120000', str(tmp_path), 'bucket') == []
@@ -0,0 +1,118 @@
+import pytest
+
+import lambda_function as lf
+
+
+class StubTable:
+    """
+    Comparison table with the VirtualServerIndex query semantics: newest
+    first, Limit counts evaluated items, FilterExpression applies after it
+    """
+
+    def __init__(self):
+        self.items = []
+        self.queries = []
+
+    def batch_writer(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+    def query(self, IndexName, KeyConditionExpression, ScanIndexForward, Limit, FilterExpression=None,
+              ExclusiveStartKey=None):
+        self.queries.append(Limit)
+        vs_path = KeyConditionExpression.get_expression()['values'][1]
+        items = sorted(
+            (item for item in self.items if item['virtual_server'] == vs_path),
+            key=lambda item: (item['timestamp'], item['comparison_id']), reverse=True
+        )
+        if ExclusiveStartKey:
+            start = (ExclusiveStartKey['timestamp'], ExclusiveStartKey['comparison_id'])
+            items = [item for item in items if (item['timestamp'], item['comparison_id']) < start]
+        page = items[:Limit]
+        response = {'Items': page}
+        if FilterExpression is not None:
+            pair = FilterExpression.get_expression()['values'][1]
+            response['Items'] = [item for item in page if item['pair'] == pair]
+        if len(items) > Limit:
+            response['LastEvaluatedKey'] = {key: page[-1][key] for key in ('comparison_id', 'timestamp', 'virtual_server')}
+        return response
+
+
+def vs(path, badge='CRITICAL'):
+    return {
+        'path': path, 'environment': 'PROD', 'badgeType': badge, 'hasDifferences': badge != 'MATCH',
+        'configurations': [{'key': 'pool', 'isDiff': badge != 'MATCH'}], 'hash1': 'h1', 'hash2': 'h2'
+    }
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = StubTable()
+    monkeypatch.setattr(lf, 'comparison_table', table)
+    monkeypatch.setattr(lf, 'vs_timeline_cache', lf.OrderedDict())
+    return table
+
+
+def test_store_skips_matches_and_invalidates_once(table, monkeypatch):
+    lf.get_vs_timeline('/Common/a')
+    lf.get_vs_timeline('/Common/other')
+    invalidate = lf.invalidate_vs_timelines
+    invalidations = []
+
+    def record(vs_paths):
+        invalidations.append(set(vs_paths))
+        invalidate(vs_paths)
+
+    monkeypatch.setattr(lf, 'invalidate_vs_timelines', record)
+    written = lf.store_vs_history('x', 'y', [vs('/Common/a'), vs('/Common/b'), vs('/Common/c', 'MATCH')], 't1')
+    assert written == 2
+    assert [item['comparison_id'] for item in table.items] == ['x_vs_y#/Common/a', 'x_vs_y#/Common/b']
+    assert invalidations == [{'/Common/a', '/Common/b'}]
+    assert [key[0] for key in lf.vs_timeline_cache] == ['/Common/other']
+
+
+def test_new_run_refreshes_cached_timeline(table):
+    lf.store_vs_history('x', 'y', [vs('/Common/a')], '2026-01-01T00:00:00')
+    assert len(lf.get_vs_timeline('/Common/a')['items']) == 1
+    queries = len(table.queries)
+    assert len(lf.get_vs_timeline('/Common/a')['items']) == 1
+    assert len(table.queries) == queries
+    lf.store_vs_history('x', 'y', [vs('/Common/a', 'WARNING')], '2026-01-02T00:00:00')
+    timeline = lf.get_vs_timeline('/Common/a')['items']
+    assert [item['badge'] for item in timeline] == ['WARNING', 'CRITICAL']
+
+
+def test_pair_filter_fills_pages(table):
+    # Newest first: nine runs of another pair for every run of x_vs_y
+    for day in range(1, 31):
+        server1 = 'x' if day % 10 == 0 else 'p'
+        lf.store_vs_history(server1, 'y', [vs('/Common/a')], f'2026-01-{day:02d}T00:00:00')
+
+    page = lf.get_vs_timeline('/Common/a', pair='x_vs_y', limit=2)
+    assert [item['timestamp'][:10] for item in page['items']] == ['2026-01-30', '2026-01-20']
+    assert all(limit <= 2 for limit in table.queries)
+    page = lf.get_vs_timeline('/Common/a', pair='x_vs_y', limit=2, next_token=page['next_token'])
+    assert [item['timestamp'][:10] for item in page['items']] == ['2026-01-10']
+    assert page['next_token'] is None
+
+
+def test_unfiltered_pagination_covers_every_item(table):
+    for day in range(1, 8):
+        lf.store_vs_history('x', 'y', [vs('/Common/a')], f'2026-01-{day:02d}T00:00:00')
+    seen, token = [], None
+    while True:
+        page = lf.get_vs_timeline('/Common/a', limit=3, next_token=token)
+        seen += [item['timestamp'] for item in page['items']]
+        token = page['next_token']
+        if not token:
+            break
+    assert seen == sorted(seen, reverse=True)
+    assert len(seen) == len(set(seen)) == 7
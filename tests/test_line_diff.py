@@ -0,0 +1,107 @@
+import random
+
+import lambda_function as lf
+
+
+def lcs_length(a, b):
+    """Dynamic-programming oracle"""
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous = 0
+        for j, y in enumerate(b):
+            previous, row[j + 1] = row[j + 1], previous + 1 if x == y else max(row[j + 1], row[j])
+    return row[-1]
+
+
+def matched(fn, a, b):
+    matches = []
+    fn(a, 0, len(a), b, 0, len(b), matches)
+    matches.sort()
+    # a common subsequence: equal lines, strictly increasing on both sides
+    assert all(a[i] == b[j] for i, j in matches)
+    assert all(i1 < i2 and j1 < j2 for (i1, j1), (i2, j2) in zip(matches, matches[1:]))
+    return matches
+
+
+def apply_hunks(lines1, hunks):
+    """Rebuild the second text from the first and the hunks"""
+    result, position = [], 0
+    for hunk in hunks:
+        start = hunk['start1'] - 1
+        result.extend(lines1[position:start])
+        old = [line[1:] for line in hunk['lines'] if line[0] in ' -']
+        assert old == lines1[start:start + hunk['count1']]
+        new = [line[1:] for line in hunk['lines'] if line[0] in ' +']
+        assert len(new) == hunk['count2']
+        result.extend(new)
+        position = start + hunk['count1']
+    return result + lines1[position:]
+
+
+def test_empty_and_identical_inputs():
+    for fn in (lf.myers_matches, lf.patience_matches):
+        assert matched(fn, [], [1, 2, 3]) == []
+        assert matched(fn, [1, 2, 3], []) == []
+        assert matched(fn, [1, 2, 3], [1, 2, 3]) == [(0, 0), (1, 1), (2, 2)]
+    assert lf.middle_snake([1, 2, 3], 0, 3, [1, 2, 3], 0, 3)[0] == 0
+    assert lf.line_diff('a\nb', 'a\nb') == []
+    assert apply_hunks([''], lf.line_diff('', 'a\nb')) == ['a', 'b']
+    assert apply_hunks(['a', 'b'], lf.line_diff('a\nb', '')) == ['']
+
+
+def test_single_insert_and_delete():
+    a = [1, 2, 3, 4]
+    for b in ([1, 2, 9, 3, 4], [1, 2, 4], [9, 1, 2, 3, 4], [1, 2, 3]):
+        assert lf.middle_snake(a, 0, len(a), b, 0, len(b))[0] == 1
+        assert len(matched(lf.myers_matches, a, b)) == min(len(a), len(b))
+    [hunk] = lf.line_diff('a\nb\nc\nd', 'a\nb\nX\nc\nd')
+    assert (hunk['start1'], hunk['count1'], hunk['start2'], hunk['count2']) == (1, 4, 1, 5)
+    assert hunk['lines'] == [' a', ' b', '+X', ' c', ' d']
+
+
+def test_myers_is_minimal():
+    rnd = random.Random(7)
+    for _ in range(300):
+        a = [rnd.randrange(4) for _ in range(rnd.randrange(15))]
+        b = [rnd.randrange(4) for _ in range(rnd.randrange(15))]
+        lcs = lcs_length(a, b)
+        if a and b:
+            assert lf.middle_snake(a, 0, len(a), b, 0, len(b))[0] == len(a) + len(b) - 2 * lcs
+        assert len(matched(lf.myers_matches, a, b)) == lcs
+        # patience trades minimality for readable anchors, but stays a valid script
+        assert len(matched(lf.patience_matches, a, b)) <= lcs
+
+
+def test_patience_anchors_on_unique_lines():
+    # Both scripts are minimal, but Myers spends a match on the repeated 9s
+    # where patience anchors every line unique to both sides
+    a = [1, 9, 2, 9, 3]
+    b = [9, 1, 9, 9, 2, 3, 9]
+    assert (2, 4) not in matched(lf.myers_matches, a, b)
+    assert {(0, 1), (2, 4), (4, 5)} <= set(matched(lf.patience_matches, a, b))
+    text1 = 'when HTTP_REQUEST {\n  pool a\n}\nwhen HTTP_RESPONSE {\n  log\n}'
+    text2 = 'when HTTP_RESPONSE {\n  log\n}\nwhen HTTP_REQUEST {\n  pool a\n}'
+    assert apply_hunks(text1.split('\n'), lf.line_diff(text1, text2)) == text2.split('\n')
+
+
+def test_hunk_context_merging():
+    lines1 = [f'line {i}' for i in range(30)]
+    context = lf.LINE_DIFF_CONTEXT
+    for gap, expected in ((2 * context, 1), (2 * context + 1, 2)):
+        lines2 = list(lines1)
+        lines2[5] = 'changed 5'
+        lines2[6 + gap] = f'changed {6 + gap}'
+        hunks = lf.build_hunks(lines1, lines2, [(i, i) for i in range(30) if lines1[i] == lines2[i]])
+        assert len(hunks) == expected
+        assert apply_hunks(lines1, hunks) == lines2
+        assert hunks[0]['start1'] == 5 - context + 1
+        assert hunks[-1]['start1'] + hunks[-1]['count1'] - 1 == 6 + gap + context + 1
+
+
+def test_random_round_trip():
+    rnd = random.Random(3)
+    for _ in range(100):
+        lines1 = [rnd.choice('abcde{}') for _ in range(rnd.randrange(20))]
+        lines2 = [rnd.choice('abcde{}') for _ in range(rnd.randrange(20))]
+        hunks = lf.line_diff('\n'.join(lines1), '\n'.join(lines2))
+        assert apply_hunks('\n'.join(lines1).split('\n'), hunks) == '\n'.join(lines2).split('\n')
@@ -0,0 +1,56 @@
+import random
+import struct
+from io import BytesIO
+
+from paramiko.message import Message
+
+
+def test_overwrite_at_cursor_after_rewind():
+    m = Message()
+    m.add_int(1).add_string(b'abc').add_int(3)
+    m.rewind()
+    # writes with the cursor inside the content overwrite, reads share the cursor
+    m.add_int(9)
+    assert m.get_string() == b'abc'
+    assert m.get_so_far() == struct.pack('>I', 9) + struct.pack('>I', 3) + b'abc'
+    # an overwrite running past the end extends the content
+    m.add_int64(2 ** 40)
+    assert m.get_remainder() == b''
+    assert m.asbytes() == struct.pack('>I', 9) + struct.pack('>I', 3) + b'abc' + struct.pack('>Q', 2 ** 40)
+    # at the end it appends again
+    m.add_boolean(True).add_byte(b'\x07')
+    m.rewind()
+    assert (m.get_int(), m.get_string(), m.get_int64(), m.get_boolean(), m.get_byte()) == (
+        9, b'abc', 2 ** 40, True, b'\x07'
+    )
+
+    m = Message(b'\x00' * 8)
+    m.add_byte(b'\x5e').add_int(7)
+    assert m.asbytes() == b'\x5e' + struct.pack('>I', 7) + b'\x00' * 3
+    assert m.get_bytes(3) == b'\x00' * 3
+
+
+def test_matches_stream_semantics():
+    # the BytesIO the Message used to wrap is the oracle
+    rnd = random.Random(5)
+    for _ in range(200):
+        m, stream = Message(), BytesIO()
+        for _ in range(rnd.randrange(12)):
+            op = rnd.randrange(4)
+            if op == 0:
+                m.rewind()
+                stream.seek(0)
+            elif op == 1:
+                n = rnd.randrange(6)
+                # short reads are zero-padded
+                b = stream.read(n)
+                assert m.get_bytes(n) == b + b'\x00' * (n - len(b))
+            elif op == 2:
+                n = rnd.randrange(2 ** 32)
+                m.add_int(n)
+                stream.write(struct.pack('>I', n))
+            else:
+                s = bytes(rnd.randrange(256) for _ in range(rnd.randrange(5)))
+                m.add_string(s)
+                stream.write(struct.pack('>I', len(s)) + s)
+        assert m.asbytes() == stream.getvalue()
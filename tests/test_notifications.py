@@ -0,0 +1,97 @@
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import lambda_function as lf
+
+
+class StubWebhook(BaseHTTPRequestHandler):
+    """Answers with the queued (status, Retry-After) replies, then 200"""
+    protocol_version = 'HTTP/1.1'
+    replies = []
+    barrier = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        if StubWebhook.barrier:
+            StubWebhook.barrier.wait(timeout=5)
+        status, retry_after = StubWebhook.replies.pop(0) if StubWebhook.replies else (200, None)
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header('Retry-After', retry_after)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class Context:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+@pytest.fixture
+def webhook(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubWebhook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    sleeps = []
+    monkeypatch.setattr(lf.time, 'sleep', sleeps.append)
+    monkeypatch.setattr(lf, 'http_connection_pool', {})
+    monkeypatch.setattr(lf, 'rate_limiters', {})
+    yield f"http://{server.server_address[0]}:{server.server_address[1]}/hook", sleeps
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_retry_after():
+    assert lf.parse_retry_after('7') == 7.0
+    assert lf.parse_retry_after(formatdate(0, usegmt=True)) == 0.0
+    assert 50 < lf.parse_retry_after(formatdate(lf.time.time() + 60, usegmt=True)) <= 60
+    assert lf.parse_retry_after('soon') is None
+    assert lf.parse_retry_after(None) is None
+
+
+def test_retry_after_is_capped(webhook):
+    url, sleeps = webhook
+    StubWebhook.replies = [(429, '3600'), (503, formatdate(lf.time.time() + 3600, usegmt=True))]
+    result = lf.post_json(url, {'text': 'hi'})
+    assert (result['status'], result['attempts']) == (200, 3)
+    assert sleeps == [lf.NOTIFY_RETRY_AFTER_MAX_SECONDS] * 2
+
+
+def test_unparseable_retry_after_backs_off(webhook):
+    url, sleeps = webhook
+    StubWebhook.replies = [(503, 'later')]
+    assert lf.post_json(url, {'text': 'hi'})['status'] == 200
+    assert sleeps == [1]
+
+
+def test_retries_stop_at_the_deadline(webhook):
+    url, sleeps = webhook
+    StubWebhook.replies = [(429, '5'), (429, '5')]
+    result = lf.post_json(url, {'text': 'hi'}, Context((lf.NOTIFY_TIMEOUT_SECONDS + 2) * 1000))
+    assert (result['status'], sleeps) == (200, [2, 2])
+    sleeps.clear()
+    StubWebhook.replies = [(429, '5')]
+    result = lf.post_json(url, {'text': 'hi'}, Context(lf.NOTIFY_TIMEOUT_SECONDS * 1000))
+    assert (result['status'], result['attempts'], sleeps) == (429, 1, [])
+
+
+def test_concurrent_posts_use_separate_connections(webhook, monkeypatch):
+    url, sleeps = webhook
+    monkeypatch.setattr(lf, 'NOTIFY_BURST', 100)
+    # Every request is held until all are in flight at once
+    monkeypatch.setattr(StubWebhook, 'barrier', threading.Barrier(6))
+    for _ in range(2):
+        with lf.ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(lambda i: lf.post_json(url, {'text': i}), range(6)))
+        assert [(result['status'], result['attempts']) for result in results] == [(200, 1)] * 6
+        [idle] = lf.http_connection_pool.values()
+        assert len(idle) == len(set(map(id, idle))) == 6
+    assert sleeps == []
@@ -0,0 +1,258 @@
+import errno
+import itertools
+import logging
+import struct
+import threading
+import time
+from hashlib import sha256
+
+import pytest
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from paramiko.message import Message
+from paramiko.packet import Packetizer
+from paramiko.ssh_exception import SSHException
+
+KEY = b'k' * 16
+IV = b'i' * 16
+MAC_KEY = b'm' * 32
+
+
+class StubSocket:
+    """Records what is written and how; sendmsg takes at most max_send bytes per call"""
+
+    def __init__(self, max_send=None):
+        self.max_send = max_send
+        self.calls = []
+        self.data = b''
+        self.written = threading.Event()
+
+    def _write(self, call, data):
+        data = data[:self.max_send] if self.max_send else data
+        self.calls.append((call, threading.current_thread().name, time.monotonic()))
+        self.data += data
+        self.written.set()
+        return len(data)
+
+    def send(self, buf):
+        return self._write('send', bytes(buf))
+
+    def sendmsg(self, bufs):
+        return self._write('sendmsg', b''.join(bytes(buf) for buf in bufs))
+
+    def close(self):
+        pass
+
+
+class SendOnlySocket(StubSocket):
+    """ProxyCommand and Channel style: no sendmsg"""
+
+    sendmsg = None
+
+
+class BrokenSocket(StubSocket):
+    def _write(self, call, data):
+        self.calls.append((call, threading.current_thread().name, time.monotonic()))
+        raise OSError(errno.EPIPE, 'Broken pipe')
+
+
+def message(n):
+    m = Message()
+    m.add_byte(bytes([94]))
+    m.add_int(n)
+    m.add_string(b'x' * n)
+    return m
+
+
+def payloads(data):
+    """Split unencrypted packets back into their payloads"""
+    result = []
+    while data:
+        length, padding = struct.unpack('>IB', data[:5])
+        result.append(Message(data[5:4 + length - padding]))
+        data = data[4 + length:]
+    return [(m.get_byte(), m.get_int()) for m in result]
+
+
+def flusher_threads():
+    return {thread for thread in threading.enumerate() if thread.name == 'paramiko-flusher'}
+
+
+def test_unbatched_sends_write_through():
+    sock = StubSocket()
+    packetizer = Packetizer(sock)
+    packetizer.send_message(message(1))
+    packetizer.send_message(message(2))
+    assert [call for call, _, _ in sock.calls] == ['send', 'send']
+    assert payloads(sock.data) == [(b'^', 1), (b'^', 2)]
+
+
+def test_non_owner_send_flushes_queue_first():
+    sock = StubSocket()
+    packetizer = Packetizer(sock)
+    packetizer.FLUSH_DEADLINE = 60
+    assert packetizer.start_batch()
+    packetizer.send_message(message(1))
+    packetizer.send_message(message(2))
+    assert sock.calls == []
+
+    other = threading.Thread(target=packetizer.send_message, args=(message(3),))
+    other.start()
+    other.join(5)
+    # the queued packets go out ahead of the other thread's, in one write
+    assert [call for call, _, _ in sock.calls] == ['sendmsg']
+    assert payloads(sock.data) == [(b'^', 1), (b'^', 2), (b'^', 3)]
+
+    # a second start_batch from another thread leaves the batch alone
+    results = []
+    other = threading.Thread(target=lambda: results.append(packetizer.start_batch()))
+    other.start()
+    other.join(5)
+    assert results == [False]
+    packetizer.send_message(message(4))
+    packetizer.end_batch()
+    assert payloads(sock.data)[-1] == (b'^', 4)
+    packetizer.close()
+
+
+def test_flush_deadline():
+    sock = StubSocket()
+    packetizer = Packetizer(sock)
+    packetizer.FLUSH_DEADLINE = 0.05
+    assert packetizer.start_batch()
+    queued = time.monotonic()
+    packetizer.send_message(message(1))
+    packetizer.send_message(message(2))
+    # neither flush nor end_batch: the flusher thread writes the queue
+    assert sock.written.wait(5)
+    [(call, thread, written)] = sock.calls
+    assert (call, thread) == ('sendmsg', 'paramiko-flusher')
+    assert written - queued >= packetizer.FLUSH_DEADLINE
+    assert payloads(sock.data) == [(b'^', 1), (b'^', 2)]
+    packetizer.end_batch()
+    assert len(sock.calls) == 1
+    packetizer.close()
+
+
+def test_partial_sendmsg_writes():
+    sock = StubSocket(max_send=7)
+    packetizer = Packetizer(sock)
+    packetizer.FLUSH_DEADLINE = 60
+    assert packetizer.start_batch()
+    for n in (1, 20, 3):
+        packetizer.send_message(message(n))
+    packetizer.end_batch()
+    # every call resumes with the unsent tail of a partly written buffer
+    assert sock.calls[0][0] == 'sendmsg'
+    assert len(sock.calls) == -(-len(sock.data) // 7)
+    assert payloads(sock.data) == [(b'^', 1), (b'^', 20), (b'^', 3)]
+    packetizer.close()
+
+
+def test_send_fallback_without_sendmsg():
+    sock = SendOnlySocket()
+    packetizer = Packetizer(sock)
+    packetizer.FLUSH_DEADLINE = 60
+    assert packetizer.start_batch()
+    for n in (1, 2, 3):
+        packetizer.send_message(message(n))
+    packetizer.end_batch()
+    # the queue is joined into a single send
+    assert [call for call, _, _ in sock.calls] == ['send']
+    assert payloads(sock.data) == [(b'^', 1), (b'^', 2), (b'^', 3)]
+    packetizer.close()
+
+
+def test_flusher_drops_queue_on_socket_error(caplog):
+    caplog.set_level(logging.DEBUG, logger='test_packet')
+    sock = BrokenSocket()
+    packetizer = Packetizer(sock)
+    packetizer.set_log(logging.getLogger('test_packet'))
+    packetizer.FLUSH_DEADLINE = 0.01
+    running = flusher_threads()
+    assert packetizer.start_batch()
+    [flusher] = flusher_threads() - running
+    packetizer.send_message(message(1))
+    flusher.join(5)
+    assert not flusher.is_alive()
+    assert [(call, thread) for call, thread, _ in sock.calls] == [('send', 'paramiko-flusher')]
+    assert 'Failed to flush queued packets' in caplog.text
+    # the queued packets were dropped: ending the batch has nothing to write
+    packetizer.end_batch()
+    assert len(sock.calls) == 1
+    packetizer.close()
+
+
+class FeedSocket:
+    """Delivers data in reads of the given sizes, in turn"""
+
+    def __init__(self, data, sizes):
+        self.data = memoryview(data)
+        self.sizes = itertools.cycle(sizes)
+
+    def recv_into(self, view):
+        n = min(len(view), next(self.sizes), len(self.data))
+        view[:n] = self.data[:n]
+        self.data = self.data[n:]
+        return n
+
+    def close(self):
+        pass
+
+
+def set_outbound(packetizer, mode):
+    """Classic encrypt-and-MAC, encrypt-then-MAC or AEAD (GCM), as the transport sets them up"""
+    if mode == 'gcm':
+        packetizer.set_outbound_cipher(AESGCM(KEY), 16, None, 16, b'', aead=True, iv_out=IV[:12])
+    else:
+        encryptor = Cipher(algorithms.AES(KEY), modes.CTR(IV)).encryptor()
+        packetizer.set_outbound_cipher(encryptor, 16, sha256, 32, MAC_KEY, sdctr=True, etm=mode == 'etm')
+
+
+def set_inbound(packetizer, mode):
+    if mode == 'gcm':
+        packetizer.set_inbound_cipher(AESGCM(KEY), 16, None, 16, b'', aead=True, iv_in=IV[:12])
+    else:
+        decryptor = Cipher(algorithms.AES(KEY), modes.CTR(IV)).decryptor()
+        packetizer.set_inbound_cipher(decryptor, 16, sha256, 32, MAC_KEY, etm=mode == 'etm')
+
+
+def round_trip(mode, sizes, tamper=False):
+    """Send a packet for each payload size, then read them back in awkward chunks"""
+    sock = StubSocket()
+    sender = Packetizer(sock)
+    set_outbound(sender, mode)
+    expected = []
+    for i, size in enumerate(sizes):
+        m = Message()
+        m.add_byte(bytes([94]))
+        m.add_int(i)
+        m.add_string(bytes([i % 251]) * size)
+        expected.append(m.asbytes())
+        sender.send_message(m)
+    data = bytearray(sock.data)
+    if tamper:
+        data[-1] ^= 1
+    # reads of one byte, a few bytes, a packet or so, and several packets
+    receiver = Packetizer(FeedSocket(bytes(data), [1, 7, 4096, 100000, 33]))
+    set_inbound(receiver, mode)
+    received = []
+    for _ in expected:
+        cmd, m = receiver.read_message()
+        received.append(bytes([cmd]) + m.asbytes())
+    return received, expected
+
+
+@pytest.mark.parametrize('mode', ['hmac', 'etm', 'gcm'])
+def test_receive_round_trip(mode):
+    # around the cipher block size, a 32 KB channel packet, and larger than
+    # the initial inbound buffers
+    sizes = [0, 1, 15, 16, 17, 100, 32768, 3, 70000, 5, 200000, 40]
+    received, expected = round_trip(mode, sizes)
+    assert received == expected
+
+
+@pytest.mark.parametrize('mode', ['hmac', 'etm'])
+def test_receive_rejects_mismatched_mac(mode):
+    with pytest.raises(SSHException, match='Mismatched MAC'):
+        round_trip(mode, [10, 20], tamper=True)
@@ -0,0 +1,82 @@
+import http.client
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+
+import pytest
+
+import lambda_function as lf
+
+ITEMS = {
+    'ltm/virtual': [{'fullPath': '/Common/vs1', 'destination': '/Common/10.100.0.1:443', 'pool': '/Common/P'}],
+    'ltm/pool': [{'fullPath': '/Common/P', 'loadBalancingMode': 'round-robin'}],
+}
+
+
+class StubDevice(BaseHTTPRequestHandler):
+    """iControl REST stub: tokens t1, t2, ... of which t1 is revoked"""
+    logins = 0
+    failing = set()
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        StubDevice.logins += 1
+        self.reply(200, {'token': {'token': f"t{StubDevice.logins}"}})
+
+    def do_GET(self):
+        collection = self.path.split('?', 1)[0][len('/mgmt/tm/'):]
+        if self.headers['X-F5-Auth-Token'] == 't1':
+            self.reply(401, {'message': 'Authorization failed'})
+        elif collection in StubDevice.failing:
+            self.reply(500, {'message': 'restjavad unavailable'})
+        elif collection.startswith('ltm/monitor/'):
+            self.reply(404, {'message': 'Public URI path not registered'})
+        else:
+            items = ITEMS.get(collection, [])
+            self.reply(200, {'items': items, 'totalItems': len(items)})
+
+
+class StubServer(ThreadingHTTPServer):
+    # Every collection is requested at once
+    request_queue_size = 64
+    daemon_threads = True
+
+
+@pytest.fixture
+def device(monkeypatch):
+    server = StubServer(('127.0.0.1', 0), StubDevice)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    StubDevice.logins = 0
+    StubDevice.failing = set()
+    monkeypatch.setattr(lf, 'get_rest_connection', lambda host: http.client.HTTPConnection(*server.server_address))
+    monkeypatch.setattr(lf, 'get_ssh_credentials', lambda: {'username': 'admin', 'password': 'secret'})
+    monkeypatch.setattr(lf, 'rest_tokens', {})
+    monkeypatch.setattr(lf, 'rest_connection_pool', {})
+    yield StubDevice
+    server.shutdown()
+    server.server_close()
+
+
+def test_rejected_token_is_replaced_once(device):
+    index = lf.fetch_rest_index('bigip1')
+    assert list(index['virtual_servers']) == ['/Common/vs1']
+    assert 'pool /Common/P' in index['objects']
+    assert device.logins == 2
+
+
+def test_only_missing_collections_are_empty(device):
+    device.failing = {'ltm/rule'}
+    with pytest.raises(HTTPError) as error:
+        lf.fetch_rest_index('bigip1')
+    assert error.value.code == 500
@@ -0,0 +1,85 @@
+import socket
+import threading
+import time
+
+import paramiko
+import pytest
+
+import lambda_function as lf
+
+HOST_KEY = paramiko.RSAKey.generate(1024)
+
+
+class StubSFTP(paramiko.SFTPServerInterface):
+    """Serves one config file; stat hangs while hang_seconds is set"""
+    hang_seconds = 0
+
+    def stat(self, path):
+        if StubSFTP.hang_seconds:
+            time.sleep(StubSFTP.hang_seconds)
+        if path != '/config/bigip.conf':
+            return paramiko.SFTPServer.convert_errno(2)
+        attr = paramiko.SFTPAttributes()
+        attr.st_size = 1234
+        attr.st_atime = attr.st_mtime = 1700000000
+        attr.st_mode = 0o100644
+        return attr
+
+    lstat = stat
+
+
+class AcceptAll(paramiko.ServerInterface):
+    def check_auth_password(self, username, password):
+        return paramiko.AUTH_SUCCESSFUL
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_channel_request(self, kind, chanid):
+        return paramiko.OPEN_SUCCEEDED
+
+
+@pytest.fixture
+def device(monkeypatch):
+    """connect_ssh replaced by a loopback connection to a stub device; yields the connection count"""
+    connects = []
+
+    def connect_ssh(ssh, host, username, private_key_path, profile='default'):
+        client_sock, server_sock = socket.socketpair()
+        server = paramiko.Transport(server_sock)
+        server.add_server_key(HOST_KEY)
+        server.set_subsystem_handler('sftp', paramiko.SFTPServer, StubSFTP)
+        threading.Thread(target=server.start_server, kwargs={'server': AcceptAll()}, daemon=True).start()
+        transport = paramiko.Transport(client_sock)
+        transport.connect(username=username, password='x')
+        ssh._transport = transport
+        connects.append(host)
+        return transport
+
+    monkeypatch.setattr(lf, 'connect_ssh', connect_ssh)
+    monkeypatch.setattr(lf, 'SENTINEL_SFTP_TIMEOUT_SECONDS', 0.3)
+    monkeypatch.setattr(StubSFTP, 'hang_seconds', 0)
+    yield connects
+    for host in list(lf.ssh_session_pool):
+        lf.drop_pooled_ssh(host)
+
+
+def test_pooled_session_is_reused(device):
+    first = lf.check_device('bigip-a', 'admin', None, '/config/bigip.conf')
+    second = lf.check_device('bigip-a', 'admin', None, '/config/bigip.conf')
+    assert first['files'] == {'/config/bigip.conf': [1700000000, 1234]}
+    assert second['fingerprint'] == first['fingerprint']
+    assert device == ['bigip-a']
+    assert lf.check_device('bigip-a', 'admin', None, '/config/missing.conf')['files'] == {'/config/missing.conf': None}
+
+
+def test_hung_device_times_out_and_is_evicted(device):
+    lf.check_device('bigip-a', 'admin', None, '/config/bigip.conf')
+    StubSFTP.hang_seconds = 2
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        lf.check_device('bigip-a', 'admin', None, '/config/bigip.conf')
+    # one timeout on the pooled session, one on the reconnected one
+    assert time.monotonic() - start < 1.5
+    assert device == ['bigip-a', 'bigip-a']
+    assert 'bigip-a' not in lf.ssh_session_pool
@@ -0,0 +1,205 @@
+import threading
+
+from paramiko.message import Message
+from paramiko.sftp import CMD_DATA
+from paramiko.sftp_file import SFTPFile
+
+
+class FakeSFTP:
+    """Just enough SFTPClient for an SFTPFile whose requests are driven by the test"""
+
+    def __init__(self):
+        self.requests = []
+
+    def _log(self, level, message):
+        pass
+
+    def _request(self, t, *args):
+        return None
+
+    def _async_request(self, fileobj, t, *args):
+        self.requests.append(args)
+        return len(self.requests)
+
+    def _get_packetizer(self):
+        return None
+
+
+def sftp_file():
+    f = SFTPFile(FakeSFTP(), b'handle', 'r')
+    f._prefetching = True
+    f._prefetch_done = True
+    return f
+
+
+def register(f, *extents):
+    for num, (offset, length) in enumerate(extents, len(f._prefetch_extents) + 1):
+        f._prefetch_extents[num] = (offset, length)
+        f._prefetch_extent_index.append((offset, length, num))
+    f._prefetch_extent_index.sort()
+
+
+def test_data_in_prefetch_requests_contiguous_and_partial():
+    f = sftp_file()
+    register(f, (0, 100), (100, 100), (300, 50))
+    assert f._data_in_prefetch_requests(0, 200)
+    assert f._data_in_prefetch_requests(50, 100)
+    assert f._data_in_prefetch_requests(300, 50)
+    # partially covered: the rest is neither in the next extent nor contiguous
+    assert not f._data_in_prefetch_requests(150, 100)
+    assert not f._data_in_prefetch_requests(290, 20)
+    assert not f._data_in_prefetch_requests(340, 20)
+    assert not f._data_in_prefetch_requests(350, 1)
+    assert not sftp_file()._data_in_prefetch_requests(0, 1)
+
+
+def test_data_in_prefetch_requests_overlapping():
+    f = sftp_file()
+    register(f, (0, 100), (50, 100), (50, 20))
+    # of the extents starting at the same offset the longest one counts
+    assert f._data_in_prefetch_requests(0, 150)
+    assert f._data_in_prefetch_requests(60, 90)
+    assert not f._data_in_prefetch_requests(0, 160)
+
+    # like the unindexed lookup, only the last extent starting at or before
+    # the offset is consulted: an extent nested in an earlier one hides it
+    # (at worst the range is requested again)
+    f = sftp_file()
+    register(f, (0, 200), (50, 10))
+    assert f._data_in_prefetch_requests(10, 50)
+    assert not f._data_in_prefetch_requests(100, 50)
+
+
+def test_data_in_prefetch_buffers():
+    f = sftp_file()
+    assert f._data_in_prefetch_buffers(0) is None
+    f._add_prefetch_data(100, b'x' * 50)
+    f._add_prefetch_data(0, b'y' * 50)
+    assert f._prefetch_data_offsets == [0, 100]
+    assert [f._data_in_prefetch_buffers(offset) for offset in (0, 49, 50, 99, 100, 149, 150)] == [
+        0, 0, None, None, 100, 100, None
+    ]
+    # a buffer re-added at the same offset is indexed once
+    f._add_prefetch_data(100, b'z' * 10)
+    assert f._prefetch_data_offsets == [0, 100]
+    assert f._data_in_prefetch_buffers(110) is None
+
+
+def test_pop_prefetch_data_keeps_index_in_sync():
+    f = sftp_file()
+    for offset in (64, 0, 32):
+        f._add_prefetch_data(offset, bytes([offset]) * 32)
+    assert f._pop_prefetch_data(32) == bytes([32]) * 32
+    assert f._prefetch_data_offsets == [0, 64]
+    assert sorted(f._prefetch_data) == [0, 64]
+    assert f._data_in_prefetch_buffers(40) is None
+
+
+def test_partial_read_splits_buffer():
+    f = sftp_file()
+    data = bytes(range(100))
+    f._add_prefetch_data(0, data)
+    f._realpos = 30
+    assert f._read_prefetch(20) == data[30:50]
+    # the head before the read position and the tail after it stay buffered
+    assert f._prefetch_data_offsets == [0, 50]
+    assert (f._prefetch_data[0], f._prefetch_data[50]) == (data[:30], data[50:])
+    assert [f._data_in_prefetch_buffers(offset) for offset in (29, 30, 49, 50, 99)] == [0, None, None, 50, 50]
+
+    f._realpos = 50
+    assert f._read_prefetch(100) == data[50:]
+    f._realpos = 0
+    assert f._read_prefetch(10) == data[:10]
+    assert f._prefetch_data_offsets == [10]
+    f._realpos = 30
+    assert f._read_prefetch(10) is None
+    assert not f._prefetching
+
+
+def finish_round(f, rtt):
+    """Answer every request left in the current round with the given round trip time; returns the new window"""
+    window = f._prefetch_window
+    for _ in range(max(1, window['round_end'] - window['received'])):
+        f._adapt_prefetch_window(rtt)
+    return window['size']
+
+
+def test_adapt_prefetch_window_grows_and_shrinks():
+    f = SFTPFile(FakeSFTP(), b'handle', 'r')
+    f._start_prefetch([], None, adaptive=True)
+    assert f._prefetch_limit(None) == SFTPFile.ADAPTIVE_INITIAL_REQUESTS == 8
+    # slow start: no queueing doubles the window every round
+    assert [finish_round(f, 0.01) for _ in range(2)] == [16, 32]
+    # a round trip three times the minimum means most of the window is queued
+    assert finish_round(f, 0.03) == 16
+    assert not f._prefetch_window['slow_start']
+    # after the first decrease the window grows by one per round
+    assert [finish_round(f, 0.0125) for _ in range(2)] == [17, 18]
+    # a third of the window queued is between the thresholds: hold
+    assert finish_round(f, 0.015) == 18
+    # repeated decreases stop at the floor
+    for _ in range(6):
+        finish_round(f, 0.05)
+    assert f._prefetch_limit(None) == SFTPFile.ADAPTIVE_MIN_REQUESTS
+
+    f = SFTPFile(FakeSFTP(), b'handle', 'r')
+    f._start_prefetch([], 20, adaptive=True)
+    assert [finish_round(f, 0.01) for _ in range(3)] == [16, 20, 20]
+
+
+class RacingSFTP(FakeSFTP):
+    """Answers each read from another thread before the request call has returned"""
+
+    def __init__(self):
+        super().__init__()
+        self.responders = []
+        self.waited = []
+
+    def _async_request(self, fileobj, t, handle, offset, length):
+        num = super()._async_request(fileobj, t, handle, offset, length)
+        msg = Message()
+        msg.add_string(bytes([num]) * length)
+        msg.rewind()
+        responder = threading.Thread(target=fileobj._async_response, args=(CMD_DATA, msg, num))
+        responder.start()
+        responder.join(0.05)
+        # still blocked: the extent is only registered once this returns
+        self.waited.append(responder.is_alive())
+        self.responders.append(responder)
+        return num
+
+
+def test_response_before_extent_is_registered():
+    sftp = RacingSFTP()
+    f = SFTPFile(sftp, b'handle', 'r')
+    f._start_prefetch([(0, 10), (10, 10), (20, 5)], 2)
+    with f._prefetch_cv:
+        assert f._prefetch_cv.wait_for(lambda: f._prefetch_done, 5)
+    for responder in sftp.responders:
+        responder.join(5)
+    assert sftp.waited == [True, True, True]
+    assert f._prefetch_extents == {} and f._prefetch_extent_index == [] and f._prefetch_sent == {}
+    assert f.read(25) == b'\x01' * 10 + b'\x02' * 10 + b'\x03' * 5
+    f.close()
+
+
+class SilentSFTP(FakeSFTP):
+    """Never answers a read; remembers the thread issuing them"""
+
+    def _async_request(self, fileobj, t, *args):
+        self.thread = threading.current_thread()
+        return super()._async_request(fileobj, t, *args)
+
+
+def test_close_stops_prefetch_thread():
+    sftp = SilentSFTP()
+    f = SFTPFile(sftp, b'handle', 'r')
+    f._start_prefetch([(offset, 10) for offset in range(0, 100, 10)], 2)
+    with f._prefetch_cv:
+        # the window is full: the thread waits for responses that never come
+        assert f._prefetch_cv.wait_for(lambda: len(f._prefetch_extents) == 2, 5)
+    f.close()
+    sftp.thread.join(5)
+    assert not sftp.thread.is_alive()
+    assert len(sftp.requests) == 2
+    assert not f._prefetch_issuing
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+import lambda_function as lf
+from test_dependencies import build_config
+
+NAMES = ['prod_app', 'prod_api', 'corp_portal', 'crp_mail', 'sb_test', 'legacy_svc']
+
+
+def comparison(seed):
+    """Random pair of configs: moved pools, changed monitors and addresses, one-sided virtual servers"""
+    rnd = random.Random(seed)
+    pools1 = [(f'/Common/P{i}', f'10.100.1.{i}', '/Common/http') for i in range(4)]
+    pools2 = [
+        (name, rnd.choice([address, '10.100.1.99', '10.200.1.7', '192.168.1.1']), rnd.choice([monitor, '/Common/tcp']))
+        for name, address, monitor in pools1
+    ]
+    names = [f'/{rnd.choice(["Common", "App1"])}/{rnd.choice(NAMES)}{i}' for i in range(40)]
+    vs1 = [(name, rnd.choice(pools1)[0]) for name in names if rnd.random() < 0.9]
+    vs2 = [(name, rnd.choice([pool, rnd.choice(pools1)[0]])) for name, pool in vs1 if rnd.random() < 0.9]
+    vs2 += [(name, '/Common/P0') for name in names if name not in dict(vs1) and rnd.random() < 0.5]
+    return (
+        lf.parse_ltm_config(build_config(pools1, vs1), None, True, True),
+        lf.parse_ltm_config(build_config(pools2, vs2), None, True, True)
+    )
+
+
+class StubTable:
+    def __init__(self):
+        self.items = []
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+
+def baseline_counts(comparison_data):
+    """The per-consumer computations the accumulator replaced (analyze_patterns / build_stats / DynamoDB)"""
+    environments = {}
+    for vs in comparison_data:
+        environments[vs['environment']] = environments.get(vs['environment'], 0) + 1
+    return {
+        'total': len(comparison_data),
+        'differences': sum(1 for vs in comparison_data if vs['hasDifferences']),
+        'critical': sum(1 for vs in comparison_data if vs['isCritical']),
+        'warnings': sum(1 for vs in comparison_data if vs['isWarning']),
+        'no_redundancy': sum(1 for vs in comparison_data if vs['hasNoRedundancy']),
+        'environments': environments,
+        'prod_critical': sum(1 for vs in comparison_data if vs['environment'] == 'PROD' and vs['isCritical']),
+        'dependency_affected': sum(1 for vs in comparison_data if vs.get('dependencyDiffs'))
+    }
+
+
+@pytest.mark.parametrize('seed', range(8))
+def test_accumulator_matches_baseline_counts(seed):
+    index1, index2 = comparison(seed)
+    stats = lf.new_comparison_stats()
+    comparison_data = lf.compare_config_indexes(index1, index2, stats=stats)
+    sharded_stats = lf.new_comparison_stats()
+    assert lf.compare_config_indexes(index1, index2, 3, 'hash', 'local', stats=sharded_stats) == comparison_data
+    assert stats == sharded_stats == lf.summarize_comparison(comparison_data)
+
+    expected = baseline_counts(comparison_data)
+    built = lf.build_stats(stats)
+    assert {key: built[key] for key in ('total', 'differences', 'critical', 'warnings', 'no_redundancy')} == {
+        key: expected[key] for key in ('total', 'differences', 'critical', 'warnings', 'no_redundancy')
+    }
+    assert {env: counts['total'] for env, counts in built['by_environment'].items()} == expected['environments']
+    assert built['by_environment'].get('PROD', {}).get('critical', 0) == expected['prod_critical']
+    assert stats['dependency_affected'] == expected['dependency_affected']
+    assert sum(counts['total'] for counts in built['by_partition'].values()) == expected['total']
+
+    insights = lf.analyze_patterns(comparison_data, stats=stats)
+    assert insights == lf.analyze_patterns(comparison_data)
+    assert (insights['total_count'], insights['critical_count'], insights['warning_count']) == (
+        expected['total'], expected['critical'], expected['warnings']
+    )
+    assert insights['match_count'] == expected['total'] - expected['critical'] - expected['warnings']
+
+
+def test_metadata_stats_default_to_the_comparison(monkeypatch):
+    table = StubTable()
+    monkeypatch.setattr(lf, 'comparison_table', table)
+    index1, index2 = comparison(1)
+    stats = lf.new_comparison_stats()
+    comparison_data = lf.compare_config_indexes(index1, index2, stats=stats)
+    insights = lf.analyze_patterns(comparison_data, stats=stats)
+
+    lf.store_comparison_metadata('a', 'b', comparison_data, insights, 's3://x', '2026-01-01T00:00:00', stats)
+    lf.store_comparison_metadata('a', 'b', comparison_data, insights, 's3://x', '2026-01-01T00:00:00')
+    with_stats, without_stats = ({key: value for key, value in item.items() if key != 'ttl'} for item in table.items)
+    assert with_stats == without_stats
+    expected = baseline_counts(comparison_data)
+    assert (with_stats['total_vs'], with_stats['with_differences'], with_stats['no_redundancy_count']) == (
+        expected['total'], expected['differences'], expected['no_redundancy']
+    )